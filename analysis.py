@@ -0,0 +1,69 @@
+# analysis.py
+# Background position analysis for the GUI. A daemon thread works out the
+# status and every legal move of the side to move, so Tk callbacks never
+# run move generation themselves; the GUI picks results up with
+# root.after polling. Submitting a new position cancels the previous one.
+import queue
+import threading
+import time
+from collections import namedtuple
+
+# status: 'checkmate' / 'stalemate' / 'check' / None; moves: {start square: [end squares]}
+TurnAnalysis = namedtuple('TurnAnalysis', ['status', 'moves', 'seconds'])
+
+
+def analyse_turn(state, cancelled=lambda: False):
+    # Returns None if cancelled part way through
+    start = time.perf_counter()
+    status = state.status()
+    if cancelled():
+        return None
+    moves = {}
+    if status not in ('checkmate', 'stalemate'):
+        for action in state.move_actions():
+            moves.setdefault(action.start, []).append(action.end)
+    return TurnAnalysis(status, moves, time.perf_counter() - start)
+
+
+class AnalysisWorker:
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.generation = 0
+        self.thread = threading.Thread(target=self._run, name="analysis", daemon=True)
+        self.thread.start()
+
+    def submit(self, state):
+        # state must be a private copy (GameState.copy()); earlier jobs are cancelled
+        self.generation += 1
+        self.jobs.put((self.generation, state))
+        return self.generation
+
+    def cancel(self):
+        self.generation += 1
+
+    def poll(self):
+        # Result for the latest submitted position, or None if it is not ready yet
+        found = None
+        while True:
+            try:
+                generation, analysis = self.results.get_nowait()
+            except queue.Empty:
+                return found
+            if generation == self.generation:
+                found = analysis
+
+    def close(self):
+        self.cancel()
+        self.jobs.put((None, None))
+
+    def _run(self):
+        while True:
+            generation, state = self.jobs.get()
+            if state is None:
+                return
+            if generation != self.generation:
+                continue  # superseded before it started
+            analysis = analyse_turn(state, lambda: generation != self.generation)
+            if analysis is not None:
+                self.results.put((generation, analysis))
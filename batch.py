@@ -0,0 +1,125 @@
+# batch.py
+# Offline analysis of many positions. Reads extended FEN lines (see
+# GameState.fen) from a file or stdin and writes one JSON line per position:
+# legal move and action counts, check/checkmate/stalemate, and which cards
+# in the side to move's hand can be played.
+#
+#   python batch.py positions.fen --workers 8 --out results.jsonl
+#   zcat huge.fen.gz | python batch.py - --chunk 500 > results.jsonl
+#
+# Positions are read lazily and only a few chunks are in flight at once,
+# so memory stays flat however long the input is. Output keeps input order.
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from collections import deque
+from bitboard import BitBoard
+from board import Board
+from gamestate import GameState
+
+BACKENDS = {'list': Board, 'bitboard': BitBoard}
+
+
+def analyse_fen(fen, board_cls=BitBoard):
+    try:
+        state = GameState.from_fen(fen, board_cls)
+    except (ValueError, IndexError, KeyError) as e:
+        return {"fen": fen, "error": str(e)}
+    moves = state.move_actions()
+    status = state.status()
+    cards = {}
+    for card in state.hands[state.turn]:
+        cards[card.name] = cards.get(card.name, False) or state.can_play(card)
+    return {
+        "fen": fen,
+        "turn": state.turn,
+        "moves": len(moves),
+        "actions": len(state.legal_actions()),
+        "check": state.board.is_in_check(state.turn),
+        "status": status,
+        "cards": cards,
+        "can_draw": state.can_draw(),
+    }
+
+
+def analyse_chunk(task):
+    fens, backend = task
+    board_cls = BACKENDS[backend]
+    return [analyse_fen(fen, board_cls) for fen in fens]
+
+
+def read_fens(stream):
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield line
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(stream, out, workers=None, chunk=200, backend='bitboard'):
+    # Returns (positions, errors, seconds)
+    start = time.perf_counter()
+    positions = errors = 0
+    tasks = ((fens, backend) for fens in chunked(read_fens(stream), chunk))
+
+    def emit(results):
+        nonlocal positions, errors
+        for result in results:
+            positions += 1
+            errors += "error" in result
+            out.write(json.dumps(result, separators=(',', ':')) + "\n")
+
+    if workers == 1:
+        for task in tasks:
+            emit(analyse_chunk(task))
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            # A bounded window of chunks in flight, collected in input order
+            window = 4 * (workers or multiprocessing.cpu_count())
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.apply_async(analyse_chunk, (task,)))
+                if len(pending) >= window:
+                    emit(pending.popleft().get())
+            while pending:
+                emit(pending.popleft().get())
+    return positions, errors, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse positions given as (extended) FEN, one per line.")
+    parser.add_argument("input", nargs="?", default="-", help="FEN file, or - for stdin")
+    parser.add_argument("--out", metavar="PATH", help="JSON lines output (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--chunk", type=int, default=200, help="positions per task")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="bitboard")
+    args = parser.parse_args(argv)
+
+    stream = sys.stdin if args.input == "-" else open(args.input)
+    out = open(args.out, "w") if args.out else sys.stdout
+    try:
+        positions, errors, seconds = run(stream, out, args.workers, args.chunk, args.backend)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if out is not sys.stdout:
+            out.close()
+    rate = positions / seconds if seconds else 0
+    print(f"{positions} positions ({errors} errors) in {seconds:.2f}s ({rate:.0f} positions/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
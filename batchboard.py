@@ -0,0 +1,212 @@
+# batchboard.py
+# Many positions in lockstep on NumPy arrays (pip install numpy; nothing
+# else in the game needs it). A BatchBoard of N positions holds
+#   squares  (N, 64) int8    piece code per square, -1 if empty
+#   pieces   (N, 12) uint64  one bitboard per piece code
+# with the square index and piece codes of bitboard.py: sq = row * 8 + col,
+# code = colour index * 6 + piece type. Attack maps, check detection and
+# pseudo-legal move masks are computed for the whole batch at once, sliders
+# with Kogge-Stone fills, and follow pieces.py including the card modifiers.
+import numpy as np
+from bitboard import (BISHOP, BISHOP_FULL_RAYS, COLORS, EMPTY, KING, KING_ATTACKS, KNIGHT, KNIGHT_ATTACKS,
+                      PAWN, PIECE_TYPES, QUEEN, ROOK, START_ROWS, TYPE_INDEX, BitBoard)
+from board import Board
+
+U64 = np.uint64
+BITS = U64(1) << np.arange(64, dtype=np.uint64)
+ALL = U64(0xFFFFFFFFFFFFFFFF)
+COL_MASKS = [U64(sum(1 << (row * 8 + col) for row in range(8))) for col in range(8)]
+NOT_COL0 = ~COL_MASKS[0]
+NOT_COL7 = ~COL_MASKS[7]
+NOT_COL01 = ~(COL_MASKS[0] | COL_MASKS[1])
+NOT_COL67 = ~(COL_MASKS[6] | COL_MASKS[7])
+START_ROW_MASKS = [U64(0xFF << (row * 8)) for row in START_ROWS]
+
+# (shift, mask): a positive shift moves towards higher square indices (down the
+# board), and the mask clears squares that wrapped round to the other edge
+ROOK_STEPS = [(-8, ALL), (8, ALL), (1, NOT_COL0), (-1, NOT_COL7)]
+BISHOP_STEPS = [(-9, NOT_COL7), (-7, NOT_COL0), (7, NOT_COL7), (9, NOT_COL0)]
+KING_STEPS = ROOK_STEPS + BISHOP_STEPS
+KNIGHT_STEPS = [(-17, NOT_COL7), (-15, NOT_COL0), (-10, NOT_COL67), (-6, NOT_COL01),
+                (6, NOT_COL67), (10, NOT_COL01), (15, NOT_COL7), (17, NOT_COL0)]
+PAWN_STEPS = (-8, 8)  # forward, by colour index
+
+# Per-square tables from bitboard.py, for the pieces whose moves ignore blockers
+KNIGHT_TABLE = np.array(KNIGHT_ATTACKS, dtype=np.uint64)
+KING_TABLE = np.array(KING_ATTACKS, dtype=np.uint64)
+GHOST_TABLE = np.array(BISHOP_FULL_RAYS, dtype=np.uint64)
+
+
+def _shift(bits, n):
+    return bits << U64(n) if n > 0 else bits >> U64(-n)
+
+
+def _fill(gen, empty, step, mask):
+    # Kogge-Stone occluded fill: every generator bit slid along step through
+    # empty squares, plus the first blocker, excluding the generator itself
+    pro = empty & mask
+    gen = gen | (pro & _shift(gen, step))
+    pro = pro & _shift(pro, step)
+    gen = gen | (pro & _shift(gen, 2 * step))
+    pro = pro & _shift(pro, 2 * step)
+    gen = gen | (pro & _shift(gen, 4 * step))
+    return _shift(gen, step) & mask
+
+
+def _slides(gen, empty, steps):
+    attacks = np.zeros_like(gen)
+    for step, mask in steps:
+        attacks |= _fill(gen, empty, step, mask)
+    return attacks
+
+
+def _jumps(gen, steps):
+    attacks = np.zeros_like(gen)
+    for step, mask in steps:
+        attacks |= _shift(gen, step) & mask
+    return attacks
+
+
+def popcount(masks):
+    # Set bits per uint64, for any array shape
+    masks = np.ascontiguousarray(masks, dtype=np.uint64)
+    return np.unpackbits(masks.view(np.uint8).reshape(masks.shape + (8,)), axis=-1).sum(axis=-1)
+
+
+class BatchBoard:
+    def __init__(self, squares):
+        squares = np.array(squares, dtype=np.int8)
+        if squares.ndim != 2 or squares.shape[1] != 64:
+            raise ValueError(f"squares must have shape (N, 64), not {squares.shape}")
+        if ((squares < EMPTY) | (squares >= 12)).any():
+            raise ValueError("piece codes must be -1 (empty) or 0-11")
+        self.squares = squares
+        self.rebuild()
+
+    def rebuild(self):
+        # Needed only after editing self.squares directly
+        position, square = np.nonzero(self.squares >= 0)
+        self.pieces = np.zeros((len(self.squares), 12), dtype=np.uint64)
+        np.bitwise_or.at(self.pieces, (position, self.squares[position, square].astype(np.intp)), BITS[square])
+
+    def __len__(self):
+        return len(self.squares)
+
+    # --- conversion --------------------------------------------------------------
+
+    @classmethod
+    def from_boards(cls, boards):
+        rows = []
+        for board in boards:
+            if isinstance(board, BitBoard):
+                rows.append(board.squares)
+                continue
+            row = [EMPTY] * 64
+            for color in COLORS:
+                for piece_type in PIECE_TYPES:
+                    code = COLORS.index(color) * 6 + TYPE_INDEX[piece_type]
+                    for r, c in board.locations(color, (piece_type,)):
+                        row[r * 8 + c] = code
+            rows.append(row)
+        return cls(np.array(rows, dtype=np.int8).reshape(len(rows), 64))
+
+    def to_boards(self, board_cls=Board):
+        boards = []
+        for codes in self.squares.tolist():
+            board = board_cls()
+            for sq, code in enumerate(codes):
+                piece = None if code == EMPTY else PIECE_TYPES[code % 6](COLORS[code // 6])
+                board.set_piece(sq >> 3, sq & 7, piece)
+            boards.append(board)
+        return boards
+
+    # --- whole-batch queries -----------------------------------------------------
+
+    def occupancy(self, color):
+        us = COLORS.index(color)
+        return np.bitwise_or.reduce(self.pieces[:, us * 6:us * 6 + 6], axis=1)
+
+    def attack_maps(self, color):
+        # (N,) uint64: every square colour attacks, the same squares Board.is_square_attacked reports
+        us = COLORS.index(color)
+        pieces = self.pieces[:, us * 6:us * 6 + 6]
+        empty = ~np.bitwise_or.reduce(self.pieces, axis=1)
+        step = PAWN_STEPS[us]
+        attacks = _jumps(pieces[:, PAWN], [(step - 1, NOT_COL7), (step + 1, NOT_COL0)])
+        attacks |= _jumps(pieces[:, KNIGHT], KNIGHT_STEPS)
+        attacks |= _jumps(pieces[:, KING], KING_STEPS)
+        attacks |= _slides(pieces[:, ROOK] | pieces[:, QUEEN], empty, ROOK_STEPS)
+        attacks |= _slides(pieces[:, BISHOP] | pieces[:, QUEEN], empty, BISHOP_STEPS)
+        return attacks
+
+    def in_check(self, color):
+        # (N,) bool; a position without colour's king is never in check
+        us = COLORS.index(color)
+        return (self.pieces[:, us * 6 + KING] & self.attack_maps(COLORS[1 - us])) != 0
+
+    def move_masks(self, color, ghost=False, boost=False, no_capture=False):
+        # (N, 64) uint64: pseudo-legal targets of colour's piece on each square, 0
+        # elsewhere. The card flags (bishop ghost, pawn boost, knight may not
+        # capture) are a bool for the whole batch or one per position.
+        us = COLORS.index(color)
+        count = len(self)
+        ghost, boost, no_capture = (np.broadcast_to(np.asarray(flag, dtype=bool), (count,))
+                                    for flag in (ghost, boost, no_capture))
+        codes = self.squares
+        # Work on a flat list of colour's pieces rather than on all 64 squares
+        position, square = np.nonzero((codes >= 0) & (codes // 6 == us))
+        kinds = codes[position, square] % 6
+        gen = BITS[square]
+        own = self.occupancy(color)[position]
+        enemy = self.occupancy(COLORS[1 - us])[position]
+        empty = ~(own | enemy)
+        targets = np.zeros(len(square), dtype=np.uint64)
+
+        pick = kinds == KNIGHT
+        targets[pick] = KNIGHT_TABLE[square[pick]] & ~own[pick] & np.where(no_capture[position[pick]],
+                                                                          ~enemy[pick], ALL)
+        pick = kinds == KING
+        targets[pick] = KING_TABLE[square[pick]] & ~own[pick]
+        pick = (kinds == ROOK) | (kinds == QUEEN)
+        targets[pick] = _slides(gen[pick], empty[pick], ROOK_STEPS) & ~own[pick]
+        pick = (kinds == BISHOP) | (kinds == QUEEN)
+        # Bishop Ghost passes through any piece but lands only on empty squares
+        targets[pick] |= np.where(ghost[position[pick]], GHOST_TABLE[square[pick]] & empty[pick],
+                                  _slides(gen[pick], empty[pick], BISHOP_STEPS) & ~own[pick])
+
+        pick = kinds == PAWN
+        pawns = gen[pick]
+        free = empty[pick]
+        step = PAWN_STEPS[us]
+        pawn_targets = _jumps(pawns, [(step - 1, NOT_COL7), (step + 1, NOT_COL0)]) & enemy[pick]
+        one = _shift(pawns, step) & free
+        # Two steps from the starting row, three with Pawn Boost, never through a piece
+        on_start = (pawns & START_ROW_MASKS[us]) != 0
+        two = np.where(on_start, _shift(one, step) & free, U64(0))
+        three = np.where(on_start & boost[position[pick]], _shift(two, step) & free, U64(0))
+        targets[pick] = pawn_targets | one | two | three
+
+        masks = np.zeros((count, 64), dtype=np.uint64)
+        masks[position, square] = targets
+        return masks
+
+    def move_counts(self, color, ghost=False, boost=False, no_capture=False):
+        # (N,) pseudo-legal move counts
+        return popcount(self.move_masks(color, ghost, boost, no_capture)).sum(axis=1)
+
+    # --- lockstep play -----------------------------------------------------------
+
+    def apply_moves(self, starts, ends):
+        # Plays one move on every position: starts and ends are (N,) square indices
+        starts = np.asarray(starts, dtype=np.intp)
+        ends = np.asarray(ends, dtype=np.intp)
+        positions = np.arange(len(self))
+        moving = self.squares[positions, starts].astype(np.intp)
+        if (moving == EMPTY).any():
+            raise ValueError(f"no piece to move in position(s) {np.flatnonzero(moving == EMPTY).tolist()}")
+        captured = self.squares[positions, ends].astype(np.intp)
+        self.pieces[positions, moving] ^= BITS[starts] | BITS[ends]
+        hit = captured != EMPTY
+        self.pieces[positions[hit], captured[hit]] ^= BITS[ends[hit]]
+        self.squares[positions, ends] = moving
+        self.squares[positions, starts] = EMPTY
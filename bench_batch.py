@@ -0,0 +1,63 @@
+# bench_batch.py
+# Pseudo-legal move masks and check detection for many positions: one
+# BitBoard at a time vs one BatchBoard for all of them (needs numpy).
+import random
+import sys
+import time
+from bitboard import COLORS, BitBoard
+from batchboard import BatchBoard
+from gamestate import GameState
+
+
+def sample_boards(count, seed=1):
+    # Positions from random games, both colours to move
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        state = GameState(BitBoard())
+        for _ in range(rng.randrange(4, 120)):
+            actions = state.legal_actions()
+            if not actions:
+                break
+            state.apply(rng.choice(actions), validate=False)
+            if state.turn_started():
+                boards.append(state.board.copy())
+    return boards[:count]
+
+
+def per_board(boards, color):
+    us = COLORS.index(color)
+    masks = []
+    checks = []
+    for board in boards:
+        masks.append([board.move_mask(sq) if code >= 0 and code // 6 == us else 0
+                      for sq, code in enumerate(board.squares)])
+        checks.append(board.is_in_check(color))
+    return masks, checks
+
+
+def batched(batch, color):
+    return batch.move_masks(color), batch.in_check(color)
+
+
+def main(count=2000):
+    boards = sample_boards(count)
+    start = time.perf_counter()
+    batch = BatchBoard.from_boards(boards)
+    convert = time.perf_counter() - start
+    print(f"{count} positions, conversion {convert * 1000:.1f} ms")
+    print(f"{'colour':<8}{'BitBoard ms':>13}{'BatchBoard ms':>15}{'speedup':>9}")
+    for color in COLORS:
+        start = time.perf_counter()
+        masks, checks = per_board(boards, color)
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        batch_masks, batch_checks = batched(batch, color)
+        many = time.perf_counter() - start
+        if batch_masks.tolist() != masks or batch_checks.tolist() != checks:
+            raise SystemExit(f"{color}: batch results differ from BitBoard")
+        print(f"{color:<8}{single * 1000:>13.1f}{many * 1000:>15.1f}{single / many:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,161 @@
+# bench_memory.py
+# Per-board memory, copy and pickle cost: the old layout (a fresh piece
+# object with a __dict__ on every square, deepcopy to copy) vs flyweight
+# pieces, plus the old Queen move generator that built a Rook and a Bishop
+# on every call, and game history: a deepcopy of the state per ply vs
+# history.GameHistory.
+import copy
+import pickle
+import random
+import sys
+import time
+import tracemalloc
+from bench_moves import POSITIONS, board_from_rows
+from bitboard import BitBoard
+from gamestate import GameState
+from history import GameHistory
+from pieces import Queen, Rook, Bishop
+
+
+class LegacyPiece:
+    # What every square held before: its own object with an instance __dict__
+    def __init__(self, color):
+        self.color = color
+
+
+def legacy_board(rows):
+    board = board_from_rows(rows)
+    for row in range(8):
+        for col in range(8):
+            piece = board.board[row][col]
+            if piece:
+                board.board[row][col] = LegacyPiece(piece.color)
+    return board
+
+
+def legacy_copy(board):
+    return copy.deepcopy(board, {id(board.cache): board.cache})
+
+
+class LegacyRook(Rook):
+    # Rook(color) now returns a shared flyweight; the old Queen built a new
+    # piece, with its own __dict__, on every call
+    def __new__(cls, color):
+        piece = object.__new__(cls)
+        object.__setattr__(piece, 'color', color)
+        return piece
+
+
+class LegacyBishop(Bishop):
+    __new__ = LegacyRook.__new__
+
+
+def legacy_queen_moves(board, row, col, color):
+    return (LegacyRook(color).get_valid_moves(board, row, col)
+            + LegacyBishop(color).get_valid_moves(board, row, col))
+
+
+def allocated(fn, count=200):
+    # Bytes still held per object after building `count` of them
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    keep = [fn() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del keep
+    return (after - before) / count
+
+
+def timed(fn, repeat=2000):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def random_line(count, seed=1):
+    # Actions of random games, restarted whenever one ends, without cards
+    rng = random.Random(seed)
+    state = GameState(BitBoard(), hands={'white': [], 'black': []})
+    history = GameHistory(state)
+    while len(history) < count:
+        actions = state.legal_actions()
+        if not actions or state.result():
+            history.goto(0)
+            history.truncate()
+            continue
+        history.play(rng.choice(actions), validate=False)
+    return history.actions()
+
+
+def history_bytes(actions, keep):
+    # Bytes held per action once every action is played and kept by keep(state)
+    state = GameState(BitBoard(), hands={'white': [], 'black': []})
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = keep(state, actions)
+    state.board.cache.clear()  # the analysis cache is not history
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / len(actions)
+
+
+def deepcopy_each_ply(state, actions):
+    snapshots = []
+    for action in actions:
+        state.apply(action, validate=False)
+        snapshots.append(copy.deepcopy(state, {id(state.board.cache): state.board.cache}))
+    return snapshots
+
+
+def game_history(state, actions):
+    history = GameHistory(state)
+    for action in actions:
+        history.play(action, validate=False)
+    return history
+
+
+def main():
+    rows = POSITIONS["italian"]
+    old = legacy_board(rows)
+    new = board_from_rows(rows)
+    bit = board_from_rows(rows, BitBoard)
+    piece = LegacyPiece('white')
+    print(f"piece object           : {sys.getsizeof(piece) + sys.getsizeof(piece.__dict__):>6} bytes each (old), "
+          f"12 shared instances (new)")
+    print(f"{'':<23}{'old':>10}{'flyweight':>12}{'bitboard':>12}")
+    print(f"{'board, bytes':<23}{allocated(lambda: legacy_board(rows)):>10.0f}"
+          f"{allocated(lambda: board_from_rows(rows)):>12.0f}"
+          f"{allocated(lambda: board_from_rows(rows, BitBoard)):>12.0f}")
+    print(f"{'copy, bytes':<23}{allocated(lambda: legacy_copy(old)):>10.0f}"
+          f"{allocated(new.copy):>12.0f}{allocated(bit.copy):>12.0f}")
+    print(f"{'copy, us':<23}{timed(lambda: legacy_copy(old)) * 1e6:>10.1f}"
+          f"{timed(new.copy) * 1e6:>12.1f}{timed(bit.copy) * 1e6:>12.1f}")
+    print(f"{'pickle, bytes':<23}{len(pickle.dumps(old)):>10}"
+          f"{len(pickle.dumps(new)):>12}{len(pickle.dumps(bit)):>12}")
+
+    queen = Queen('white')
+    board = board_from_rows(POSITIONS["queens_out"])
+    row, col = 6, 3
+    old_time = timed(lambda: legacy_queen_moves(board, row, col, 'white'), 20000)
+    new_time = timed(lambda: queen.get_valid_moves(board, row, col), 20000)
+    print(f"queen moves            : {old_time * 1e6:.2f} us (old) vs {new_time * 1e6:.2f} us "
+          f"({old_time / new_time:.1f}x)")
+
+    actions = random_line(1000)
+    print(f"history, bytes/action  : {history_bytes(actions, deepcopy_each_ply):.0f} (deepcopy per ply) vs "
+          f"{history_bytes(actions, game_history):.0f} (GameHistory)")
+    history = game_history(GameState(BitBoard(), hands={'white': [], 'black': []}), actions)
+    start = time.perf_counter()
+    history.goto(0)
+    back = (time.perf_counter() - start) / len(actions)
+    start = time.perf_counter()
+    history.goto(len(actions))
+    forward = (time.perf_counter() - start) / len(actions)
+    print(f"history, us/action     : {back * 1e6:.1f} back, {forward * 1e6:.1f} forward "
+          f"({len(actions)} actions)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# bench_moves.py
+# Legal-move generation: a deepcopy of the board per candidate move (what
+# the rules did first), then make/unmake per candidate, vs the pin and check
+# masks Board.generate_legal_moves uses.
+import copy
+import sys
+import time
+from board import Board
+from bitboard import BitBoard
+from pieces import King, Queen, Rook, Bishop, Knight, Pawn
+
+PIECE_LETTERS = {'k': King, 'q': Queen, 'r': Rook, 'b': Bishop, 'n': Knight, 'p': Pawn}
+
+# Rows from rank 8 down to rank 1, uppercase = white
+POSITIONS = {
+    "start": [
+        "rnbqkbnr", "pppppppp", "........", "........",
+        "........", "........", "PPPPPPPP", "RNBQKBNR",
+    ],
+    "italian": [
+        "r.bqk..r", "pppp.ppp", "..n..n..", "..b.p...",
+        "..B.P...", "...P.N..", "PPP..PPP", "RNBQK..R",
+    ],
+    "open_middlegame": [
+        "r...r.k.", "pp..qppp", "..p.bn..", "...p....",
+        "...P.B..", "..NQ.N..", "PP...PPP", "R...R.K.",
+    ],
+    "queens_out": [
+        "r.b.k..r", "ppq..ppp", "..n.pn..", "..bp....",
+        "...P.B..", "..PBPN..", "PP.Q.PPP", "RN..K..R",
+    ],
+}
+
+
+def board_from_rows(rows, board_cls=Board):
+    board = board_cls()
+    for row, line in enumerate(rows):
+        for col, ch in enumerate(line):
+            if ch == '.':
+                board.set_piece(row, col, None)
+            else:
+                color = 'white' if ch.isupper() else 'black'
+                board.set_piece(row, col, PIECE_LETTERS[ch.lower()](color))
+    return board
+
+
+def legal_moves_deepcopy(board, color):
+    # A real deepcopy per candidate (sharing only the cache, as
+    # bench_memory.legacy_copy does): Board.copy() now copies just the containers
+    moves = []
+    for row in range(8):
+        for col in range(8):
+            piece = board.board[row][col]
+            if piece and piece.color == color:
+                for move in piece.get_valid_moves(board, row, col):
+                    b_copy = copy.deepcopy(board, {id(board.cache): board.cache})
+                    b_copy.move_piece(row, col, move[0], move[1])
+                    if not b_copy.is_in_check(color):
+                        moves.append(((row, col), move))
+    return moves
+
+
+def legal_moves_make_unmake(board, color):
+    # Tries every candidate on the board and looks for check afterwards
+    moves = []
+    for row, col in board.locations(color):
+        for move in board.board[row][col].get_valid_moves(board, row, col):
+            board.make_move(row, col, move[0], move[1])
+            if not board.is_in_check(color):
+                moves.append(((row, col), move))
+            board.unmake_move()
+    return moves
+
+
+def legal_moves_masks(board, color):
+    # Bypasses Board.cache so every repeat does the full work
+    return board.generate_legal_moves(color)
+
+
+def time_it(fn, board, color, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn(board, color)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main(repeat=20):
+    # Speedups are against make/unmake
+    print(f"{'position':<18}{'moves':>6}{'deepcopy ms':>14}{'make/unmake ms':>17}{'masks ms':>11}{'speedup':>9}"
+          f"{'bitboard ms':>14}{'speedup':>9}")
+    for name, rows in POSITIONS.items():
+        board = board_from_rows(rows)
+        old_time, old_moves = time_it(legal_moves_deepcopy, board, 'white', repeat)
+        trial_time, trial_moves = time_it(legal_moves_make_unmake, board, 'white', repeat)
+        new_time, new_moves = time_it(legal_moves_masks, board, 'white', repeat)
+        bit_time, bit_moves = time_it(legal_moves_masks, board_from_rows(rows, BitBoard), 'white', repeat)
+        if not sorted(old_moves) == sorted(trial_moves) == sorted(new_moves) == sorted(bit_moves):
+            raise SystemExit(f"{name}: move lists differ")
+        print(f"{name:<18}{len(new_moves):>6}{old_time * 1000:>14.2f}{trial_time * 1000:>17.2f}"
+              f"{new_time * 1000:>11.2f}{trial_time / new_time:>8.1f}x"
+              f"{bit_time * 1000:>14.2f}{trial_time / bit_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
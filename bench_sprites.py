@@ -0,0 +1,82 @@
+# bench_sprites.py
+# Piece image start-up cost: the old per-pixel loop vs sprites.py with a
+# cold and a warm disk cache. Tk image creation is left out of all three.
+# Before timing, every piece image is checked to key out to byte-identical
+# RGBA both ways.
+import os
+import sys
+import tempfile
+import time
+from PIL import Image
+from sprites import PIECE_DIR, SpriteCache, key_out_white, make_sprite
+
+KEYS = [f"{color}_{piece}" for color in ("white", "black")
+        for piece in ("pawn", "rook", "knight", "bishop", "queen", "king")]
+
+
+def key_out_white_legacy(pil_img):
+    # The loop ChessGUI.load_piece_images ran before sprites.py
+    pil_img = pil_img.convert("RGBA")
+    newData = []
+    for item in pil_img.getdata():
+        if item[:3] == (255, 255, 255):
+            newData.append((255, 255, 255, 0))
+        else:
+            newData.append(item)
+    pil_img.putdata(newData)
+    return pil_img
+
+
+def load_legacy(square_size):
+    images = {}
+    for key in KEYS:
+        pil_img = key_out_white_legacy(Image.open(os.path.join(PIECE_DIR, f"{key}.png")))
+        images[key] = pil_img.resize((square_size, square_size), Image.LANCZOS)
+    return images
+
+
+def check_identical(square_size, source_dir=PIECE_DIR):
+    # Names of the piece images whose keyed-out or resized RGBA differs between the two paths
+    differ = []
+    for name in sorted(os.listdir(source_dir)):
+        if not name.endswith(".png"):
+            continue
+        path = os.path.join(source_dir, name)
+        with Image.open(path) as src:
+            legacy = key_out_white_legacy(src)
+            keyed = key_out_white(src)
+        resized = legacy.resize((square_size, square_size), Image.LANCZOS)
+        if legacy.tobytes() != keyed.tobytes() or resized.tobytes() != make_sprite(path, square_size).tobytes():
+            differ.append(name)
+    return differ
+
+
+def load_pipeline(square_size, cache_dir):
+    cache = SpriteCache(square_size, cache_dir=cache_dir)
+    return {key: cache.get(key) for key in KEYS}
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def main(square_size=64):
+    differ = check_identical(square_size)
+    if differ:
+        raise SystemExit(f"sprites differ from the legacy loop: {', '.join(differ)}")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        legacy_time, legacy = timed(load_legacy, square_size)
+        cold_time, cold = timed(load_pipeline, square_size, cache_dir)
+        warm_time, warm = timed(load_pipeline, square_size, cache_dir)
+    for key in KEYS:
+        if legacy[key].tobytes() != warm[key].tobytes():
+            raise SystemExit(f"{key}: cached sprite differs from the legacy sprite")
+    print(f"legacy per-pixel loop : {legacy_time * 1000:8.1f} ms")
+    print(f"pipeline, cold cache  : {cold_time * 1000:8.1f} ms ({legacy_time / cold_time:.1f}x)")
+    print(f"pipeline, warm cache  : {warm_time * 1000:8.1f} ms ({legacy_time / warm_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 64)
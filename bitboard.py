@@ -0,0 +1,440 @@
+# bitboard.py
+# Board backend on 64-bit integer bitboards. Square index is row * 8 + col,
+# row 0 being Black's back rank, the same orientation as Board.board.
+from array import array
+from board import DEBUG_CHECKS, UNDO_REMOVE, Board, KingLimits
+from pieces import King, Queen, Rook, Bishop, Knight, Pawn
+from zobrist import LRUCache, SQUARE_KEYS
+
+COLORS = ('white', 'black')
+PIECE_TYPES = (Pawn, Knight, Bishop, Rook, Queen, King)
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+TYPE_INDEX = {cls: i for i, cls in enumerate(PIECE_TYPES)}
+EMPTY = -1
+
+ROOK_DIRECTIONS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+BISHOP_DIRECTIONS = [(-1, -1), (-1, 1), (1, -1), (1, 1)]
+START_ROWS = (6, 1)
+PAWN_DIRECTIONS = (-1, 1)
+
+
+def _jump_table(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        mask = 0
+        for dr, dc in offsets:
+            r, c = row + dr, col + dc
+            if 0 <= r < 8 and 0 <= c < 8:
+                mask |= 1 << (r * 8 + c)
+        table.append(mask)
+    return table
+
+
+def _ray_table(dr, dc):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        mask = 0
+        r, c = row + dr, col + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            mask |= 1 << (r * 8 + c)
+            r += dr
+            c += dc
+        table.append(mask)
+    return table
+
+
+KNIGHT_ATTACKS = _jump_table([(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                              (1, -2), (1, 2), (2, -1), (2, 1)])
+KING_ATTACKS = _jump_table([(-1, -1), (-1, 0), (-1, 1), (0, -1),
+                            (0, 1), (1, -1), (1, 0), (1, 1)])
+# PAWN_ATTACKS[color_index][sq]: squares a pawn of that colour on sq attacks
+PAWN_ATTACKS = (_jump_table([(-1, -1), (-1, 1)]), _jump_table([(1, -1), (1, 1)]))
+
+# (ray table, True if the ray runs towards higher square indices)
+ROOK_RAYS = [(_ray_table(dr, dc), dr * 8 + dc > 0) for dr, dc in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(_ray_table(dr, dc), dr * 8 + dc > 0) for dr, dc in BISHOP_DIRECTIONS]
+BISHOP_FULL_RAYS = [0] * 64
+for _rays, _ in BISHOP_RAYS:
+    for _sq in range(64):
+        BISHOP_FULL_RAYS[_sq] |= _rays[_sq]
+ROOK_FULL_RAYS = [0] * 64
+for _rays, _ in ROOK_RAYS:
+    for _sq in range(64):
+        ROOK_FULL_RAYS[_sq] |= _rays[_sq]
+# BETWEEN[a][b]: squares strictly between a and b on a shared line, 0 if they are not aligned
+BETWEEN = [[0] * 64 for _ in range(64)]
+for _rays, _ in ROOK_RAYS + BISHOP_RAYS:
+    for _sq in range(64):
+        _ray = _rays[_sq]
+        while _ray:
+            _bit = _ray & -_ray
+            _to = _bit.bit_length() - 1
+            BETWEEN[_sq][_to] = _rays[_sq] ^ _rays[_to] ^ _bit
+            _ray ^= _bit
+ALL_SQUARES = (1 << 64) - 1
+
+
+def _slide(sq, occupied, rays):
+    attacks = 0
+    for table, positive in rays:
+        ray = table[sq]
+        blockers = ray & occupied
+        if blockers:
+            if positive:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= table[first]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    return _slide(sq, occupied, ROOK_RAYS)
+
+
+def bishop_attacks(sq, occupied):
+    return _slide(sq, occupied, BISHOP_RAYS)
+
+
+def iter_bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def card_flags(state, color):
+    # (bishop ghost, pawn boost, knight may not capture) for colour's move generation
+    if state is None:
+        return False, False, False
+    ghost = state.bishop_ghost_active.get(color, False)
+    boost = state.pawn_boost_active.get(color, False)
+    no_capture = bool(getattr(state, "knightmare_doing_second_move", False)
+                      and state.knightmare_state
+                      and state.knightmare_state.get("capture_done", False))
+    return ghost, boost, no_capture
+
+
+class _Row:
+    __slots__ = ('owner', 'row')
+
+    def __init__(self, owner, row):
+        self.owner = owner
+        self.row = row
+
+    def __getitem__(self, col):
+        return self.owner.piece_at(self.row * 8 + col)
+
+    def __setitem__(self, col, piece):
+        self.owner.set_square(self.row * 8 + col, piece)
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        for col in range(8):
+            yield self[col]
+
+
+class _Grid:
+    # board.board[r][c] compatibility view over the bitboards
+    __slots__ = ('rows',)
+
+    def __init__(self, owner):
+        self.rows = [_Row(owner, row) for row in range(8)]
+
+    def __getitem__(self, row):
+        return self.rows[row]
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class BitBoard(Board):
+    def __init__(self):
+        self.board = _Grid(self)
+        self.undo_stack = array('I')
+        self.cache = LRUCache()
+        self.reset_board()
+
+    def reset_board(self):
+        self.pieces = [[0] * 6, [0] * 6]
+        self.occupancy = [0, 0]
+        self.squares = [EMPTY] * 64
+        self.hash = 0
+        for col, cls in enumerate([Rook, Knight, Bishop, Queen, King, Bishop, Knight, Rook]):
+            self._put(col, 1, TYPE_INDEX[cls])
+            self._put(56 + col, 0, TYPE_INDEX[cls])
+        for col in range(8):
+            self._put(8 + col, 1, PAWN)
+            self._put(48 + col, 0, PAWN)
+        self.undo_stack = array('I')
+
+    # --- low level square access -------------------------------------------------
+
+    def _put(self, sq, color, ptype):
+        bit = 1 << sq
+        self.pieces[color][ptype] |= bit
+        self.occupancy[color] |= bit
+        self.squares[sq] = color * 6 + ptype
+        self.hash ^= SQUARE_KEYS[color * 6 + ptype][sq]
+
+    def _lift(self, sq):
+        code = self.squares[sq]
+        if code != EMPTY:
+            color, ptype = divmod(code, 6)
+            bit = 1 << sq
+            self.pieces[color][ptype] ^= bit
+            self.occupancy[color] ^= bit
+            self.squares[sq] = EMPTY
+            self.hash ^= SQUARE_KEYS[code][sq]
+        return code
+
+    def piece_at(self, sq):
+        code = self.squares[sq]
+        if code == EMPTY:
+            return None
+        return _FLYWEIGHTS[code]
+
+    def set_square(self, sq, piece):
+        self._lift(sq)
+        if piece is not None:
+            self._put(sq, COLORS.index(piece.color), TYPE_INDEX[type(piece)])
+
+    def set_piece(self, row, col, piece):
+        self.set_square(row * 8 + col, piece)
+
+    def rehash(self):
+        # _put/_lift keep the hash current even for board.board[r][c] writes
+        pass
+
+    # --- Board interface ---------------------------------------------------------
+
+    def move_piece(self, from_row, from_col, to_row, to_col):
+        from_sq = from_row * 8 + from_col
+        to_sq = to_row * 8 + to_col
+        code = self._lift(from_sq)
+        self._lift(to_sq)
+        if code != EMPTY:
+            self._put(to_sq, *divmod(code, 6))
+
+    def make_move(self, from_row, from_col, to_row, to_col):
+        from_sq = from_row * 8 + from_col
+        to_sq = to_row * 8 + to_col
+        code = self._lift(from_sq)
+        captured = self._lift(to_sq)
+        self._put(to_sq, *divmod(code, 6))
+        # Board's packed undo entry; square codes are zobrist piece codes
+        self.undo_stack.append(from_sq | to_sq << 6 | (captured + 1) << 12)
+        if DEBUG_CHECKS:
+            self.check_consistency()
+
+    def remove_piece(self, row, col):
+        sq = row * 8 + col
+        self.undo_stack.append(UNDO_REMOVE | sq | (self._lift(sq) + 1) << 12)
+        if DEBUG_CHECKS:
+            self.check_consistency()
+
+    def unmake_move(self):
+        entry = self.undo_stack.pop()
+        captured = (entry >> 12 & 15) - 1
+        if entry & UNDO_REMOVE:
+            if captured != EMPTY:
+                self._put(entry & 63, *divmod(captured, 6))
+        else:
+            to_sq = entry >> 6 & 63
+            self._put(entry & 63, *divmod(self._lift(to_sq), 6))
+            if captured != EMPTY:
+                self._put(to_sq, *divmod(captured, 6))
+        if DEBUG_CHECKS:
+            self.check_consistency()
+
+    def copy(self):
+        other = BitBoard.__new__(BitBoard)
+        other.board = _Grid(other)
+        other.pieces = [self.pieces[0][:], self.pieces[1][:]]
+        other.occupancy = self.occupancy[:]
+        other.squares = self.squares[:]
+        other.undo_stack = self.undo_stack[:]
+        other.hash = self.hash
+        other.cache = self.cache
+        return other
+
+    def __getstate__(self):
+        # The board.board view is rebuilt on arrival
+        state = super().__getstate__()
+        del state['board']
+        return state
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.board = _Grid(self)
+
+    def locations(self, color, types=None):
+        pieces = self.pieces[COLORS.index(color)]
+        return [divmod(sq, 8) for cls in (types or PIECE_TYPES) for sq in iter_bits(pieces[TYPE_INDEX[cls]])]
+
+    def find_king(self, color):
+        kings = self.pieces[COLORS.index(color)][KING]
+        if not kings:
+            return None
+        return divmod(kings.bit_length() - 1, 8)
+
+    def is_square_attacked(self, square, by_color, ignore=None):
+        # ignore: a square treated as empty, as in Board.is_square_attacked
+        row, col = square
+        occupied = None
+        if ignore is not None:
+            occupied = (self.occupancy[0] | self.occupancy[1]) & ~(1 << (ignore[0] * 8 + ignore[1]))
+        return self._attacked(row * 8 + col, COLORS.index(by_color), occupied)
+
+    def _attacked(self, sq, by_color, occupied=None):
+        # occupied: override, e.g. without the king so it cannot hide behind itself
+        them = self.pieces[by_color]
+        if KNIGHT_ATTACKS[sq] & them[KNIGHT] or KING_ATTACKS[sq] & them[KING]:
+            return True
+        if PAWN_ATTACKS[1 - by_color][sq] & them[PAWN]:
+            return True
+        if occupied is None:
+            occupied = self.occupancy[0] | self.occupancy[1]
+        diagonal = them[BISHOP] | them[QUEEN]
+        if diagonal and bishop_attacks(sq, occupied) & diagonal:
+            return True
+        straight = them[ROOK] | them[QUEEN]
+        return bool(straight and rook_attacks(sq, occupied) & straight)
+
+    def is_in_check(self, color):
+        us = COLORS.index(color)
+        kings = self.pieces[us][KING]
+        if not kings:
+            return False
+        return self._attacked(kings.bit_length() - 1, 1 - us)
+
+    def move_mask(self, sq, ghost=False, boost=False, no_capture=False):
+        code = self.squares[sq]
+        if code == EMPTY:
+            return 0
+        us, ptype = divmod(code, 6)
+        own = self.occupancy[us]
+        enemy = self.occupancy[1 - us]
+        occupied = own | enemy
+        if ptype == KNIGHT:
+            targets = KNIGHT_ATTACKS[sq] & ~own
+            if no_capture:
+                targets &= ~enemy
+            return targets
+        if ptype == KING:
+            return KING_ATTACKS[sq] & ~own
+        if ptype == ROOK:
+            return rook_attacks(sq, occupied) & ~own
+        if ptype == BISHOP:
+            if ghost:
+                # Passes through any piece, lands only on empty squares
+                return BISHOP_FULL_RAYS[sq] & ~occupied
+            return bishop_attacks(sq, occupied) & ~own
+        if ptype == QUEEN:
+            # Queen reuses the bishop rules in pieces.py, so Bishop Ghost reaches its diagonals too
+            if ghost:
+                return (rook_attacks(sq, occupied) & ~own) | (BISHOP_FULL_RAYS[sq] & ~occupied)
+            return (rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)) & ~own
+        targets = PAWN_ATTACKS[us][sq] & enemy
+        row = sq >> 3
+        steps = 1
+        if row == START_ROWS[us]:
+            steps = 3 if boost else 2
+        step = PAWN_DIRECTIONS[us] * 8
+        target = sq
+        for _ in range(steps):
+            target += step
+            if not 0 <= target < 64 or occupied >> target & 1:
+                break
+            targets |= 1 << target
+        return targets
+
+    def king_limits(self, color):
+        # Board.king_limits as bitboards: block is a mask (ALL_SQUARES when not in check)
+        us = COLORS.index(color)
+        kings = self.pieces[us][KING]
+        if not kings:
+            return None
+        king = kings.bit_length() - 1
+        them = self.pieces[1 - us]
+        own = self.occupancy[us]
+        occupied = own | self.occupancy[1 - us]
+        checkers = ((KNIGHT_ATTACKS[king] & them[KNIGHT]) | (PAWN_ATTACKS[us][king] & them[PAWN])
+                    | (KING_ATTACKS[king] & them[KING]))
+        block = 0
+        pins = {}
+        sliders = ((ROOK_FULL_RAYS[king] & (them[ROOK] | them[QUEEN]))
+                   | (BISHOP_FULL_RAYS[king] & (them[BISHOP] | them[QUEEN])))
+        for sq in iter_bits(sliders):
+            line = BETWEEN[king][sq]
+            between = line & occupied
+            if not between:
+                checkers |= 1 << sq
+                block |= line
+            elif not between & (between - 1) and between & own:
+                pins[between.bit_length() - 1] = line | 1 << sq
+        if not checkers:
+            block = ALL_SQUARES
+        elif checkers & (checkers - 1):
+            block = 0
+        else:
+            block |= checkers
+        return KingLimits(king, block, pins)
+
+    def _legal_mask(self, sq, mask, limits):
+        if limits is None:
+            return mask
+        if sq == limits.king:
+            enemy = 1 - self.squares[sq] // 6
+            occupied = (self.occupancy[0] | self.occupancy[1]) ^ (1 << sq)
+            for to_sq in iter_bits(mask):
+                if self._attacked(to_sq, enemy, occupied):
+                    mask ^= 1 << to_sq
+            return mask
+        mask &= limits.block
+        pin = limits.pins.get(sq)
+        if pin is not None:
+            mask &= pin
+        return mask
+
+    def piece_legal_moves(self, row, col, state=None):
+        sq = row * 8 + col
+        code = self.squares[sq]
+        if code == EMPTY:
+            return []
+        color = COLORS[code // 6]
+        mask = self._legal_mask(sq, self.move_mask(sq, *card_flags(state, color)), self.king_limits(color))
+        return [divmod(to_sq, 8) for to_sq in iter_bits(mask)]
+
+    def generate_legal_moves(self, color, state=None):
+        flags = card_flags(state, color)
+        limits = self.king_limits(color)
+        moves = []
+        for sq in iter_bits(self.occupancy[COLORS.index(color)]):
+            start = divmod(sq, 8)
+            for to_sq in iter_bits(self._legal_mask(sq, self.move_mask(sq, *flags), limits)):
+                moves.append((start, divmod(to_sq, 8)))
+        return moves
+
+    def has_legal_move(self, color, state=None):
+        flags = card_flags(state, color)
+        limits = self.king_limits(color)
+        pieces = self.occupancy[COLORS.index(color)]
+        if limits is not None and not limits.block:
+            pieces = 1 << limits.king  # double check
+        for sq in iter_bits(pieces):
+            if self._legal_mask(sq, self.move_mask(sq, *flags), limits):
+                return True
+        return False
+
+
+# The shared piece instances, indexed by square code
+_FLYWEIGHTS = [PIECE_TYPES[code % 6](COLORS[code // 6]) for code in range(12)]
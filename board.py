@@ -1,9 +1,38 @@
-from pieces import King, Queen, Rook, Bishop, Knight, Pawn
-import copy
+from pieces import (King, Queen, Rook, Bishop, Knight, Pawn, BISHOP_RAYS, KING_TARGETS, KNIGHT_TARGETS,
+                    PAWN_CAPTURES, ROOK_RAYS)
+from zobrist import COLOR_OFFSET, PIECE_CODES, LRUCache, SIDE_KEYS, card_key, hash_grid, piece_code, piece_key
+from array import array
+from collections import namedtuple
+import os
+
+FEN_PIECES = {'k': King, 'q': Queen, 'r': Rook, 'b': Bishop, 'n': Knight, 'p': Pawn}
+FEN_LETTERS = {cls: letter for letter, cls in FEN_PIECES.items()}
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w - - 0 1"
+
+PIECE_TYPES = (King, Queen, Rook, Bishop, Knight, Pawn)
+# Set CWC_DEBUG_BOARD=1 to verify the piece sets against the grid after every move
+DEBUG_CHECKS = os.environ.get("CWC_DEBUG_BOARD") == "1"
+
+# See Board.king_limits
+KingLimits = namedtuple('KingLimits', ['king', 'block', 'pins'])
+
+# Undo entries are packed into one int each, kept in an array('I') (4 bytes per move):
+#   bits 0-5    from square, or the removed piece's square (row * 8 + col)
+#   bits 6-11   to square
+#   bits 12-15  captured or removed piece code + 1 (zobrist.piece_code), 0 for none
+#   bit 16      set for remove_piece
+UNDO_REMOVE = 1 << 16
+UNDO_PIECES = [None] + sorted((cls(color) for cls in PIECE_CODES for color in COLOR_OFFSET), key=piece_code)
 
 class Board:
     def __init__(self):
         self.board = [[None for _ in range(8)] for _ in range(8)]
+        # Entries pushed by make_move/remove_piece and popped by unmake_move
+        self.undo_stack = array('I')
+        # piece_squares[colour][piece type] = {(row, col), ...}, kept in step with the grid
+        self.piece_squares = None
+        # Legal moves and check status per (position, side, card flags)
+        self.cache = LRUCache()
         self.reset_board()
 
     def reset_board(self):
@@ -16,51 +45,320 @@ class Board:
         for row in range(2,6):
             for col in range(8):
                 self.board[row][col] = None
+        self.undo_stack = array('I')
+        self.rehash()
+
+    def set_fen(self, fen):
+        # Castling and en passant fields are accepted but unused by these rules
+        fields = fen.split()
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError(f"FEN needs 8 ranks: {fen!r}")
+        for row, line in enumerate(rows):
+            col = 0
+            for ch in line:
+                if ch.isdigit():
+                    for _ in range(int(ch)):
+                        self.set_piece(row, col, None)
+                        col += 1
+                elif ch.lower() in FEN_PIECES:
+                    color = 'white' if ch.isupper() else 'black'
+                    self.set_piece(row, col, FEN_PIECES[ch.lower()](color))
+                    col += 1
+                else:
+                    raise ValueError(f"Bad FEN piece {ch!r}: {fen!r}")
+            if col != 8:
+                raise ValueError(f"FEN rank {row + 1} is not 8 squares: {fen!r}")
+        self.undo_stack = array('I')
+        return 'black' if len(fields) > 1 and fields[1] == 'b' else 'white'
+
+    def fen(self, turn='white'):
+        rows = []
+        for row in range(8):
+            line = ''
+            empty = 0
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece is None:
+                    empty += 1
+                    continue
+                if empty:
+                    line += str(empty)
+                    empty = 0
+                letter = FEN_LETTERS[type(piece)]
+                line += letter.upper() if piece.color == 'white' else letter
+            if empty:
+                line += str(empty)
+            rows.append(line)
+        return f"{'/'.join(rows)} {turn[0]} - - 0 1"
+
+    def rehash(self):
+        # Needed only after editing self.board directly: rebuilds the hash and piece sets
+        self.hash = hash_grid(self.board)
+        self.piece_squares = {color: {cls: set() for cls in PIECE_TYPES} for color in ('white', 'black')}
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece:
+                    self.piece_squares[piece.color][type(piece)].add((row, col))
+
+    def set_piece(self, row, col, piece):
+        old = self.board[row][col]
+        if old:
+            self.hash ^= piece_key(old, row, col)
+            self.piece_squares[old.color][type(old)].discard((row, col))
+        if piece:
+            self.hash ^= piece_key(piece, row, col)
+            self.piece_squares[piece.color][type(piece)].add((row, col))
+        self.board[row][col] = piece
 
     def move_piece(self, from_row, from_col, to_row, to_col):
         piece = self.board[from_row][from_col]
+        captured = self.board[to_row][to_col]
+        if captured:
+            self.hash ^= piece_key(captured, to_row, to_col)
+            self.piece_squares[captured.color][type(captured)].discard((to_row, to_col))
+        if piece:
+            self.hash ^= piece_key(piece, from_row, from_col) ^ piece_key(piece, to_row, to_col)
+            squares = self.piece_squares[piece.color][type(piece)]
+            squares.discard((from_row, from_col))
+            squares.add((to_row, to_col))
         self.board[to_row][to_col] = piece
         self.board[from_row][from_col] = None
 
+    def make_move(self, from_row, from_col, to_row, to_col):
+        captured = self.board[to_row][to_col]
+        self.undo_stack.append(from_row << 3 | from_col | (to_row << 3 | to_col) << 6
+                               | (piece_code(captured) + 1 if captured else 0) << 12)
+        self.move_piece(from_row, from_col, to_row, to_col)
+        if DEBUG_CHECKS:
+            self.check_consistency()
+
+    def remove_piece(self, row, col):
+        # Card side effect (Destroy Opponent Piece), undoable like a move
+        piece = self.board[row][col]
+        self.undo_stack.append(UNDO_REMOVE | row << 3 | col | (piece_code(piece) + 1 if piece else 0) << 12)
+        self.set_piece(row, col, None)
+        if DEBUG_CHECKS:
+            self.check_consistency()
+
+    def unmake_move(self):
+        entry = self.undo_stack.pop()
+        piece = UNDO_PIECES[entry >> 12 & 15]
+        if entry & UNDO_REMOVE:
+            self.set_piece(entry >> 3 & 7, entry & 7, piece)
+        else:
+            to_row, to_col = entry >> 9 & 7, entry >> 6 & 7
+            self.move_piece(to_row, to_col, entry >> 3 & 7, entry & 7)
+            if piece:
+                self.set_piece(to_row, to_col, piece)
+        if DEBUG_CHECKS:
+            self.check_consistency()
+
+    def locations(self, color, types=None):
+        # Squares holding colour's pieces, optionally only the given piece types
+        squares = self.piece_squares[color]
+        return [square for cls in (types or PIECE_TYPES) for square in squares[cls]]
+
+    def check_consistency(self):
+        # Debug aid: locations() must agree with the grid square for square
+        for color in ('white', 'black'):
+            for cls in PIECE_TYPES:
+                expected = {(row, col) for row in range(8) for col in range(8)
+                            if type(self.board[row][col]) is cls and self.board[row][col].color == color}
+                found = set(self.locations(color, (cls,)))
+                if found != expected:
+                    raise AssertionError(f"{color} {cls.__name__} squares {sorted(found)} "
+                                         f"!= grid {sorted(expected)}")
+        if self.hash != hash_grid(self.board):
+            raise AssertionError("position hash does not match the grid")
+
     def copy(self):
-        return copy.deepcopy(self)
+        # Pieces are shared flyweights, so only the containers are copied;
+        # the cache is keyed by position, so copies can share it
+        other = object.__new__(type(self))
+        other.board = [row[:] for row in self.board]
+        other.undo_stack = self.undo_stack[:]
+        other.piece_squares = {color: {cls: set(squares) for cls, squares in types.items()}
+                               for color, types in self.piece_squares.items()}
+        other.hash = self.hash
+        other.cache = self.cache
+        return other
+
+    def __getstate__(self):
+        # Sent to worker processes without the analysis cache
+        state = self.__dict__.copy()
+        del state['cache']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.cache = LRUCache()
 
     def find_king(self, color):
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and isinstance(piece, King) and piece.color == color:
-                    return (row, col)
+        for square in self.piece_squares[color][King]:
+            return square
         return None
 
+    def is_square_attacked(self, square, by_color, ignore=None):
+        # ignore: a square treated as empty, so a king cannot step along the line it is checked on
+        row, col = square
+        board = self.board
+        for r, c in KNIGHT_TARGETS[row][col]:
+            piece = board[r][c]
+            if piece and piece.color == by_color and isinstance(piece, Knight):
+                return True
+        for r, c in KING_TARGETS[row][col]:
+            piece = board[r][c]
+            if piece and piece.color == by_color and isinstance(piece, King):
+                return True
+        # A pawn attacks the squares the other colour's pawn would capture from here
+        for r, c in PAWN_CAPTURES['black' if by_color == 'white' else 'white'][row][col]:
+            piece = board[r][c]
+            if piece and piece.color == by_color and isinstance(piece, Pawn):
+                return True
+        for rays, slider in ((ROOK_RAYS, Rook), (BISHOP_RAYS, Bishop)):
+            for ray in rays[row][col]:
+                for r, c in ray:
+                    piece = board[r][c]
+                    if piece and (r, c) != ignore:
+                        if piece.color == by_color and isinstance(piece, (slider, Queen)):
+                            return True
+                        break
+        return False
+
     def is_in_check(self, color):
         king_pos = self.find_king(color)
         if not king_pos:
             return False
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.color != color:
-                    moves = piece.get_valid_moves(self, row, col)
-                    if king_pos in moves:
-                        return True
-        return False
+        return self.is_square_attacked(king_pos, 'black' if color == 'white' else 'white')
+
+    def king_limits(self, color):
+        # Checks and pins on colour's king, found by walking out from the king once.
+        # None without a king; otherwise a KingLimits whose block is the set of
+        # squares a non-king move must land on (None when not in check, empty in
+        # double check) and whose pins map each pinned square to its pin line.
+        king = self.find_king(color)
+        if king is None:
+            return None
+        enemy = 'black' if color == 'white' else 'white'
+        row, col = king
+        board = self.board
+        checkers = []
+        for targets, attacker in ((KNIGHT_TARGETS[row][col], Knight), (PAWN_CAPTURES[color][row][col], Pawn),
+                                  (KING_TARGETS[row][col], King)):
+            for r, c in targets:
+                piece = board[r][c]
+                if piece and piece.color == enemy and isinstance(piece, attacker):
+                    checkers.append({(r, c)})
+        pins = {}
+        for rays, slider in ((ROOK_RAYS, Rook), (BISHOP_RAYS, Bishop)):
+            for ray in rays[row][col]:
+                shield = None
+                for i, (r, c) in enumerate(ray):
+                    piece = board[r][c]
+                    if not piece:
+                        continue
+                    if piece.color == color:
+                        if shield is not None:
+                            break
+                        shield = (r, c)
+                        continue
+                    if isinstance(piece, (slider, Queen)):
+                        # Squares from the king up to and including the attacker
+                        line = set(ray[:i + 1])
+                        if shield is None:
+                            checkers.append(line)
+                        else:
+                            pins[shield] = line
+                    break
+        block = None
+        if len(checkers) == 1:
+            block = checkers[0]
+        elif checkers:
+            block = set()
+        return KingLimits(king, block, pins)
+
+    def _legal_targets(self, row, col, moves, limits):
+        # Filters one piece's pseudo-legal moves with the position's KingLimits. Card
+        # moves need nothing extra: a Bishop Ghost jump off a pin line or past a
+        # checker's line fails the same masks, and each Knightmare hop is judged
+        # in its own position. There is no en passant to expose the king sideways.
+        if limits is None:
+            return moves
+        if (row, col) == limits.king:
+            enemy = 'black' if self.board[row][col].color == 'white' else 'white'
+            return [move for move in moves if not self.is_square_attacked(move, enemy, (row, col))]
+        allowed = limits.pins.get((row, col))
+        if limits.block is not None:
+            allowed = limits.block if allowed is None else allowed & limits.block
+        if allowed is None:
+            return moves
+        return [move for move in moves if move in allowed]
 
-    def all_legal_moves(self, color):
+    def piece_legal_moves(self, row, col, state=None):
+        piece = self.board[row][col]
+        if not piece:
+            return []
+        return self._legal_targets(row, col, piece.get_valid_moves(self, row, col, state),
+                                   self.king_limits(piece.color))
+
+    def generate_legal_moves(self, color, state=None):
+        # Strictly legal: pins and checks are worked out once, no move is tried on the board
+        limits = self.king_limits(color)
+        board = self.board
         moves = []
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece.color == color:
-                    for move in piece.get_valid_moves(self, row, col):
-                        b_copy = self.copy()
-                        b_copy.move_piece(row, col, move[0], move[1])
-                        if not b_copy.is_in_check(color):
-                            moves.append(((row, col), move))
+        for row, col in self.locations(color):
+            targets = board[row][col].get_valid_moves(self, row, col, state)
+            for move in self._legal_targets(row, col, targets, limits):
+                moves.append(((row, col), move))
         return moves
 
+    def has_legal_move(self, color, state=None):
+        # Stops at the first piece with a legal move; enough for mate and stalemate
+        limits = self.king_limits(color)
+        if limits is not None and limits.block is not None and not limits.block:
+            # Double check: only the king can move
+            row, col = limits.king
+            return bool(self.piece_legal_moves(row, col, state))
+        board = self.board
+        for row, col in self.locations(color):
+            if self._legal_targets(row, col, board[row][col].get_valid_moves(self, row, col, state), limits):
+                return True
+        return False
+
+    def position_key(self, color, state=None):
+        return self.hash ^ SIDE_KEYS[color] ^ card_key(state, color)
+
+    def analyse(self, color, state=None):
+        # One (legal moves, in check) analysis per position serves every query
+        key = self.position_key(color, state)
+        entry = self.cache.get(key)
+        if entry is None:
+            entry = (tuple(self.generate_legal_moves(color, state)), self.is_in_check(color))
+            self.cache.put(key, entry)
+        return entry
+
+    def legal_moves_from(self, row, col, state=None):
+        piece = self.board[row][col]
+        if not piece:
+            return []
+        moves, _ = self.analyse(piece.color, state)
+        return [move for start, move in moves if start == (row, col)]
+
+    def all_legal_moves(self, color, state=None):
+        return list(self.analyse(color, state)[0])
+
     def is_checkmate(self, color):
-        return self.is_in_check(color) and not self.all_legal_moves(color)
+        entry = self.cache.get(self.position_key(color))
+        if entry is not None:
+            moves, in_check = entry
+            return in_check and not moves
+        return self.is_in_check(color) and not self.has_legal_move(color)
 
     def is_stalemate(self, color):
-        return not self.is_in_check(color) and not self.all_legal_moves(color)
+        entry = self.cache.get(self.position_key(color))
+        if entry is not None:
+            moves, in_check = entry
+            return not in_check and not moves
+        return not self.is_in_check(color) and not self.has_legal_move(color)
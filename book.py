@@ -0,0 +1,185 @@
+# book.py
+# Opening book / position database: a sorted table of fixed-width entries
+# on disk, read through mmap and searched by binary search. Every process
+# that opens the same file shares its pages through the OS page cache.
+#
+#   python selfplay.py --games 20000 --records games.cwr --white search --black search
+#   python book.py build games.cwr --out openings.book --plies 16 --min-count 2
+#   python book.py probe openings.book --fen "<fen>"
+#
+# Entry: position key (8 bytes), encoded turn (4, see record.py), games,
+# wins and draws for the side to move (4 each). Entries are sorted by key,
+# then by games played, so all turns of one position sit together.
+import argparse
+import mmap
+import struct
+import sys
+import time
+from bitboard import BitBoard
+from gamestate import GameState
+from record import decode_turn, encode_turn, iter_games, new_state, turn_san
+from zobrist import SIDE_KEYS, hand_key
+
+MAGIC = b"CWCB"
+VERSION = 2  # turns as record.py version 2 encodes them
+HEADER = struct.Struct("<4sB3xQ")
+ENTRY = struct.Struct("<Q4sIII")
+KEY = struct.Struct("<Q")
+
+
+def book_key(state):
+    # Board, side to move and both hands; deck order is hidden, so it is left out
+    return (state.board.hash ^ SIDE_KEYS[state.turn] ^ hand_key(state.hands)) & 0xFFFFFFFFFFFFFFFF
+
+
+class BookEntry:
+    __slots__ = ("turn", "games", "wins", "draws")
+
+    def __init__(self, turn, games, wins, draws):
+        self.turn = turn  # list of GameState actions
+        self.games = games
+        self.wins = wins
+        self.draws = draws
+
+    def score(self):
+        return (self.wins + self.draws / 2) / self.games if self.games else 0.0
+
+
+def build(record_paths, out, plies=20, min_count=1):
+    # Collects (position, turn) statistics from the first `plies` turns of every game
+    stats = {}
+    games = 0
+    for path in record_paths:
+        for record in iter_games(path):
+            games += 1
+            state = new_state(record.hands, record.decks, record.tags)
+            for turn in record.turns[:plies]:
+                mover = state.turn
+                encoded = bytearray()
+                encode_turn(turn, encoded)
+                entry = stats.setdefault((book_key(state), bytes(encoded.ljust(4, b"\0"))), [0, 0, 0])
+                entry[0] += 1
+                if record.result == mover:
+                    entry[1] += 1
+                elif record.result == 'draw':
+                    entry[2] += 1
+                for action in turn:
+                    state.apply(action, validate=False)
+    rows = sorted(((key, turn, *counts) for (key, turn), counts in stats.items() if counts[0] >= min_count),
+                  key=lambda row: (row[0], -row[2]))
+    with open(out, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(rows)))
+        for row in rows:
+            f.write(ENTRY.pack(*row))
+    return {"games": games, "positions": len({row[0] for row in rows}), "entries": len(rows)}
+
+
+class OpeningBook:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an opening book")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported book version {version}")
+
+    def __reduce__(self):
+        # Worker processes reopen the file and map it themselves instead of receiving a copy
+        return (type(self), (self.path,))
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def _key_at(self, index):
+        return KEY.unpack_from(self.data, HEADER.size + index * ENTRY.size)[0]
+
+    def _first(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def entries(self, key):
+        # Every book turn for the position key, most played first
+        found = []
+        index = self._first(key)
+        while index < self.count:
+            entry_key, turn, games, wins, draws = ENTRY.unpack_from(self.data, HEADER.size + index * ENTRY.size)
+            if entry_key != key:
+                break
+            found.append(BookEntry(decode_turn(turn, 0)[0], games, wins, draws))
+            index += 1
+        return found
+
+    def lookup(self, state):
+        # Book turns that are legal in state; a hash collision cannot smuggle in a bad turn
+        if not state.turn_started() or state.result() is not None:
+            return []
+        legal = []
+        for entry in self.entries(book_key(state)):
+            applied = 0
+            try:
+                for action in entry.turn:
+                    state.apply(action)
+                    applied += 1
+                if state.turn_started():
+                    legal.append(entry)
+            except ValueError:
+                pass
+            for _ in range(applied):
+                state.undo()
+        return legal
+
+    def choose(self, state, rng=None):
+        # Most played turn, or one picked in proportion to games played when rng is given
+        entries = self.lookup(state)
+        if not entries:
+            return None
+        if rng is None:
+            return max(entries, key=lambda entry: (entry.games, entry.score()))
+        return rng.choices(entries, weights=[entry.games for entry in entries])[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or probe an opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_cmd = commands.add_parser("build", help="build a book from game record files")
+    build_cmd.add_argument("records", nargs="+")
+    build_cmd.add_argument("--out", required=True)
+    build_cmd.add_argument("--plies", type=int, default=20, help="turns per game to include")
+    build_cmd.add_argument("--min-count", type=int, default=1, help="drop turns played fewer times")
+    probe_cmd = commands.add_parser("probe", help="list the book turns for a position")
+    probe_cmd.add_argument("book")
+    probe_cmd.add_argument("--fen", help="position to probe, plain or extended FEN (default: the start position)")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        report = build(args.records, args.out, args.plies, args.min_count)
+        print(f"{report['games']} games -> {report['entries']} entries for {report['positions']} positions "
+              f"in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+        return 0
+
+    book = OpeningBook(args.book)
+    # Extended FEN carries the hands, which are part of the book key
+    state = GameState.from_fen(args.fen, BitBoard) if args.fen else GameState(BitBoard())
+    for entry in book.lookup(state):
+        text = turn_san(state, entry.turn)
+        for _ in entry.turn:
+            state.undo()
+        print(f"{text:<16} games {entry.games:>7}  score {entry.score():.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,62 +1,139 @@
+# card.py
+# Cards are defined as data in card_data/*.json and compiled once, at import,
+# into Card subclasses: "play" becomes a tuple of eligibility checks and
+# "effect" becomes plain attributes GameState reads (the state flag the
+# move generators consult, a destroy target set, the double move). The
+# built-in classes keep their names, e.g. card.PawnBoostCard.
+#
+#   "play":   {"own_piece": {"pieces": [...], "rows": [...]}}   rows from white's side
+#             {"opponent_piece": {"exclude": [...]}}
+#             {"own_piece_can_move": {"pieces": [...]}}
+#             {"not_in_check": true}
+#   "effect": {"modifier": "ghost" | "boost" | "double_move"}
+#             {"destroy": {"exclude": [...]}}                    ends the turn
+import json
+import os
+from pieces import King, Queen, Rook, Bishop, Knight, Pawn
+
+CARD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "card_data")
+PIECE_NAMES = {"king": King, "queen": Queen, "rook": Rook, "bishop": Bishop, "knight": Knight, "pawn": Pawn}
+# Modifier -> GameState flag (a per-colour dict) that pieces.py and bitboard.py read
+MODIFIER_FLAGS = {"ghost": "bishop_ghost_active", "boost": "pawn_boost_active",
+                  "double_move": "knightmare_active"}
+
+
 class Card:
     name = "Base Card"
     description = "No effect."
+    code = None
+    letter = None  # hand and effect letter in extended FEN
+    checks = ()
+    flag = None  # GameState attribute switched on for the rest of the turn
+    double_move = False
+    targets = None  # piece types Destroy may remove; None for cards without a target
 
-    def can_play(self, gui):
+    def can_play(self, state):
+        for check in self.checks:
+            if not check(state):
+                return False
         return True
 
-class PawnBoostCard(Card):
-    name = "Pawn Boost"
-    description = "Any pawn on its starting square may move 1, 2, or 3 spaces for this turn."
-
-    def can_play(self, gui):
-        # Only if player has at least one pawn on its starting square
-        board = gui.board.board
-        color = gui.turn
-        row = 6 if color == "white" else 1
-        for col in range(8):
-            piece = board[row][col]
-            if piece and piece.color == color and piece.__class__.__name__.lower() == "pawn":
+
+def _piece_types(names):
+    try:
+        return frozenset(PIECE_NAMES[name] for name in names)
+    except KeyError as e:
+        raise ValueError(f"unknown piece in card data: {e.args[0]!r}") from None
+
+
+def _own_piece(spec):
+    types = tuple(_piece_types(spec["pieces"]))
+    rows = spec.get("rows", range(8))
+    allowed = {'white': frozenset(rows), 'black': frozenset(7 - row for row in rows)}
+
+    def check(state):
+        rows = allowed[state.turn]
+        for row, _ in state.board.locations(state.turn, types):
+            if row in rows:
                 return True
         return False
+    return check
 
-class BishopGhostCard(Card):
-    name = "Bishop Ghost"
-    description = "Your bishops can move through your own pieces, but cannot capture this turn."
 
-    def can_play(self, gui):
-        # Only restrict if the player is currently in check
-        if gui.board.is_in_check(gui.turn):
-            return False
-        return True
+def _opponent_piece(spec):
+    types = tuple(frozenset(PIECE_NAMES.values()) - _piece_types(spec.get("exclude", ())))
+
+    def check(state):
+        return bool(state.board.locations('black' if state.turn == 'white' else 'white', types))
+    return check
+
+
+def _own_piece_can_move(spec):
+    types = tuple(_piece_types(spec["pieces"]))
 
-class DestroyOpponentPieceCard(Card):
-    name = "Destroy Opponent Piece"
-    description = "Destroy any one opponent piece except King or Queen."
-
-    def can_play(self, gui):
-        opponent = 'black' if gui.turn == 'white' else 'white'
-        for row in range(8):
-            for col in range(8):
-                piece = gui.board.board[row][col]
-                if (piece and piece.color == opponent
-                    and piece.__class__.__name__.lower() not in ("king", "queen")):
-                    return True
+    def check(state):
+        board = state.board
+        for row, col in board.locations(state.turn, types):
+            if board.legal_moves_from(row, col, state):
+                return True
         return False
+    return check
+
+
+def _not_in_check(spec):
+    def check(state):
+        return not state.board.is_in_check(state.turn)
+    return check
+
+
+PREDICATES = {"own_piece": _own_piece, "opponent_piece": _opponent_piece,
+              "own_piece_can_move": _own_piece_can_move, "not_in_check": _not_in_check}
+
+
+def compile_card(data):
+    attrs = {"name": data["name"], "description": data["description"], "code": data["code"],
+             "letter": data["fen"]}
+    checks = []
+    for rule, spec in data.get("play", {}).items():
+        if rule not in PREDICATES:
+            raise ValueError(f"{data['name']}: unknown play rule {rule!r}")
+        checks.append(PREDICATES[rule](spec))
+    attrs["checks"] = tuple(checks)
+    effect = data.get("effect", {})
+    if "modifier" in effect:
+        if effect["modifier"] not in MODIFIER_FLAGS:
+            raise ValueError(f"{data['name']}: unknown modifier {effect['modifier']!r}")
+        attrs["flag"] = MODIFIER_FLAGS[effect["modifier"]]
+        attrs["double_move"] = effect["modifier"] == "double_move"
+    if "destroy" in effect:
+        attrs["targets"] = frozenset(PIECE_NAMES.values()) - _piece_types(effect["destroy"].get("exclude", ()))
+    cls = type(data["class"], (Card,), attrs)
+    cls.__module__ = __name__
+    return cls
+
+
+def load_cards(directory=CARD_DIR):
+    # Card classes ordered by code; codes and names must be unique
+    cards = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".json"):
+            with open(os.path.join(directory, filename)) as f:
+                cards.append(compile_card(json.load(f)))
+    cards.sort(key=lambda cls: cls.code)
+    for attr in ("code", "name", "letter"):
+        values = [getattr(cls, attr) for cls in cards]
+        if len(set(values)) != len(values):
+            raise ValueError(f"duplicate card {attr} in {directory}")
+    return cards
+
 
-class KnightmareLoopCard(Card):
-    name = "Knightmare Loop"
-    description = "Move the same knight twice this turn. Only one capture allowed."
-
-    def can_play(self, gui):
-        # Can play if player has a knight that can move at least once
-        board = gui.board.board
-        color = gui.turn
-        for row in range(8):
-            for col in range(8):
-                piece = board[row][col]
-                if piece and piece.color == color and piece.__class__.__name__.lower() == "knight":
-                    moves = piece.get_valid_moves(gui.board, row, col, gui)
-                    if moves:
-                        return True
-        return False
\ No newline at end of file
+CARD_TYPES = load_cards()
+CARDS_BY_NAME = {cls.name: cls for cls in CARD_TYPES}
+CARDS_BY_LETTER = {cls.letter: cls for cls in CARD_TYPES}
+CARDS_BY_CODE = {cls.code: cls for cls in CARD_TYPES}
+# Module attributes so every card class can be imported and pickled by name
+globals().update({cls.__name__: cls for cls in CARD_TYPES})
+PawnBoostCard = CARDS_BY_NAME["Pawn Boost"]
+BishopGhostCard = CARDS_BY_NAME["Bishop Ghost"]
+DestroyOpponentPieceCard = CARDS_BY_NAME["Destroy Opponent Piece"]
+KnightmareLoopCard = CARDS_BY_NAME["Knightmare Loop"]
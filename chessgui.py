@@ -1,126 +1,271 @@
-import os
-from tkinter import Tk, Frame, Button, messagebox, simpledialog
+import queue
+import threading
+import time
+from collections import deque
+from tkinter import Tk, Canvas, Label, messagebox, simpledialog
 from board import Board
-from PIL import Image, ImageTk
-from card import PawnBoostCard, BishopGhostCard, DestroyOpponentPieceCard, KnightmareLoopCard
+from PIL import ImageTk
+from sprites import MAX_SIZES, SpriteCache
+from zobrist import LRUCache
+from gamestate import GameState, card_action, move_action, opponent
+from history import GameHistory
+from search import choose_turn
+from analysis import AnalysisWorker
+
+LIGHT_SQUARE = "#e3e3e3"
+DARK_SQUARE = "#888888"
+MIN_SQUARE_SIZE = 32
+SIZE_STEP = 8  # square sizes are rounded down to this, so a resize drag only visits a few sizes
+RESIZE_DELAY_MS = 120  # wait for the drag to settle before loading sprites for a new size
+FRAME_WINDOW = 120  # redraws kept for render_stats()
 
 class ChessGUI:
-    def __init__(self, root):
+    def __init__(self, root, board_cls=Board, ai_color=None, ai_time=2.0, book=None, square_size=64,
+                 show_fps=False, tablebase=None):
         self.root = root
         self.root.title("Chess World Champions")
 
-        self.board = Board()
-        self.turn = 'white'
+        # Rules, turn, hands and card effects all live on the GameState
+        self.state = GameState(board_cls())
+        # Endgame tables (tablebase.py) settle mate and stalemate and guide the computer
+        self.state.tablebase = tablebase
+        # Every action goes through the history: Left/Right step through the
+        # game, Home/End jump to either end, Ctrl+Z takes back
+        self.history = GameHistory(self.state)
         self.selected = None
         self.valid_moves = []
-        self.square_size = 64
+        self.square_size = square_size
+
+        # The board is one Canvas: 64 square rectangles whose fill is the
+        # highlight, and one image item per piece
+        self.status_label = Label(self.root, text="", anchor="w")
+        self.status_label.pack(side="bottom", fill="x")
+        self.fps_label = Label(self.root, text="", anchor="w") if show_fps else None
+        if self.fps_label:
+            self.fps_label.pack(side="bottom", fill="x")
+        self.canvas = Canvas(self.root, width=8 * square_size, height=8 * square_size,
+                             highlightthickness=0, bg=DARK_SQUARE)
+        self.canvas.pack(fill="both", expand=True)
+        self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.canvas.bind("<Configure>", self.on_resize)
+        self.root.bind("<Left>", lambda event: self.scrub(self.history.cursor - 1))
+        self.root.bind("<Right>", lambda event: self.scrub(self.history.cursor + 1))
+        self.root.bind("<Home>", lambda event: self.scrub(0))
+        self.root.bind("<End>", lambda event: self.scrub(len(self.history)))
+        self.root.bind("<Control-z>", self.takeback)
+        self.pending_resize = None
+
+        self.square_items = [[None for _ in range(8)] for _ in range(8)]
+        # Fill each square item currently has
+        self.square_colors = [[None for _ in range(8)] for _ in range(8)]
+        self.piece_items = {}  # (row, col) -> (canvas item, image key)
+        self.last_redraw_updates = 0
+        self.total_redraw_updates = 0
+        # (time finished, seconds spent) for recent redraws, see render_stats()
+        self.frames = deque(maxlen=FRAME_WINDOW)
+        self.last_resize_seconds = 0.0
 
-        self.board_frame = Frame(self.root)
-        self.board_frame.pack()
-
-        self.buttons = [[None for _ in range(8)] for _ in range(8)]
-
-        # Card system
-        self.hands = {
-            'white': [PawnBoostCard(), BishopGhostCard(), DestroyOpponentPieceCard(), KnightmareLoopCard()],
-            'black': [PawnBoostCard(), BishopGhostCard(), DestroyOpponentPieceCard(), KnightmareLoopCard()]
-        }
-        self.bishop_ghost_active = {'white': False, 'black': False}
-        self.pawn_boost_active = {'white': False, 'black': False}
-        self.knightmare_active = {'white': False, 'black': False}
-        self.knightmare_state = None  # Track knight pos, capture, moves for this turn
-        self.knightmare_doing_second_move = False
-
-        self.active_card = None  # Track the card being played
         self.game_over = False
 
+        # Computer player: searches on a worker thread, polled with root.after
+        self.ai_color = ai_color
+        self.ai_time = ai_time
+        self.ai_book = book
+        self.ai_thinking = False
+        self.ai_results = queue.Queue()
+
+        # Status and legal moves come from a worker thread, polled with root.after;
+        # each turn is analysed as soon as it starts so selections highlight instantly
+        self.analysis = AnalysisWorker()
+        self.turn_analysis = None
+        self.pending_select = None  # piece clicked before its moves were ready
+        self.after_analysis = None
+        self.analysis_polling = False
+
         self.root.protocol("WM_DELETE_WINDOW", self.quit_game)
 
         self.load_piece_images()
+        self.layout_board()
         self.draw_board()
+        self.analyse_position()
         self.show_turn()
 
+    @property
+    def board(self):
+        return self.state.board
+
+    @property
+    def turn(self):
+        return self.state.turn
+
+    @property
+    def hands(self):
+        return self.state.hands
+
     def quit_game(self):
         self.game_over = True
+        self.analysis.close()
+        if self.pending_resize:
+            self.root.after_cancel(self.pending_resize)
+            self.pending_resize = None
         try:
             self.root.destroy()
         except Exception:
             pass
 
     def load_piece_images(self):
-        base_path = os.path.join("assets", "pieces")
-        piece_types = ["pawn", "rook", "knight", "bishop", "queen", "king"]
-        colors = ["white", "black"]
-
+        # Sprites are keyed, resized and cached on disk by sprites.py, and
+        # only turned into Tk images the first time a piece is drawn; both
+        # are kept for the last few square sizes
+        self.sprites = SpriteCache(self.square_size)
+        self.image_sizes = LRUCache(MAX_SIZES)
         self.images = {}
-
-        for color in colors:
-            for piece in piece_types:
-                filename = f"{color}_{piece}.png"
-                path = os.path.join(base_path, filename)
-                try:
-                    pil_img = Image.open(path).convert("RGBA")
-                    datas = pil_img.getdata()
-                    newData = []
-                    for item in datas:
-                        if item[:3] == (255, 255, 255):
-                            newData.append((255, 255, 255, 0))
-                        else:
-                            newData.append(item)
-                    pil_img.putdata(newData)
-                    pil_img = pil_img.resize((self.square_size, self.square_size), Image.LANCZOS)
-                    tk_img = ImageTk.PhotoImage(pil_img)
-                    self.images[f"{color}_{piece}"] = tk_img
-                except Exception as e:
-                    print(f"Failed to load {filename}: {e}")
-
-        empty = Image.new("RGBA", (self.square_size, self.square_size), (255, 255, 255, 0))
-        self.empty_image = ImageTk.PhotoImage(empty)
+        self.image_sizes.put(self.square_size, self.images)
+
+    def piece_image(self, image_key):
+        image = self.images.get(image_key)
+        if image is None:
+            try:
+                image = ImageTk.PhotoImage(self.sprites.get(image_key))
+            except Exception as e:
+                print(f"Failed to load {image_key}.png: {e}")
+                image = ""
+            self.images[image_key] = image
+        return image
+
+    def square_origin(self, row, col):
+        return col * self.square_size, row * self.square_size
+
+    def layout_board(self):
+        # Places the square and piece items for the current square size
+        size = self.square_size
+        canvas = self.canvas
+        for row in range(8):
+            for col in range(8):
+                x, y = self.square_origin(row, col)
+                item = self.square_items[row][col]
+                if item is None:
+                    self.square_items[row][col] = canvas.create_rectangle(x, y, x + size, y + size,
+                                                                          width=0, tags="square")
+                else:
+                    canvas.coords(item, x, y, x + size, y + size)
+        for (row, col), (item, image_key) in self.piece_items.items():
+            canvas.coords(item, *self.square_origin(row, col))
+            canvas.itemconfig(item, image=self.piece_image(image_key))
 
     def draw_board(self):
+        # Only squares whose highlight changed are refilled, and a piece that
+        # moved keeps its canvas item and just gets new coordinates
+        start = time.perf_counter()
+        canvas = self.canvas
+        updates = 0
+        valid_moves = set(self.valid_moves)
+        wanted = {}
         for row in range(8):
             for col in range(8):
                 piece = self.board.board[row][col]
-                default_color = "#e3e3e3" if (row + col) % 2 == 0 else "#888888"
-
-                bg_color = default_color
+                color = LIGHT_SQUARE if (row + col) % 2 == 0 else DARK_SQUARE
                 if self.selected == (row, col):
-                    bg_color = "lightblue"
-                elif (row, col) in self.valid_moves:
-                    target_piece = self.board.board[row][col]
-                    if target_piece and target_piece.color != self.turn:
-                        bg_color = "#ff5555"
+                    color = "lightblue"
+                elif (row, col) in valid_moves:
+                    if piece and piece.color != self.turn:
+                        color = "#ff5555"
                     else:
-                        bg_color = "lightgreen"
-
+                        color = "lightgreen"
+                if self.square_colors[row][col] != color:
+                    self.square_colors[row][col] = color
+                    canvas.itemconfig(self.square_items[row][col], fill=color)
+                    updates += 1
                 if piece:
-                    piece_type = piece.__class__.__name__.lower()
-                    image_key = f"{piece.color}_{piece_type}"
-                    image = self.images.get(image_key)
-                else:
-                    image = self.empty_image
-
-                if self.buttons[row][col] is None:
-                    btn = Button(
-                        self.board_frame,
-                        image=image,
-                        text="",
-                        bg=bg_color,
-                        bd=0,
-                        highlightthickness=0,
-                        command=lambda r=row, c=col: self.on_click(r, c)
-                    )
-                    btn.grid(row=row, column=col)
-                    self.buttons[row][col] = btn
-                else:
-                    self.buttons[row][col].config(image=image, text="", bg=bg_color)
-                self.buttons[row][col].image = image
+                    wanted[(row, col)] = f"{piece.color}_{piece.__class__.__name__.lower()}"
+
+        # Items whose square no longer shows their piece are reused for the
+        # same kind of piece elsewhere (a move), or deleted (a capture)
+        spare = {}
+        for square, (item, image_key) in list(self.piece_items.items()):
+            if wanted.get(square) != image_key:
+                del self.piece_items[square]
+                spare.setdefault(image_key, []).append(item)
+        for square, image_key in wanted.items():
+            if square in self.piece_items:
+                continue
+            x, y = self.square_origin(*square)
+            items = spare.get(image_key)
+            if items:
+                item = items.pop()
+                canvas.coords(item, x, y)
+            else:
+                item = canvas.create_image(x, y, image=self.piece_image(image_key), anchor="nw", tags="piece")
+            self.piece_items[square] = (item, image_key)
+            updates += 1
+        for items in spare.values():
+            for item in items:
+                canvas.delete(item)
+                updates += 1
+
+        self.last_redraw_updates = updates
+        self.total_redraw_updates += updates
+        self.frames.append((time.perf_counter(), time.perf_counter() - start))
+        if self.fps_label:
+            self.fps_label.config(text=self.render_summary())
+        return updates
+
+    def on_canvas_click(self, event):
+        row, col = event.y // self.square_size, event.x // self.square_size
+        if 0 <= row < 8 and 0 <= col < 8:
+            self.on_click(row, col)
+
+    def on_resize(self, event):
+        size = max(MIN_SQUARE_SIZE, min(event.width, event.height) // 8 // SIZE_STEP * SIZE_STEP)
+        if self.pending_resize:
+            self.root.after_cancel(self.pending_resize)
+            self.pending_resize = None
+        if size != self.square_size:
+            self.pending_resize = self.root.after(RESIZE_DELAY_MS, self.resize_board, size)
+
+    def resize_board(self, size):
+        start = time.perf_counter()
+        self.pending_resize = None
+        self.square_size = size
+        self.sprites.set_size(size)
+        self.images = self.image_sizes.get(size)
+        if self.images is None:
+            self.images = {}
+            self.image_sizes.put(size, self.images)
+        self.layout_board()
+        self.draw_board()
+        self.last_resize_seconds = time.perf_counter() - start
+
+    def render_stats(self):
+        # Redraws per second over the recent window and what each one cost
+        costs = [seconds for _, seconds in self.frames]
+        span = self.frames[-1][0] - self.frames[0][0] if len(self.frames) > 1 else 0
+        return {
+            "fps": round((len(self.frames) - 1) / span, 1) if span else 0.0,
+            "redraw_ms": round(costs[-1] * 1000, 3) if costs else 0.0,
+            "mean_redraw_ms": round(sum(costs) / len(costs) * 1000, 3) if costs else 0.0,
+            "max_redraw_ms": round(max(costs) * 1000, 3) if costs else 0.0,
+            "items_updated": self.last_redraw_updates,
+            "square_size": self.square_size,
+            "resize_ms": round(self.last_resize_seconds * 1000, 3),
+            "sprite_sizes": self.sprites.sizes.stats(),
+        }
+
+    def render_summary(self):
+        stats = self.render_stats()
+        return (f"{stats['fps']:.1f} fps | redraw {stats['redraw_ms']:.2f} ms "
+                f"(mean {stats['mean_redraw_ms']:.2f}, max {stats['max_redraw_ms']:.2f}) | "
+                f"{stats['items_updated']} items | {stats['square_size']} px squares")
 
     def show_turn(self):
         # Don't prompt if game over
         if self.game_over:
             return
 
+        if self.turn == self.ai_color:
+            self.start_ai_turn()
+            return
+
         hand = self.hands[self.turn]
 
         # If hand is empty, skip prompt and allow direct board interaction
@@ -142,38 +287,20 @@ class ChessGUI:
             idx = int(move_or_card.strip()) - 1
             if 0 <= idx < len(hand):
                 card = hand[idx]
-                if card.can_play(self):
-                    self.active_card = card
-                    if isinstance(card, BishopGhostCard):
-                        self.bishop_ghost_active[self.turn] = True
-                    elif isinstance(card, PawnBoostCard):
-                        self.pawn_boost_active[self.turn] = True
-                    elif isinstance(card, KnightmareLoopCard):
-                        self.knightmare_active[self.turn] = True
-                        self.knightmare_state = {
-                            "knight_pos": None,
-                            "capture_done": False,
-                            "first_move_done": False
-                        }
-                        self.knightmare_doing_second_move = False
-                        messagebox.showinfo("Card Activated", f"{card.name} is active! Select your knight to move twice this turn.")
-                        self.selected = None
-                        self.valid_moves = []
-                        self.draw_board()
-                        return
-                    if isinstance(card, DestroyOpponentPieceCard):
-                        self.handle_destroy_card()
-                        if card in self.hands[self.turn]:
-                            self.hands[self.turn].remove(card)
-                        self.active_card = None
-                        self.end_turn()
+                if self.state.can_play(card):
+                    if card.targets is not None:
+                        self.handle_destroy_card(card)
                         return
+                    self.history.play(card_action(card.name))
+                    self.analyse_position()
+                    if card.double_move:
+                        messagebox.showinfo("Card Activated", f"{card.name} is active! Select your knight to move twice this turn.")
                     else:
                         messagebox.showinfo("Card Activated", f"{card.name} is active. Make your move using the card's effect.")
-                        self.selected = None
-                        self.valid_moves = []
-                        self.draw_board()
-                        return
+                    self.selected = None
+                    self.valid_moves = []
+                    self.draw_board()
+                    return
                 else:
                     messagebox.showinfo("Card", "This card cannot be played at this time!")
                     self.show_turn()
@@ -182,17 +309,11 @@ class ChessGUI:
         else:
             self.show_turn()
 
-    def handle_destroy_card(self):
-        opponent = 'black' if self.turn == 'white' else 'white'
-        valid_targets = []
-        for row in range(8):
-            for col in range(8):
-                piece = self.board.board[row][col]
-                if (piece and piece.color == opponent and
-                    piece.__class__.__name__.lower() not in ("king", "queen")):
-                    valid_targets.append((row, col))
+    def handle_destroy_card(self, card):
+        valid_targets = self.state.destroy_targets(card)
         if not valid_targets:
             messagebox.showinfo("Destroy", "No valid opponent pieces to destroy.")
+            self.show_turn()
             return
         coord_str = "\n".join([f"{i+1}: {self.coord_to_alg(row, col)}" for i, (row, col) in enumerate(valid_targets)])
         pick = simpledialog.askstring(
@@ -206,190 +327,184 @@ class ChessGUI:
             idx = int(pick.strip()) - 1
             if 0 <= idx < len(valid_targets):
                 row, col = valid_targets[idx]
-                self.board.board[row][col] = None
+                self.history.play(card_action(card.name, (row, col)))
                 self.draw_board()
                 messagebox.showinfo("Destroyed", f"Piece at {self.coord_to_alg(row, col)} destroyed.")
+                self.end_turn()
+                return
+        self.show_turn()
 
     def coord_to_alg(self, row, col):
         return f"{chr(ord('a')+col)}{8-row}"
 
     def end_turn(self):
-        self.bishop_ghost_active[self.turn] = False
-        self.pawn_boost_active[self.turn] = False
-        self.knightmare_active[self.turn] = False
-        self.knightmare_state = None
-        self.knightmare_doing_second_move = False
-        self.active_card = None
+        # Called once the GameState has handed the turn to the next player;
+        # the checkmate/stalemate verdict arrives from the analysis worker
         self.selected = None
         self.valid_moves = []
+        self.draw_board()
+        self.analyse_position(then=self.finish_turn)
 
-        opponent = 'black' if self.turn == 'white' else 'white'
-        if self.board.is_checkmate(opponent):
-            self.draw_board()
-            messagebox.showinfo("Checkmate", f"{self.turn.capitalize()} wins by checkmate!")
+    def finish_turn(self, analysis):
+        status = analysis.status
+        if status == 'checkmate':
+            messagebox.showinfo("Checkmate", f"{opponent(self.turn).capitalize()} wins by checkmate!")
             self.game_over = True
             self.quit_game()
             return
-        elif self.board.is_stalemate(opponent):
-            self.draw_board()
+        elif status == 'stalemate':
             messagebox.showinfo("Stalemate", "Stalemate! The game is a draw.")
             self.game_over = True
             self.quit_game()
             return
 
-        self.turn = opponent
-        self.draw_board()
+        if status == 'check':
+            messagebox.showinfo("Check", f"{self.turn.capitalize()} is in check!")
         self.show_turn()
 
-    def on_click(self, row, col):
+    # --- history -----------------------------------------------------------------
+
+    def scrub(self, cursor):
+        # Shows the position after `cursor` actions; play carries on only from the latest one
+        if self.game_over or self.ai_thinking or self.after_analysis:
+            return
+        self.history.goto(cursor)
+        self.selected = None
+        self.pending_select = None
+        self.valid_moves = []
+        self.draw_board()
+        if self.history.at_end:
+            self.status_label.config(text="")
+            self.analyse_position()
+        else:
+            turn, turns = self.history.turn_number()
+            self.status_label.config(text=f"Turn {turn} of {turns}, {self.turn} to move | "
+                                          f"End to return, Ctrl+Z to play on from here")
+
+    def takeback(self, event=None):
+        # From the latest position, back to the start of the previous turn you
+        # played; from an earlier one, to the start of the turn on show. The
+        # actions after it are dropped.
+        if self.game_over or self.ai_thinking or self.after_analysis:
+            return
+        history = self.history
+        if history.at_end:
+            human = opponent(self.ai_color) if self.ai_color else None
+            target = history.turn_start(history.cursor - 1, human)
+        else:
+            target = history.turn_start(history.cursor)
+        if target is None:
+            return
+        history.goto(target)
+        history.truncate()
+        self.status_label.config(text=f"Took back to turn {history.turn_number()[0]}")
+        self.end_turn()
+
+    # --- background analysis -----------------------------------------------------
+
+    def analyse_position(self, then=None):
+        # Cancels any analysis still running for an earlier position
+        self.turn_analysis = None
+        self.after_analysis = then
+        self.analysis.submit(self.state.copy())
+        if not self.analysis_polling:
+            self.analysis_polling = True
+            self.root.after(10, self.poll_analysis)
+
+    def poll_analysis(self):
         if self.game_over:
             return
+        analysis = self.analysis.poll()
+        if analysis is None:
+            self.root.after(10, self.poll_analysis)
+            return
+        self.analysis_polling = False
+        self.turn_analysis = analysis
+        if self.pending_select and self.pending_select == self.selected:
+            self.valid_moves = analysis.moves.get(self.selected, [])
+            self.draw_board()
+        self.pending_select = None
+        then, self.after_analysis = self.after_analysis, None
+        if then:
+            then(analysis)
+
+    def select(self, square):
+        # Highlights square's moves now if they are ready, otherwise once they arrive
+        self.selected = square
+        if self.turn_analysis is not None:
+            self.valid_moves = self.turn_analysis.moves.get(square, [])
+        else:
+            self.valid_moves = []
+            self.pending_select = square
+        self.draw_board()
 
-        # Knightmare Loop logic
-        if self.knightmare_active[self.turn]:
-            # First selection: select knight to use
-            if not self.knightmare_state["first_move_done"]:
-                piece = self.board.board[row][col]
-                if piece and piece.color == self.turn and piece.__class__.__name__.lower() == "knight":
-                    self.selected = (row, col)
-                    all_moves = piece.get_valid_moves(self.board, row, col, self)
-                    self.valid_moves = []
-                    for (r, c) in all_moves:
-                        board_copy = self.board.copy()
-                        board_copy.move_piece(row, col, r, c)
-                        if not board_copy.is_in_check(self.turn):
-                            self.valid_moves.append((r, c))
-                    self.draw_board()
-                elif self.selected and (row, col) in self.valid_moves:
-                    from_row, from_col = self.selected
-                    moving_piece = self.board.board[from_row][from_col]
-                    target = self.board.board[row][col]
-                    capture = target is not None
-                    self.board.move_piece(from_row, from_col, row, col)
-                    # Save which knight is moving, and whether capture occurred
-                    self.knightmare_state["knight_pos"] = (row, col)
-                    self.knightmare_state["capture_done"] = capture
-                    self.knightmare_state["first_move_done"] = True
-                    self.knightmare_doing_second_move = True
-                    # Now highlight the same knight for its second move
-                    self.selected = (row, col)
-                    all_moves = moving_piece.get_valid_moves(self.board, row, col, self)
-                    self.valid_moves = []
-                    for (r, c) in all_moves:
-                        # On second move, restrict captures if already captured
-                        if capture:
-                            if self.board.board[r][c] is None:
-                                board_copy = self.board.copy()
-                                board_copy.move_piece(row, col, r, c)
-                                if not board_copy.is_in_check(self.turn):
-                                    self.valid_moves.append((r, c))
-                        else:
-                            board_copy = self.board.copy()
-                            board_copy.move_piece(row, col, r, c)
-                            if not board_copy.is_in_check(self.turn):
-                                self.valid_moves.append((r, c))
-                    self.draw_board()
-                else:
-                    self.selected = None
-                    self.valid_moves = []
-                    self.draw_board()
-            # Second move
-            elif self.knightmare_doing_second_move and self.selected:
-                from_row, from_col = self.selected
-                knight_pos = self.knightmare_state["knight_pos"]
-                if (from_row, from_col) != knight_pos:
-                    self.selected = knight_pos
-                    from_row, from_col = knight_pos
-                piece = self.board.board[from_row][from_col]
-                if piece is None or piece.__class__.__name__.lower() != "knight":
-                    self.end_turn()
-                    return
-                if (row, col) in self.valid_moves:
-                    target = self.board.board[row][col]
-                    # On second move, can only capture if no capture yet
-                    if self.knightmare_state["capture_done"]:
-                        if target is not None:
-                            # Invalid, can't capture again
-                            return
-                    self.board.move_piece(from_row, from_col, row, col)
-                    # Clean up
-                    if self.active_card and self.active_card in self.hands[self.turn]:
-                        self.hands[self.turn].remove(self.active_card)
-                    self.active_card = None
-                    self.knightmare_active[self.turn] = False
-                    self.knightmare_state = None
-                    self.knightmare_doing_second_move = False
-                    self.selected = None
-                    self.valid_moves = []
-                    self.draw_board()
-                    # Check checkmate/stalemate
-                    opponent = 'black' if self.turn == 'white' else 'white'
-                    if self.board.is_checkmate(opponent):
-                        self.draw_board()
-                        messagebox.showinfo("Checkmate", f"{self.turn.capitalize()} wins by checkmate!")
-                        self.game_over = True
-                        self.quit_game()
-                        return
-                    elif self.board.is_stalemate(opponent):
-                        self.draw_board()
-                        messagebox.showinfo("Stalemate", "Stalemate! The game is a draw.")
-                        self.game_over = True
-                        self.quit_game()
-                        return
-                    elif self.board.is_in_check(opponent):
-                        messagebox.showinfo("Check", f"{('Black' if self.turn == 'white' else 'White')} is in check!")
-                    self.end_turn()
-                    return
-                else:
-                    # Did not pick valid move, stay on knight
-                    self.selected = (from_row, from_col)
-                    self.draw_board()
+    def start_ai_turn(self):
+        self.ai_thinking = True
+        self.status_label.config(text=f"{self.turn.capitalize()} (computer) is thinking...")
+        worker = threading.Thread(target=self.ai_worker, args=(self.state.copy(),), daemon=True)
+        worker.start()
+        self.root.after(50, self.poll_ai)
+
+    def ai_worker(self, state):
+        self.ai_results.put(choose_turn(state, self.ai_time, book=self.ai_book))
+
+    def poll_ai(self):
+        if self.game_over:
+            return
+        try:
+            actions, info = self.ai_results.get_nowait()
+        except queue.Empty:
+            self.root.after(50, self.poll_ai)
             return
+        self.ai_thinking = False
+        played = []
+        for action in actions:
+            self.history.play(action)
+            if action.kind == 'card':
+                played.append(action.card if not action.target else
+                              f"{action.card} {self.coord_to_alg(*action.target)}")
+            elif action.kind == 'draw':
+                played.append("draw")
+            else:
+                played.append(f"{self.coord_to_alg(*action.start)}-{self.coord_to_alg(*action.end)}")
+        if info and info.get("book"):
+            self.status_label.config(text=f"Computer played {', '.join(played)} | book, {info['book']} games")
+        elif info and info.get("tablebase"):
+            self.status_label.config(text=f"Computer played {', '.join(played)} | tablebase, {info['tablebase']}")
+        elif info:
+            self.status_label.config(text=f"Computer played {', '.join(played)} | depth {info['depth']}, "
+                                          f"{info['nodes']} nodes, {info['nps']} nodes/s")
+        self.end_turn()
 
-        piece = self.board.board[row][col]
-        if self.selected:
-            from_row, from_col = self.selected
-            moving_piece = self.board.board[from_row][from_col]
-            if (row, col) in self.valid_moves:
-                self.board.move_piece(from_row, from_col, row, col)
-                # Remove card if active
-                if self.active_card:
-                    if self.active_card in self.hands[self.turn]:
-                        self.hands[self.turn].remove(self.active_card)
-                    self.active_card = None
-                    self.bishop_ghost_active[self.turn] = False
-                    self.pawn_boost_active[self.turn] = False
-
-                # Check for check after move
-                opponent = 'black' if self.turn == 'white' else 'white'
-                if self.board.is_checkmate(opponent):
-                    self.draw_board()
-                    messagebox.showinfo("Checkmate", f"{self.turn.capitalize()} wins by checkmate!")
-                    self.game_over = True
-                    self.quit_game()
-                    return
-                elif self.board.is_stalemate(opponent):
-                    self.draw_board()
-                    messagebox.showinfo("Stalemate", "Stalemate! The game is a draw.")
-                    self.game_over = True
-                    self.quit_game()
-                    return
-                elif self.board.is_in_check(opponent):
-                    messagebox.showinfo("Check", f"{('Black' if self.turn == 'white' else 'White')} is in check!")
-                self.end_turn()
+    def on_click(self, row, col):
+        # Ignored while the computer thinks, the turn hand-over is still being
+        # analysed, or an earlier position is on show
+        if self.game_over or self.ai_thinking or self.after_analysis or not self.history.at_end:
+            return
+
+        if self.selected and (row, col) in self.valid_moves:
+            mover = self.turn
+            self.history.play(move_action(self.selected, (row, col)))
+            if self.turn == mover:
+                # Knightmare Loop: the same knight now makes its second move
+                self.analyse_position()
+                self.select((row, col))
                 return
+            self.end_turn()
+            return
+
+        if self.state.knightmare_doing_second_move:
+            # Did not pick a valid move, stay on the knight
+            self.select(self.state.knightmare_state["knight_pos"])
+            return
 
+        piece = self.board.board[row][col]
+        if self.selected:
+            # Clicking elsewhere drops the selection and any highlight still on its way
             self.selected = None
+            self.pending_select = None
             self.valid_moves = []
             self.draw_board()
 
         elif piece and piece.color == self.turn:
-            self.selected = (row, col)
-            all_moves = piece.get_valid_moves(self.board, row, col, self)
-            self.valid_moves = []
-            for (r, c) in all_moves:
-                board_copy = self.board.copy()
-                board_copy.move_piece(row, col, r, c)
-                if not board_copy.is_in_check(self.turn):
-                    self.valid_moves.append((r, c))
-            self.draw_board()
\ No newline at end of file
+            self.select((row, col))
@@ -1,19 +1,44 @@
 # game.py
-from board import Board
+from gamestate import GameState, card_action, move_action
+from board import FEN_LETTERS
 
 class ChessGame:
     def __init__(self):
-        self.board = Board()
-        self.turn = 'white'
+        self.state = GameState()
+
+    @property
+    def board(self):
+        return self.state.board
+
+    @property
+    def turn(self):
+        return self.state.turn
+
+    def display(self):
+        print()
+        for row in range(8):
+            line = []
+            for col in range(8):
+                piece = self.board.board[row][col]
+                if piece is None:
+                    line.append('.')
+                else:
+                    letter = FEN_LETTERS[type(piece)]
+                    line.append(letter.upper() if piece.color == 'white' else letter)
+            print(f"{8 - row}  {' '.join(line)}")
+        print("\n   a b c d e f g h\n")
 
     def start(self):
         while True:
-            self.board.display()
+            self.display()
 
-            if self.board.is_checkmate(self.turn):
-                winner = 'black' if self.turn == 'white' else 'white'
+            result = self.state.result()
+            if result is not None:
                 print("\n" + "=" * 35)
-                print(f"|       CHECKMATE! {winner.upper()} WINS!    |")
+                if result == 'draw':
+                    print("|     STALEMATE! IT'S A DRAW.     |")
+                else:
+                    print(f"|       CHECKMATE! {result.upper()} WINS!    |")
                 print("=" * 35 + "\n")
                 play_again = input("Would you like to play again? (Y/N): ").strip().lower()
                 if play_again.startswith('y'):
@@ -23,39 +48,55 @@ class ChessGame:
                     print("Thanks for playing!")
                     break
 
-            elif self.board.is_in_check(self.turn):
+            elif self.state.status() == 'check':
                 print("CHECK!")
 
+            if self.state.turn_started():
+                hand = self.state.hands[self.turn]
+                for i, card in enumerate(hand):
+                    print(f"  card {i+1}: {card.name} ({card.description})")
             print(f"{self.turn.capitalize()}'s move")
-            move = input("Enter move (e.g., e2 e4 or 'quit'): ").strip().lower()
+            move = input("Enter move (e.g., e2 e4, 'card 1', 'card 3 e7' or 'quit'): ").strip().lower()
 
             if move == 'quit':
                 print("Thanks for playing!")
                 break
 
             try:
-                start_pos, end_pos = move.split()
-                from_row, from_col = self.convert_to_coords(start_pos)
-                to_row, to_col = self.convert_to_coords(end_pos)
-
-                piece = self.board.board[from_row][from_col]
-
-                if not piece or piece.color != self.turn:
-                    print("Invalid piece. Try again.")
-                    continue
-
-                valid_moves = piece.get_valid_moves(self.board)
-                if (to_row, to_col) not in valid_moves:
-                    print("Invalid move. Try again.")
-                    continue
-
-                self.board.move_piece(from_row, from_col, to_row, to_col)
-                self.turn = 'black' if self.turn == 'white' else 'white'
-
-            except ValueError:
+                action = self.parse_action(move)
+            except (ValueError, IndexError):
                 print("Invalid input format. Use e.g., e2 e4")
+                continue
+            if action is None:
+                print("Invalid move. Try again.")
+                continue
+            mover = self.turn
+            try:
+                self.state.apply(action)
+            except ValueError:
+                print("Invalid move. Try again.")
+                continue
+            if action.kind == 'card' and self.turn == mover:
+                print(f"{action.card} is active.")
+
+    def parse_action(self, text):
+        words = text.split()
+        if words[0] == 'card':
+            hand = self.state.hands[self.turn]
+            idx = int(words[1]) - 1
+            if not 0 <= idx < len(hand):
+                return None
+            card = hand[idx]
+            target = None
+            if card.targets is not None:
+                target = self.convert_to_coords(words[2])
+            return card_action(card.name, target)
+        start_pos, end_pos = words
+        return move_action(self.convert_to_coords(start_pos), self.convert_to_coords(end_pos))
 
     def convert_to_coords(self, pos):
         col = ord(pos[0]) - ord('a')
         row = 8 - int(pos[1])
+        if not (0 <= row < 8 and 0 <= col < 8):
+            raise ValueError(pos)
         return (row, col)
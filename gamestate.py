@@ -0,0 +1,393 @@
+# gamestate.py
+# Headless rules engine: owns the board, the turn, both hands and the
+# active card effects. ChessGUI and the console ChessGame are front-ends
+# over it, and nothing here imports tkinter or PIL.
+from array import array
+from collections import namedtuple
+from board import Board
+from card import CARDS_BY_CODE, CARDS_BY_LETTER, PawnBoostCard, BishopGhostCard, DestroyOpponentPieceCard, KnightmareLoopCard
+from pieces import Knight
+from zobrist import (CARD_ACTIVE_KEY, KNIGHT_POS_KEYS, KNIGHTMARE_PENDING_KEY, SIDE_KEYS,
+                     card_key, hand_key)
+
+# kind is 'move' (start and end squares), 'card' (card name, plus the
+# target square for Destroy Opponent Piece) or 'draw' (take the top card
+# of your deck, which uses up the turn)
+Action = namedtuple('Action', ['kind', 'start', 'end', 'card', 'target'],
+                    defaults=(None, None, None, None))
+
+
+def move_action(start, end):
+    return Action('move', tuple(start), tuple(end))
+
+
+def card_action(name, target=None):
+    return Action('card', card=name, target=tuple(target) if target else None)
+
+
+DRAW = Action('draw')
+
+# GameState.history holds one int per applied action in an array('Q') (8 bytes
+# each; the board keeps its own packed undo entries): everything the action
+# changed apart from the board, as it was before.
+#   bit 0       turn was black
+#   bits 1-6    ghost, boost and knightmare flags, white then black for each
+#   bit 7       knightmare_doing_second_move
+#   bits 8-12   active card code + 1, 0 for none
+#   bits 13-15  knightmare_state present, first hop done, capture done
+#   bits 16-22  knight square + 1, 0 for none
+#   bits 23-24  board undo entries the action pushed
+#   bits 25-26  hand change: HAND_PLAYED or HAND_DRAWN
+#   bits 27-31  played card code
+#   bits 32-39  played card's index in the hand
+HAND_PLAYED, HAND_DRAWN = 1, 2
+
+
+def opponent(color):
+    return 'black' if color == 'white' else 'white'
+
+
+def square_name(square):
+    return f"{chr(ord('a') + square[1])}{8 - square[0]}"
+
+
+def parse_square(name):
+    col = ord(name[0]) - ord('a')
+    row = 8 - int(name[1:])
+    if len(name) != 2 or not (0 <= row < 8 and 0 <= col < 8):
+        raise ValueError(f"Bad square: {name!r}")
+    return (row, col)
+
+
+def starting_hand():
+    return [PawnBoostCard(), BishopGhostCard(), DestroyOpponentPieceCard(), KnightmareLoopCard()]
+
+
+class GameState:
+    def __init__(self, board=None, turn='white', hands=None, decks=None):
+        self.board = board if board is not None else Board()
+        self.turn = turn
+        self.hands = hands if hands is not None else {'white': starting_hand(), 'black': starting_hand()}
+        # Draw piles, top card last; empty unless a deck is dealt
+        self.decks = decks if decks is not None else {'white': [], 'black': []}
+        self.bishop_ghost_active = {'white': False, 'black': False}
+        self.pawn_boost_active = {'white': False, 'black': False}
+        self.knightmare_active = {'white': False, 'black': False}
+        self.knightmare_state = None  # Track knight pos, capture, moves for this turn
+        self.knightmare_doing_second_move = False
+        self.active_card = None  # Card whose effect applies to the rest of this turn
+        self.history = array('Q')  # Packed entries pushed by apply and popped by undo, see above
+        self.tablebase = None  # Optional tablebase.Tablebase that status() asks first
+
+    # --- queries -----------------------------------------------------------------
+
+    def can_play(self, card):
+        if self.active_card is not None or card not in self.hands[self.turn]:
+            return False
+        # Compiled from card_data; Knightmare Loop also needs a legal first hop
+        if not card.can_play(self):
+            return False
+        if card.flag is None:
+            return True
+        # A modifier must leave a legal move under its flag, or the turn could
+        # never end; undo rebuilds the card, so the hand gets its own objects back
+        hand = list(self.hands[self.turn])
+        self.apply(card_action(card.name), validate=False)
+        try:
+            return bool(self.move_actions())
+        finally:
+            self.undo()
+            self.hands[self.turn][:] = hand
+
+    def resolves_check(self, change):
+        # Turn-ending actions other than moves must not leave the king in check
+        change()
+        safe = not self.board.is_in_check(self.turn)
+        self.board.unmake_move()
+        return safe
+
+    def destroy_targets(self, card):
+        in_check = self.board.is_in_check(self.turn)
+        targets = []
+        for row, col in sorted(self.board.locations(opponent(self.turn), card.targets)):
+            if in_check and not self.resolves_check(lambda: self.board.remove_piece(row, col)):
+                continue
+            targets.append((row, col))
+        return targets
+
+    def can_draw(self):
+        return (self.active_card is None and bool(self.decks[self.turn])
+                and not self.board.is_in_check(self.turn))
+
+    def card_actions(self):
+        actions = []
+        seen = set()
+        for card in self.hands[self.turn]:
+            if card.name in seen or not self.can_play(card):
+                continue
+            seen.add(card.name)
+            if card.targets is not None:
+                actions.extend(card_action(card.name, target) for target in self.destroy_targets(card))
+            else:
+                actions.append(card_action(card.name))
+        return actions
+
+    def move_actions(self):
+        if self.knightmare_active[self.turn]:
+            if self.knightmare_doing_second_move:
+                squares = [self.knightmare_state["knight_pos"]]
+            else:
+                squares = self.board.locations(self.turn, (Knight,))
+            # Only the knight(s) move, so skip the whole-board analysis
+            return [move_action(start, end) for start in squares
+                    for end in self.board.piece_legal_moves(start[0], start[1], self)]
+        return [move_action(start, end) for start, end in self.board.all_legal_moves(self.turn, self)]
+
+    def moves_from(self, row, col):
+        return [action.end for action in self.move_actions() if action.start == (row, col)]
+
+    def legal_actions(self):
+        if self.result() is not None:
+            return []
+        actions = self.move_actions()
+        if self.active_card is None:
+            actions.extend(self.card_actions())
+        if self.can_draw():
+            actions.append(DRAW)
+        return actions
+
+    def key(self):
+        # Zobrist key of the whole game state: board, side, card effects, hands and decks
+        key = (self.board.hash ^ SIDE_KEYS[self.turn] ^ card_key(self, self.turn)
+               ^ hand_key(self.hands, self.decks))
+        if self.active_card is not None:
+            key ^= CARD_ACTIVE_KEY
+        if self.knightmare_active[self.turn]:
+            key ^= KNIGHTMARE_PENDING_KEY
+            if self.knightmare_doing_second_move:
+                row, col = self.knightmare_state["knight_pos"]
+                key ^= KNIGHT_POS_KEYS[row * 8 + col]
+        return key
+
+    def copy(self):
+        # Independent state for another thread or process; cards are stateless and shared
+        board = self.board.copy()
+        board.cache = type(board.cache)(board.cache.maxsize)
+        other = GameState(board, self.turn,
+                          {color: list(hand) for color, hand in self.hands.items()},
+                          {color: list(deck) for color, deck in self.decks.items()})
+        other._unpack(self._pack())
+        other.tablebase = self.tablebase
+        return other
+
+    # --- extended FEN ------------------------------------------------------------
+    # Board.fen() plus two fields, and a third when decks are dealt:
+    #   effect  "-", or the active card's letter; Knightmare adds the knight's
+    #           square once it has hopped, and "x" if that hop captured ("Kf3x")
+    #   hands   white/black card letters, e.g. "PGDK/PGK", "-" for an empty hand
+    #   decks   same layout, top card last
+
+    def fen(self):
+        effect = "-"
+        if self.active_card is not None:
+            effect = self.active_card.letter
+            if self.knightmare_doing_second_move:
+                effect += square_name(self.knightmare_state["knight_pos"])
+                if self.knightmare_state["capture_done"]:
+                    effect += "x"
+
+        def piles(cards):
+            return "/".join("".join(card.letter for card in cards[color]) or "-" for color in ('white', 'black'))
+
+        fields = [self.board.fen(self.turn), effect, piles(self.hands)]
+        if any(self.decks.values()):
+            fields.append(piles(self.decks))
+        return " ".join(fields)
+
+    @classmethod
+    def from_fen(cls, fen, board_cls=Board):
+        # Plain FEN works too: no active card and the starting hands
+        fields = fen.split()
+        board = board_cls()
+        turn = board.set_fen(" ".join(fields[:6]))
+        hands = decks = None
+        try:
+            if len(fields) > 7:
+                hands = cls._parse_piles(fields[7])
+            if len(fields) > 8:
+                decks = cls._parse_piles(fields[8])
+        except KeyError as e:
+            raise ValueError(f"Unknown card letter {e.args[0]!r}: {fen!r}") from None
+        state = cls(board, turn, hands, decks)
+        effect = fields[6] if len(fields) > 6 else "-"
+        if effect != "-":
+            card = CARDS_BY_LETTER.get(effect[0])
+            if card is None or card.flag is None:
+                raise ValueError(f"Bad card effect {effect!r}: {fen!r}")
+            state.active_card = card()
+            getattr(state, card.flag)[turn] = True
+            if card.double_move:
+                state.knightmare_state = {"knight_pos": None, "capture_done": False, "first_move_done": False}
+                if len(effect) > 1:
+                    state.knightmare_state = {"knight_pos": parse_square(effect[1:3]),
+                                              "capture_done": effect.endswith("x"), "first_move_done": True}
+                    state.knightmare_doing_second_move = True
+        return state
+
+    @staticmethod
+    def _parse_piles(field):
+        white, black = field.split("/")
+        return {color: [CARDS_BY_LETTER[letter]() for letter in letters if letter != "-"]
+                for color, letters in (('white', white), ('black', black))}
+
+    def turn_started(self):
+        return self.active_card is None
+
+    def status(self):
+        # 'checkmate', 'stalemate' or 'check' for the side to move, else None
+        if not self.turn_started():
+            return None
+        probe = self.tablebase.probe_state(self) if self.tablebase is not None else None
+        if probe is not None:
+            # The table knows mate and stalemate without generating a move
+            if probe.mated:
+                return 'checkmate'
+            if probe.stalemated:
+                return 'stalemate'
+            return 'check' if self.board.is_in_check(self.turn) else None
+        if self.board.is_checkmate(self.turn):
+            return 'checkmate'
+        if self.board.is_stalemate(self.turn):
+            return 'stalemate'
+        if self.board.is_in_check(self.turn):
+            return 'check'
+        return None
+
+    def result(self):
+        # Winning colour, 'draw', or None while the game is still going
+        status = self.status()
+        if status == 'checkmate':
+            return opponent(self.turn)
+        if status == 'stalemate':
+            return 'draw'
+        return None
+
+    # --- transitions -------------------------------------------------------------
+
+    def find_card(self, name):
+        for card in self.hands[self.turn]:
+            if card.name == name:
+                return card
+        return None
+
+    def apply(self, action, validate=True):
+        if validate and action not in self.legal_actions():
+            raise ValueError(f"Illegal action for {self.turn}: {action}")
+        packed = self._pack()
+        depth = len(self.board.undo_stack)
+        if action.kind == 'card':
+            packed |= self._play_card(action)
+        elif action.kind == 'draw':
+            packed |= self._draw_card()
+        else:
+            self._move(action.start, action.end)
+        self.history.append(packed | (len(self.board.undo_stack) - depth) << 23)
+
+    def undo(self):
+        packed = self.history.pop()
+        for _ in range(packed >> 23 & 3):
+            self.board.unmake_move()
+        self._unpack(packed)
+        hand = packed >> 25 & 3
+        if hand == HAND_PLAYED:
+            self.hands[self.turn].insert(packed >> 32 & 255, CARDS_BY_CODE[packed >> 27 & 31]())
+        elif hand == HAND_DRAWN:
+            self.decks[self.turn].append(self.hands[self.turn].pop())
+
+    def _draw_card(self):
+        color = self.turn
+        card = self.decks[color].pop()
+        self.hands[color].append(card)
+        self.end_turn()
+        return HAND_DRAWN << 25
+
+    def _play_card(self, action):
+        # Returns the history bits recording which card left which hand slot
+        card = self.find_card(action.card)
+        hand = self.hands[self.turn]
+        removed = HAND_PLAYED << 25 | card.code << 27 | hand.index(card) << 32
+        hand.remove(card)
+        if card.targets is not None:
+            self.board.remove_piece(*action.target)
+            self.end_turn()
+            return removed
+        self.active_card = card
+        if card.flag:
+            getattr(self, card.flag)[self.turn] = True
+        if card.double_move:
+            self.knightmare_state = {
+                "knight_pos": None,
+                "capture_done": False,
+                "first_move_done": False
+            }
+            self.knightmare_doing_second_move = False
+        return removed
+
+    def _move(self, start, end):
+        capture = self.board.board[end[0]][end[1]] is not None
+        self.board.make_move(start[0], start[1], end[0], end[1])
+        if self.knightmare_active[self.turn] and not self.knightmare_state["first_move_done"]:
+            # Same knight moves again; only one capture over both hops
+            self.knightmare_state = {
+                "knight_pos": tuple(end),
+                "capture_done": capture,
+                "first_move_done": True
+            }
+            self.knightmare_doing_second_move = True
+            if self.board.piece_legal_moves(end[0], end[1], self):
+                return
+        self.end_turn()
+
+    def end_turn(self):
+        self.bishop_ghost_active[self.turn] = False
+        self.pawn_boost_active[self.turn] = False
+        self.knightmare_active[self.turn] = False
+        self.knightmare_state = None
+        self.knightmare_doing_second_move = False
+        self.active_card = None
+        self.turn = opponent(self.turn)
+
+    def _pack(self):
+        # Turn and card effects as the low 23 bits of a history entry
+        ghost, boost, knightmare = self.bishop_ghost_active, self.pawn_boost_active, self.knightmare_active
+        packed = ((self.turn == 'black') | ghost['white'] << 1 | ghost['black'] << 2 | boost['white'] << 3
+                  | boost['black'] << 4 | knightmare['white'] << 5 | knightmare['black'] << 6
+                  | self.knightmare_doing_second_move << 7)
+        if self.active_card is not None:
+            packed |= (self.active_card.code + 1) << 8
+        state = self.knightmare_state
+        if state is not None:
+            packed |= 1 << 13 | state["first_move_done"] << 14 | state["capture_done"] << 15
+            if state["knight_pos"] is not None:
+                row, col = state["knight_pos"]
+                packed |= (row * 8 + col + 1) << 16
+        return packed
+
+    def _unpack(self, packed):
+        self.turn = 'black' if packed & 1 else 'white'
+        ghost, boost, knightmare = self.bishop_ghost_active, self.pawn_boost_active, self.knightmare_active
+        ghost['white'], ghost['black'] = bool(packed & 2), bool(packed & 4)
+        boost['white'], boost['black'] = bool(packed & 8), bool(packed & 16)
+        knightmare['white'], knightmare['black'] = bool(packed & 32), bool(packed & 64)
+        self.knightmare_doing_second_move = bool(packed & 128)
+        code = (packed >> 8 & 31) - 1
+        if code < 0:
+            self.active_card = None
+        elif self.active_card is None or self.active_card.code != code:
+            self.active_card = CARDS_BY_CODE[code]()
+        self.knightmare_state = None
+        if packed & 1 << 13:
+            square = (packed >> 16 & 127) - 1
+            self.knightmare_state = {"knight_pos": divmod(square, 8) if square >= 0 else None,
+                                     "capture_done": bool(packed & 1 << 15),
+                                     "first_move_done": bool(packed & 1 << 14)}
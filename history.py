@@ -0,0 +1,126 @@
+# history.py
+# The line a game has taken, for takeback, replay and scrubbing through it
+# (ChessGUI's arrow keys). Each action played is one 32-bit word; any
+# earlier position is reached by undoing actions on the one GameState, and
+# later ones by re-applying them from the line. GameState.history and the
+# board's undo stack are packed arrays too, so a ply costs a few dozen bytes
+# however long the game gets, and stepping one action either way is O(1).
+#
+# Action word:
+#   bits 0-1    kind: 0 move, 1 card, 2 draw
+#   bits 2-7    move start square (row * 8 + col)
+#   bits 8-13   move end square, or the card's target square
+#   bits 14-18  card code (card_data)
+#   bit 19      set when the card has a target
+from array import array
+from bisect import bisect_right
+from card import CARDS_BY_CODE, CARDS_BY_NAME
+from gamestate import DRAW, card_action, move_action
+
+KINDS = ('move', 'card', 'draw')
+HAS_TARGET = 1 << 19
+
+
+def _square(pos):
+    return pos[0] * 8 + pos[1]
+
+
+def pack_action(action):
+    kind = KINDS.index(action.kind)
+    if action.kind == 'move':
+        return _square(action.start) << 2 | _square(action.end) << 8
+    if action.kind == 'draw':
+        return kind
+    word = kind | CARDS_BY_NAME[action.card].code << 14
+    if action.target:
+        word |= HAS_TARGET | _square(action.target) << 8
+    return word
+
+
+def unpack_action(word):
+    kind = KINDS[word & 3]
+    if kind == 'move':
+        return move_action(divmod(word >> 2 & 63, 8), divmod(word >> 8 & 63, 8))
+    if kind == 'draw':
+        return DRAW
+    target = divmod(word >> 8 & 63, 8) if word & HAS_TARGET else None
+    return card_action(CARDS_BY_CODE[word >> 14 & 31].name, target)
+
+
+class GameHistory:
+    def __init__(self, state):
+        self.state = state
+        self.line = array('I')  # every action played, including any stepped back over
+        self.cursor = 0  # actions of the line currently applied to state
+        # cursor << 1 | side to move (1 = black) wherever a turn begins
+        self.turn_starts = array('I')
+        if state.turn_started():
+            self.turn_starts.append(state.turn == 'black')
+
+    def __len__(self):
+        return len(self.line)
+
+    @property
+    def at_end(self):
+        return self.cursor == len(self.line)
+
+    def play(self, action, validate=True):
+        # A new action from the current position; the line after it is dropped
+        self.truncate()
+        mover = self.state.turn
+        self.state.apply(action, validate)
+        self.line.append(pack_action(action))
+        self.cursor += 1
+        if self.state.turn != mover:
+            self.turn_starts.append(self.cursor << 1 | (self.state.turn == 'black'))
+
+    def truncate(self):
+        del self.line[self.cursor:]
+        del self.turn_starts[bisect_right(self.turn_starts, self.cursor << 1 | 1):]
+
+    def back(self):
+        # Undoes the last applied action and returns it, None at the start
+        if self.cursor == 0:
+            return None
+        self.state.undo()
+        self.cursor -= 1
+        return unpack_action(self.line[self.cursor])
+
+    def forward(self):
+        # Re-applies the next action of the line and returns it, None at the end
+        if self.cursor == len(self.line):
+            return None
+        action = unpack_action(self.line[self.cursor])
+        self.state.apply(action, validate=False)
+        self.cursor += 1
+        return action
+
+    def goto(self, cursor):
+        cursor = max(0, min(cursor, len(self.line)))
+        while self.cursor > cursor:
+            self.back()
+        while self.cursor < cursor:
+            self.forward()
+
+    def turn_start(self, at, color=None):
+        # Cursor of the latest turn beginning at or before `at`, optionally only
+        # colour's turns; None if there is none
+        index = bisect_right(self.turn_starts, max(at, -1) << 1 | 1)
+        while index > 0:
+            index -= 1
+            entry = self.turn_starts[index]
+            if color is None or (entry & 1) == (color == 'black'):
+                return entry >> 1
+        return None
+
+    def turn_number(self):
+        # (turns begun by the current position, turns in the whole line)
+        return bisect_right(self.turn_starts, self.cursor << 1 | 1), len(self.turn_starts)
+
+    def actions(self):
+        return [unpack_action(word) for word in self.line]
+
+    def nbytes(self):
+        # Array storage behind the line and the undo records it relies on
+        arrays = (self.line, self.turn_starts, self.state.history, self.state.board.undo_stack)
+        return sum(len(values) * values.itemsize for values in arrays)
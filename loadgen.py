@@ -0,0 +1,145 @@
+# loadgen.py
+# Load generator for server.py: simulated players in pairs, each player on
+# its own TCP connection, playing random legal actions as fast as the
+# server answers. Reports moves per second and round-trip latency.
+#
+#   python loadgen.py --players 2000 --duration 30 --port 8765
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+        self.pending = {}
+        self.updates = 0
+        self.listener = asyncio.ensure_future(self.listen())
+
+    @classmethod
+    async def connect(cls, host, port):
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        return cls(reader, writer)
+
+    async def listen(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            future = self.pending.pop(message.get("id"), None)
+            if future is not None:
+                future.set_result(message)
+            else:
+                self.updates += 1  # broadcast from the opponent's move
+        for future in self.pending.values():
+            future.set_exception(ConnectionError("server closed the connection"))
+
+    async def request(self, message):
+        message["id"] = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[message["id"]] = future
+        self.writer.write(json.dumps(message, separators=(',', ':')).encode() + b"\n")
+        return await future
+
+    async def close(self):
+        self.listener.cancel()
+        self.writer.close()
+
+
+class Stats:
+    def __init__(self):
+        self.moves = 0
+        self.games = 0
+        self.errors = 0
+        self.latencies = []
+
+    def percentile(self, fraction):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def play_pair(host, port, stats, deadline, max_plies, rng):
+    white = await Client.connect(host, port)
+    black = await Client.connect(host, port)
+    players = {'white': white, 'black': black}
+    try:
+        while time.perf_counter() < deadline:
+            game = (await white.request({"op": "create"}))["game"]
+            await black.request({"op": "join", "game": game})
+            turn = 'white'
+            for _ in range(max_plies):
+                if time.perf_counter() >= deadline:
+                    break
+                client = players[turn]
+                actions = (await client.request({"op": "actions", "game": game}))["actions"]
+                if not actions:
+                    break
+                start = time.perf_counter()
+                reply = await client.request({"op": "action", "game": game, "action": rng.choice(actions)})
+                stats.latencies.append(time.perf_counter() - start)
+                if reply["op"] != "update":
+                    stats.errors += 1
+                    break
+                stats.moves += 1
+                turn = reply["turn"]
+                if reply["result"]:
+                    break
+            stats.games += 1
+            await white.request({"op": "leave", "game": game})
+            await black.request({"op": "leave", "game": game})
+    finally:
+        await white.close()
+        await black.close()
+
+
+async def run(host, port, players, duration, max_plies, seed, ramp):
+    stats = Stats()
+    start = time.perf_counter()
+    deadline = start + duration
+    tasks = []
+    for i in range(players // 2):
+        tasks.append(asyncio.ensure_future(
+            play_pair(host, port, stats, deadline, max_plies, random.Random(seed + i))))
+        if ramp:
+            await asyncio.sleep(ramp)
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    failures = [r for r in results if isinstance(r, Exception)]
+    seconds = time.perf_counter() - start
+    return {
+        "players": players // 2 * 2,
+        "seconds": round(seconds, 2),
+        "games": stats.games,
+        "moves": stats.moves,
+        "moves_per_second": round(stats.moves / seconds, 1),
+        "latency_ms_p50": round(stats.percentile(0.50) * 1000, 2),
+        "latency_ms_p99": round(stats.percentile(0.99) * 1000, 2),
+        "errors": stats.errors,
+        "failed_pairs": len(failures),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Chess World Champions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--players", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--max-plies", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ramp", type=float, default=0.001, help="seconds between connecting pairs")
+    args = parser.parse_args(argv)
+    report = asyncio.run(run(args.host, args.port, args.players, args.duration,
+                             args.max_plies, args.seed, args.ramp))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
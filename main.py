@@ -1,7 +1,32 @@
+import argparse
 from tkinter import Tk
 from chessgui import ChessGUI
+from board import Board
+from bitboard import BitBoard
+from book import OpeningBook
+from tablebase import Tablebase
+import profiling
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chess World Champions")
+    parser.add_argument("--bitboard", action="store_true", help="use the bitboard rules backend")
+    parser.add_argument("--ai", choices=["white", "black"], help="let the computer play this colour")
+    parser.add_argument("--ai-time", type=float, default=2.0, help="computer thinking time in seconds")
+    parser.add_argument("--book", metavar="PATH", help="opening book for the computer (see book.py)")
+    parser.add_argument("--tablebase", metavar="DIR", help="endgame tables built by tbgen.py")
+    parser.add_argument("--square-size", type=int, default=64, help="starting square size in pixels; "
+                        "resize the window to change it")
+    parser.add_argument("--fps", action="store_true", help="show redraw rate and cost under the board")
+    parser.add_argument("--profile", nargs="?", const=True, metavar="PREFIX",
+                        help="time hot paths and write PREFIX.txt/.json on exit (see profiling.py)")
+    parser.add_argument("--profile-span", metavar="NAME[:N]", help="also cProfile the Nth call of NAME")
+    args = parser.parse_args()
+    profiling.setup(args.profile, args.profile_span)
+
     root = Tk()
-    app = ChessGUI(root)
-    root.mainloop()
\ No newline at end of file
+    board_cls = BitBoard if args.bitboard else Board
+    book = OpeningBook(args.book) if args.book else None
+    tablebase = Tablebase(args.tablebase) if args.tablebase else None
+    app = ChessGUI(root, board_cls, ai_color=args.ai, ai_time=args.ai_time, book=book,
+                   square_size=args.square_size, show_fps=args.fps, tablebase=tablebase)
+    root.mainloop()
@@ -0,0 +1,180 @@
+# perft.py
+# Leaf-node counts for the move generator, with optional card modes.
+#
+#   python perft.py --depth 4
+#   python perft.py --fen "<fen>" --depth 3 --mode boost,ghost --backend bitboard
+#   python perft.py --check --json perft_results.jsonl
+import argparse
+import json
+import sys
+import time
+from board import Board, START_FEN
+from bitboard import BitBoard
+from pieces import Knight
+
+BACKENDS = {'list': Board, 'bitboard': BitBoard}
+MODES = ('boost', 'ghost', 'knightmare')
+
+ITALIAN_FEN = "r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w - - 0 1"
+ENDGAME_FEN = "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"
+
+# name: (fen, modes, {depth: nodes}). Counts with no modes match standard
+# chess wherever castling, en passant and promotion cannot occur yet.
+REFERENCE = {
+    "start": (START_FEN, (), {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    "endgame": (ENDGAME_FEN, (), {1: 14, 2: 191, 3: 2810, 4: 43087}),
+    "italian": (ITALIAN_FEN, (), {1: 37, 2: 1257, 3: 44783}),
+    "start_boost": (START_FEN, ('boost',), {1: 28, 2: 760, 3: 21869}),
+    "start_ghost": (START_FEN, ('ghost',), {1: 35, 2: 1201, 3: 43026}),
+    "italian_ghost": (ITALIAN_FEN, ('ghost',), {1: 44, 2: 1916}),
+    "start_knightmare": (START_FEN, ('knightmare',), {1: 32, 2: 1018, 3: 42721}),
+}
+
+
+class CardFlags:
+    # Stands in for a GameState's card attributes when generating moves
+    def __init__(self, ghost=False, boost=False, second_hop=False, capture_done=False):
+        self.bishop_ghost_active = {'white': ghost, 'black': ghost}
+        self.pawn_boost_active = {'white': boost, 'black': boost}
+        self.knightmare_doing_second_move = second_hop
+        self.knightmare_state = {"capture_done": capture_done} if second_hop else None
+
+
+def opponent(color):
+    return 'black' if color == 'white' else 'white'
+
+
+class Perft:
+    def __init__(self, board, modes=()):
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise ValueError(f"Unknown perft mode(s): {', '.join(sorted(unknown))}")
+        self.board = board
+        self.knightmare = 'knightmare' in modes
+        self.flags = CardFlags(ghost='ghost' in modes, boost='boost' in modes)
+        self.second_hop_flags = (CardFlags(second_hop=True), CardFlags(second_hop=True, capture_done=True))
+
+    def turn_moves(self, color):
+        # Each entry is the sequence of (from_row, from_col, to_row, to_col) played in one turn
+        board = self.board
+        turns = []
+        for (from_row, from_col), (to_row, to_col) in board.generate_legal_moves(color, self.flags):
+            if not (self.knightmare and isinstance(board.board[from_row][from_col], Knight)):
+                turns.append(((from_row, from_col, to_row, to_col),))
+                continue
+            # Knightmare Loop: the same knight hops again, with at most one capture in total
+            first = (from_row, from_col, to_row, to_col)
+            capture = board.board[to_row][to_col] is not None
+            board.make_move(*first)
+            second_hops = board.piece_legal_moves(to_row, to_col, self.second_hop_flags[capture])
+            board.unmake_move()
+            if not second_hops:
+                turns.append((first,))
+            for r, c in second_hops:
+                turns.append((first, (to_row, to_col, r, c)))
+        return turns
+
+    def count(self, color, depth):
+        if depth == 0:
+            return 1
+        turns = self.turn_moves(color)
+        if depth == 1:
+            return len(turns)
+        board = self.board
+        nodes = 0
+        for turn in turns:
+            for move in turn:
+                board.make_move(*move)
+            nodes += self.count(opponent(color), depth - 1)
+            for _ in turn:
+                board.unmake_move()
+        return nodes
+
+    def divide(self, color, depth):
+        board = self.board
+        result = {}
+        for turn in self.turn_moves(color):
+            for move in turn:
+                board.make_move(*move)
+            result[turn] = self.count(opponent(color), depth - 1)
+            for _ in turn:
+                board.unmake_move()
+        return result
+
+
+def run(fen=START_FEN, depth=3, modes=(), backend='list'):
+    board = BACKENDS[backend]()
+    color = board.set_fen(fen)
+    start = time.perf_counter()
+    nodes = Perft(board, modes).count(color, depth)
+    seconds = time.perf_counter() - start
+    return {
+        "fen": fen,
+        "modes": sorted(modes),
+        "backend": backend,
+        "depth": depth,
+        "nodes": nodes,
+        "seconds": round(seconds, 4),
+        "nps": int(nodes / seconds) if seconds > 0 else 0,
+    }
+
+
+def check_reference(backend='list', max_depth=3):
+    results = []
+    for name, (fen, modes, counts) in REFERENCE.items():
+        for depth, expected in sorted(counts.items()):
+            if depth > max_depth:
+                continue
+            result = run(fen, depth, modes, backend)
+            result["name"] = name
+            result["expected"] = expected
+            result["ok"] = result["nodes"] == expected
+            results.append(result)
+    return results
+
+
+def mode_label(result):
+    return ','.join(result["modes"]) or '-'
+
+
+def format_result(result, mode_width=12):
+    # mode_width: the mode column, wide enough for the longest label of a table
+    line = (f"{result.get('name', 'custom'):<18}{mode_label(result):<{mode_width}}d{result['depth']:<3}"
+            f"{result['nodes']:>10}{result['seconds']:>10.3f}s{result['nps']:>10} nps")
+    if "expected" in result:
+        line += "  ok" if result["ok"] else f"  MISMATCH (expected {result['expected']})"
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count perft leaf nodes for Chess World Champions.")
+    parser.add_argument("--fen", default=START_FEN)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--mode", default="", help="comma separated: " + ", ".join(MODES))
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="list")
+    parser.add_argument("--check", action="store_true", help="run the reference suite up to --depth")
+    parser.add_argument("--json", metavar="PATH", help="append results as JSON lines ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        results = check_reference(args.backend, args.depth)
+    else:
+        modes = tuple(m for m in args.mode.split(',') if m)
+        results = [run(args.fen, args.depth, modes, args.backend)]
+
+    if args.json == '-':
+        for result in results:
+            print(json.dumps(result))
+    else:
+        mode_width = max(12, max(len(mode_label(r)) for r in results) + 2)
+        for result in results:
+            print(format_result(result, mode_width))
+        if args.json:
+            with open(args.json, "a") as f:
+                for result in results:
+                    f.write(json.dumps(result) + "\n")
+    return 0 if all(r.get("ok", True) for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
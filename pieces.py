@@ -1,122 +1,180 @@
+# Move tables, built once at import and indexed [row][col]. Every entry
+# is a tuple of (row, col) squares already clipped to the board, so move
+# generation only walks tables and checks occupancy.
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+PAWN_DIRECTION = {'white': -1, 'black': 1}
+PAWN_START_ROW = {'white': 6, 'black': 1}
+
+
+def _on_board(r, c):
+    return 0 <= r < 8 and 0 <= c < 8
+
+
+def _jumps(offsets):
+    return [[tuple((row + dr, col + dc) for dr, dc in offsets if _on_board(row + dr, col + dc))
+             for col in range(8)] for row in range(8)]
+
+
+def _ray(row, col, dr, dc):
+    squares = []
+    r, c = row + dr, col + dc
+    while _on_board(r, c):
+        squares.append((r, c))
+        r += dr
+        c += dc
+    return tuple(squares)
+
+
+def _rays(directions):
+    # One ordered ray per direction, nearest square first; empty rays are dropped
+    return [[tuple(ray for ray in (_ray(row, col, dr, dc) for dr, dc in directions) if ray)
+             for col in range(8)] for row in range(8)]
+
+
+KING_TARGETS = _jumps(KING_OFFSETS)
+KNIGHT_TARGETS = _jumps(KNIGHT_OFFSETS)
+ROOK_RAYS = _rays(ROOK_DIRECTIONS)
+BISHOP_RAYS = _rays(BISHOP_DIRECTIONS)
+# Bishop Ghost passes through pieces, so its diagonals flatten into one list
+GHOST_SQUARES = [[tuple(sq for ray in BISHOP_RAYS[row][col] for sq in ray) for col in range(8)]
+                 for row in range(8)]
+# Up to three squares straight ahead; how many a pawn may use depends on its row and Pawn Boost
+PAWN_PUSHES = {color: [[_ray(row, col, step, 0)[:3] for col in range(8)] for row in range(8)]
+               for color, step in PAWN_DIRECTION.items()}
+PAWN_CAPTURES = {color: _jumps(((step, -1), (step, 1))) for color, step in PAWN_DIRECTION.items()}
+
+
 class Piece:
-    def __init__(self, color):
-        self.color = color
+    # Flyweight: Pawn('white') always returns the same immutable instance, so
+    # boards, copies and pickles share 12 piece objects between them
+    __slots__ = ('color',)
+    _instances = {}
+
+    def __new__(cls, color):
+        key = (cls, color)
+        piece = Piece._instances.get(key)
+        if piece is None:
+            if color not in ('white', 'black'):
+                raise ValueError(f"Unknown colour: {color!r}")
+            piece = object.__new__(cls)
+            object.__setattr__(piece, 'color', color)
+            Piece._instances[key] = piece
+        return piece
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} pieces are shared and immutable")
+
+    def __reduce__(self):
+        return (type(self), (self.color,))
 
-    def get_valid_moves(self, board, row, col, gui=None):
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.color!r})"
+
+    def get_valid_moves(self, board, row, col, state=None):
         raise NotImplementedError("This method should be overridden by subclasses.")
 
+
+def _slide(grid, rays, color, moves):
+    for ray in rays:
+        for r, c in ray:
+            target = grid[r][c]
+            if not target:
+                moves.append((r, c))
+            else:
+                if target.color != color:
+                    moves.append((r, c))
+                break
+
+
+def _diagonals(grid, row, col, color, state, moves):
+    if state and state.bishop_ghost_active.get(color, False):
+        # Passes through any piece, but can only land on empty squares (no captures)
+        for r, c in GHOST_SQUARES[row][col]:
+            if not grid[r][c]:
+                moves.append((r, c))
+        return
+    _slide(grid, BISHOP_RAYS[row][col], color, moves)
+
+
 class King(Piece):
-    def get_valid_moves(self, board, row, col, gui=None):
+    __slots__ = ()
+
+    def get_valid_moves(self, board, row, col, state=None):
+        grid = board.board
         moves = []
-        directions = [(-1, -1), (-1, 0), (-1, 1),
-                      (0, -1),          (0, 1),
-                      (1, -1),  (1, 0), (1, 1)]
-        for dr, dc in directions:
-            r, c = row + dr, col + dc
-            if 0 <= r < 8 and 0 <= c < 8:
-                target = board.board[r][c]
-                if not target or target.color != self.color:
-                    moves.append((r, c))
+        for r, c in KING_TARGETS[row][col]:
+            target = grid[r][c]
+            if not target or target.color != self.color:
+                moves.append((r, c))
         return moves
 
 class Queen(Piece):
-    def get_valid_moves(self, board, row, col, gui=None):
-        return Rook(self.color).get_valid_moves(board, row, col, gui) + \
-               Bishop(self.color).get_valid_moves(board, row, col, gui)
+    __slots__ = ()
+
+    def get_valid_moves(self, board, row, col, state=None):
+        # Rook lines then bishop diagonals (Bishop Ghost included), into one list
+        moves = []
+        _slide(board.board, ROOK_RAYS[row][col], self.color, moves)
+        _diagonals(board.board, row, col, self.color, state, moves)
+        return moves
 
 class Rook(Piece):
-    def get_valid_moves(self, board, row, col, gui=None):
+    __slots__ = ()
+
+    def get_valid_moves(self, board, row, col, state=None):
         moves = []
-        for dr, dc in [(-1,0), (1,0), (0,-1), (0,1)]:
-            r, c = row + dr, col + dc
-            while 0 <= r < 8 and 0 <= c < 8:
-                target = board.board[r][c]
-                if not target:
-                    moves.append((r, c))
-                elif target.color != self.color:
-                    moves.append((r, c))
-                    break
-                else:
-                    break
-                r += dr
-                c += dc
+        _slide(board.board, ROOK_RAYS[row][col], self.color, moves)
         return moves
 
 class Bishop(Piece):
-    def get_valid_moves(self, board, row, col, gui=None):
+    __slots__ = ()
+
+    def get_valid_moves(self, board, row, col, state=None):
         moves = []
-        ghost = False
-        if gui:
-            ghost = gui.bishop_ghost_active.get(self.color, False)
-        for dr, dc in [(-1,-1), (-1,1), (1,-1), (1,1)]:
-            r, c = row + dr, col + dc
-            while 0 <= r < 8 and 0 <= c < 8:
-                target = board.board[r][c]
-                if ghost:
-                    # Only allow empty squares as destinations (no captures)
-                    if not target:
-                        moves.append((r, c))
-                    # Can pass through any piece, but can't land on any piece
-                    r += dr
-                    c += dc
-                    continue
-                else:
-                    if not target:
-                        moves.append((r, c))
-                    elif target.color == self.color:
-                        break
-                    elif target.color != self.color:
-                        moves.append((r, c))
-                        break
-                r += dr
-                c += dc
+        _diagonals(board.board, row, col, self.color, state, moves)
         return moves
 
 class Knight(Piece):
-    def get_valid_moves(self, board, row, col, gui=None):
+    __slots__ = ()
+
+    def get_valid_moves(self, board, row, col, state=None):
+        grid = board.board
+        # Knightmare Loop: after a capture on the first hop, the second hop may not capture
+        no_capture = bool(state and getattr(state, "knightmare_doing_second_move", False)
+                          and state.knightmare_state and state.knightmare_state.get("capture_done", False))
         moves = []
-        for dr, dc in [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                       (1, -2), (1, 2), (2, -1), (2, 1)]:
-            r, c = row + dr, col + dc
-            if 0 <= r < 8 and 0 <= c < 8:
-                target = board.board[r][c]
-                if not target or target.color != self.color:
-                    # For Knightmare Loop, restrict captures on second move if already captured
-                    if gui and getattr(gui, "knightmare_doing_second_move", False):
-                        if gui.knightmare_state and gui.knightmare_state.get("capture_done", False):
-                            # Only allow non-capture moves on second move if already captured
-                            if not target:
-                                moves.append((r, c))
-                        else:
-                            moves.append((r, c))
-                    else:
-                        moves.append((r, c))
+        for r, c in KNIGHT_TARGETS[row][col]:
+            target = grid[r][c]
+            if not target or (target.color != self.color and not no_capture):
+                moves.append((r, c))
         return moves
 
 class Pawn(Piece):
-    def get_valid_moves(self, board, row, col, gui=None):
+    __slots__ = ()
+
+    def get_valid_moves(self, board, row, col, state=None):
+        grid = board.board
+        color = self.color
         moves = []
-        direction = -1 if self.color == 'white' else 1
-        start_row = 6 if self.color == 'white' else 1
-        max_steps = 1
-
-        # Pawn boost card logic: allow 1, 2, or 3 steps from starting square if boost is active
-        if gui and gui.pawn_boost_active.get(self.color, False) and row == start_row:
-            max_steps = 3
-        elif row == start_row:
-            max_steps = 2
-
-        for step in range(1, max_steps + 1):
-            r = row + direction * step
-            if 0 <= r < 8 and not board.board[r][col]:
-                moves.append((r, col))
-            else:
+        steps = 1
+        if row == PAWN_START_ROW[color]:
+            # Pawn Boost allows 1, 2 or 3 steps from the starting square
+            steps = 3 if state and state.pawn_boost_active.get(color, False) else 2
+        for r, c in PAWN_PUSHES[color][row][col][:steps]:
+            if grid[r][c]:
                 break
-        # Captures
-        for dc in [-1, 1]:
-            r, c = row + direction, col + dc
-            if 0 <= r < 8 and 0 <= c < 8:
-                target = board.board[r][c]
-                if target and target.color != self.color:
-                    moves.append((r, c))
-        return moves
\ No newline at end of file
+            moves.append((r, c))
+        for r, c in PAWN_CAPTURES[color][row][col]:
+            target = grid[r][c]
+            if target and target.color != color:
+                moves.append((r, c))
+        return moves
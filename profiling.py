@@ -0,0 +1,216 @@
+# profiling.py
+# Opt-in instrumentation for the hot paths. Nothing is wrapped unless it is
+# switched on, so a normal run pays nothing:
+#
+#   CWC_PROFILE=1 python main.py                    report to profile.txt / profile.json
+#   CWC_PROFILE=/tmp/run1 python selfplay.py --workers 1
+#   python main.py --profile --profile-span analyse_turn
+#   python main.py --profile --profile-span analyse_turn:3   cProfile the 3rd GUI turn analysis
+#
+# A span names one hot path, "Class.method" or just "method" when no other
+# hot path shares that name; the analysis of a GUI turn runs on its worker
+# thread in analyse_turn, after ChessGUI.end_turn has only handed it over.
+#
+# enable() replaces the methods listed in HOT_PATHS with timing wrappers
+# (call counts, inclusive time, log2 histograms) in every module already
+# imported, and writes the report when the process exits. Forked pool
+# workers could not report, so they take the original methods back and run
+# at full speed; profile self-play with --workers 1 to time the games.
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import time
+
+# (module, Class.method or function); a class that inherits the method is covered by its base
+HOT_PATHS = [
+    ("board", "Board.generate_legal_moves"),
+    ("board", "Board.analyse"),
+    ("board", "Board.is_in_check"),
+    ("board", "Board.copy"),
+    ("bitboard", "BitBoard.generate_legal_moves"),
+    ("bitboard", "BitBoard.is_in_check"),
+    ("bitboard", "BitBoard.copy"),
+    ("card", "Card.can_play"),
+    ("gamestate", "GameState.can_play"),
+    ("gamestate", "GameState.legal_actions"),
+    ("gamestate", "GameState.apply"),
+    ("gamestate", "GameState.end_turn"),
+    ("search", "Searcher.search"),
+    ("chessgui", "ChessGUI.draw_board"),
+    ("chessgui", "ChessGUI.load_piece_images"),
+    ("chessgui", "ChessGUI.resize_board"),
+    ("chessgui", "ChessGUI.end_turn"),
+    ("analysis", "analyse_turn"),
+    ("sprites", "SpriteCache.get"),
+]
+
+stats = {}
+_state = {"enabled": False, "prefix": None, "span": None, "span_done": False, "fork_hook": False}
+
+
+class Histogram:
+    # Call count, total/min/max time and a log2 histogram of durations in ns
+    __slots__ = ("calls", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.buckets = [0] * 48
+
+    def add(self, ns):
+        self.calls += 1
+        self.total += ns
+        if self.min is None or ns < self.min:
+            self.min = ns
+        if ns > self.max:
+            self.max = ns
+        self.buckets[min(ns.bit_length(), 47)] += 1
+
+    def percentile(self, fraction):
+        # Upper edge of the bucket holding that fraction of calls (capped at max), in ns
+        wanted = fraction * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return min(1 << bucket, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {"calls": self.calls, "total_ms": round(self.total / 1e6, 3),
+                "mean_us": round(self.total / self.calls / 1e3, 2) if self.calls else 0,
+                "min_us": round((self.min or 0) / 1e3, 2), "max_us": round(self.max / 1e3, 2),
+                "p50_us": round(self.percentile(0.5) / 1e3, 2), "p99_us": round(self.percentile(0.99) / 1e3, 2),
+                "histogram_ns_log2": {f"<{1 << b}": n for b, n in enumerate(self.buckets) if n}}
+
+
+def _span_label(name):
+    # The one hot path a span names; a bare method name must not be ambiguous
+    labels = [path for _, path in HOT_PATHS if name in (path, path.rsplit(".", 1)[-1])]
+    if not labels:
+        raise ValueError(f"no hot path called {name!r}")
+    if len(labels) > 1:
+        raise ValueError(f"span {name!r} is ambiguous, use one of {', '.join(labels)}")
+    return labels[0]
+
+
+def _owner(module, path):
+    # (class or module, attribute) holding a hot path
+    if "." in path:
+        class_name, method = path.split(".")
+        return getattr(module, class_name), method
+    return module, path
+
+
+def _wrap(fn, label):
+    hist = stats.setdefault(label, Histogram())
+    clock = time.perf_counter_ns
+    spanned = _state["span"] is not None and _state["span"][0] == label
+    calls = 0
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        nonlocal calls
+        if spanned and not _state["span_done"]:
+            calls += 1
+            if calls == _state["span"][1]:
+                _state["span_done"] = True
+                return _profile_span(fn, label, args, kwargs)
+        start = clock()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            hist.add(clock() - start)
+
+    wrapper.__profiled__ = fn
+    return wrapper
+
+
+def _profile_span(fn, label, args, kwargs):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(fn, *args, **kwargs)
+    finally:
+        path = f"{_state['prefix']}.{label}.pstats"
+        profiler.dump_stats(path)
+        print(f"profiling: cProfile of {label} written to {path} (python -m pstats {path})", file=sys.stderr)
+
+
+def enable(prefix="profile", span=None):
+    # span: "Class.method" or "method", optionally ":N" for the Nth call (default the first)
+    if _state["enabled"]:
+        return
+    if span:
+        name, _, nth = span.partition(":")
+        _state["span"] = (_span_label(name), int(nth) if nth else 1)
+    _state.update(enabled=True, prefix=prefix)
+    for module_name, path in HOT_PATHS:
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        owner, attr = _owner(module, path)
+        fn = owner.__dict__.get(attr)
+        if fn is not None and not hasattr(fn, "__profiled__"):
+            setattr(owner, attr, _wrap(fn, path))
+    atexit.register(write_report)
+    if hasattr(os, "register_at_fork") and not _state["fork_hook"]:
+        _state["fork_hook"] = True
+        os.register_at_fork(after_in_child=disable)
+
+
+def disable():
+    # Puts the original methods back; a forked child calls this by itself
+    if not _state["enabled"]:
+        return
+    _state["enabled"] = False
+    atexit.unregister(write_report)
+    for module_name, path in HOT_PATHS:
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        owner, attr = _owner(module, path)
+        fn = owner.__dict__.get(attr)
+        if fn is not None and hasattr(fn, "__profiled__"):
+            setattr(owner, attr, fn.__profiled__)
+
+
+def setup(flag=None, span=None):
+    # Entry points call this after their imports; CWC_PROFILE / CWC_PROFILE_SPAN also switch it on
+    env = os.environ.get("CWC_PROFILE", "").strip()
+    if env.lower() in ("0", "false"):
+        env = ""
+    span = span or os.environ.get("CWC_PROFILE_SPAN")
+    if flag or env or span:
+        prefix = flag if isinstance(flag, str) else (env if env and env != "1" else "profile")
+        try:
+            enable(prefix, span)
+        except ValueError as e:
+            raise SystemExit(f"profiling: {e}") from None
+
+
+def report_text():
+    rows = sorted(((label, hist) for label, hist in stats.items() if hist.calls),
+                  key=lambda item: item[1].total, reverse=True)
+    lines = [f"{'hot path':<34}{'calls':>10}{'total ms':>12}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}{'max us':>10}"]
+    for label, hist in rows:
+        data = hist.as_dict()
+        lines.append(f"{label:<34}{data['calls']:>10}{data['total_ms']:>12.1f}{data['mean_us']:>10.1f}"
+                     f"{data['p50_us']:>10.1f}{data['p99_us']:>10.1f}{data['max_us']:>10.1f}")
+    lines.append("times are inclusive; p50/p99 are log2 bucket upper edges")
+    return "\n".join(lines)
+
+
+def write_report():
+    prefix = _state["prefix"]
+    text = report_text()
+    with open(f"{prefix}.txt", "w") as f:
+        f.write(text + "\n")
+    with open(f"{prefix}.json", "w") as f:
+        json.dump({label: hist.as_dict() for label, hist in stats.items() if hist.calls}, f, indent=2)
+    print(text, file=sys.stderr)
+    print(f"profiling: report written to {prefix}.txt and {prefix}.json", file=sys.stderr)
@@ -0,0 +1,401 @@
+# record.py
+# Compact binary game records, a streaming reader/writer for files holding
+# any number of games, fast replay, and a PGN-like text export.
+#
+# One turn is a 16-bit word: kind (4 bits) | from square (6) | to square (6),
+# squares being row * 8 + col. A turn that plays a card adds one byte for
+# the card's "code" from card_data, and a double move one more for the
+# second hop's destination, so plain moves take 2 bytes and none more than 4.
+#
+#   kind  turn                           from / to
+#   0     plain move                     move
+#   1     card, then move                move, + 1 byte card code
+#   2     card, then two hops            first hop, + 1 byte card code, + 1 byte second destination
+#   3     card on a target               target / 0, + 1 byte card code
+#   4     draw a card                    0 / 0
+#   8-15  reserved for promotion moves (these rules have no promotion)
+#
+# File: b"CWCR" + version byte, then per game varint(length) + payload.
+# Payload: result byte, each side's hand and deck as card codes, tags as
+# JSON, varint(turn count), then the turns.
+import argparse
+import json
+import os
+import sys
+import time
+from bitboard import BitBoard
+from board import FEN_LETTERS
+from card import CARDS_BY_CODE, CARDS_BY_NAME
+from gamestate import DRAW, GameState, card_action, move_action, starting_hand
+from pieces import Pawn
+
+MAGIC = b"CWCR"
+VERSION = 2  # 1 had a turn kind per built-in card
+MOVE, CARD_MOVE, CARD_TWO_MOVES, CARD_TARGET, DRAW_KIND = range(5)
+RESULT_CODES = {None: 0, 'white': 1, 'black': 2, 'draw': 3}
+RESULTS = {code: result for result, code in RESULT_CODES.items()}
+PGN_RESULTS = {None: "*", 'white': "1-0", 'black': "0-1", 'draw': "1/2-1/2"}
+
+
+def _square(pos):
+    return pos[0] * 8 + pos[1]
+
+
+def _pos(sq):
+    return (sq >> 3, sq & 7)
+
+
+def card_type(name):
+    if name not in CARDS_BY_NAME:
+        raise ValueError(f"Unknown card {name!r}")
+    return CARDS_BY_NAME[name]
+
+
+def card_code(name):
+    # Cards, in turns as in hands and decks, are stored by their card_data "code"
+    return card_type(name).code
+
+
+def card_name(code):
+    if code not in CARDS_BY_CODE:
+        raise ValueError(f"Unknown card code {code}")
+    return CARDS_BY_CODE[code].name
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+# --- turns -------------------------------------------------------------------
+
+def turn_kind(actions):
+    # actions: every GameState action of one turn, in order
+    first = actions[0]
+    if first.kind == 'draw':
+        return DRAW_KIND
+    if first.kind == 'move':
+        return MOVE
+    if card_type(first.card).targets is not None:
+        return CARD_TARGET
+    return CARD_TWO_MOVES if len(actions) > 2 else CARD_MOVE
+
+
+def encode_turn(actions, out):
+    kind = turn_kind(actions)
+    start = end = 0
+    if kind == CARD_TARGET:
+        start = _square(actions[0].target)
+    elif kind != DRAW_KIND:
+        move = actions[0] if kind == MOVE else actions[1]
+        start, end = _square(move.start), _square(move.end)
+    word = kind << 12 | start << 6 | end
+    out.append(word >> 8)
+    out.append(word & 0xFF)
+    if kind in (CARD_MOVE, CARD_TWO_MOVES, CARD_TARGET):
+        out.append(card_code(actions[0].card))
+    if kind == CARD_TWO_MOVES:
+        out.append(_square(actions[2].end))
+
+
+def decode_turn(data, offset):
+    word = data[offset] << 8 | data[offset + 1]
+    offset += 2
+    kind, start, end = word >> 12, (word >> 6) & 63, word & 63
+    if kind == MOVE:
+        return [move_action(_pos(start), _pos(end))], offset
+    if kind == DRAW_KIND:
+        return [DRAW], offset
+    if kind not in (CARD_MOVE, CARD_TWO_MOVES, CARD_TARGET):
+        raise ValueError(f"Unknown turn kind {kind} at byte {offset - 2}")
+    name = card_name(data[offset])
+    offset += 1
+    if kind == CARD_TARGET:
+        return [card_action(name, _pos(start))], offset
+    actions = [card_action(name), move_action(_pos(start), _pos(end))]
+    if kind == CARD_TWO_MOVES:
+        actions.append(move_action(_pos(end), _pos(data[offset])))
+        offset += 1
+    return actions, offset
+
+
+def split_turns(state, actions):
+    # Groups a flat action list (as applied to state) into turns; leaves state at the end
+    turns = []
+    current = []
+    for action in actions:
+        mover = state.turn
+        state.apply(action, validate=False)
+        current.append(action)
+        if state.turn != mover:
+            turns.append(current)
+            current = []
+    if current:
+        turns.append(current)
+    return turns
+
+
+# --- games -------------------------------------------------------------------
+
+class GameRecord:
+    def __init__(self, turns, result=None, hands=None, decks=None, tags=None):
+        self.turns = turns  # list of turns, each a list of GameState actions
+        self.result = result
+        self.hands = hands or {color: [card.name for card in starting_hand()] for color in ('white', 'black')}
+        self.decks = decks or {'white': [], 'black': []}
+        self.tags = tags or {}
+
+    @classmethod
+    def from_actions(cls, actions, hands, decks, result=None, tags=None):
+        # actions: the flat GameState action list of a game; hands/decks: starting card names
+        turns = split_turns(new_state(hands, decks, tags), actions)
+        return cls(turns, result, hands, decks, tags)
+
+    def encode(self):
+        out = bytearray()
+        out.append(RESULT_CODES[self.result])
+        for color in ('white', 'black'):
+            for cards in (self.hands[color], self.decks[color]):
+                write_varint(out, len(cards))
+                out.extend(card_code(name) for name in cards)
+        tags = json.dumps(self.tags, separators=(',', ':')).encode() if self.tags else b""
+        write_varint(out, len(tags))
+        out.extend(tags)
+        write_varint(out, len(self.turns))
+        for turn in self.turns:
+            encode_turn(turn, out)
+        return bytes(out)
+
+    @classmethod
+    def decode(cls, data):
+        result = RESULTS[data[0]]
+        offset = 1
+        hands, decks = {}, {}
+        for color in ('white', 'black'):
+            for target in (hands, decks):
+                count, offset = read_varint(data, offset)
+                target[color] = [card_name(code) for code in data[offset:offset + count]]
+                offset += count
+        length, offset = read_varint(data, offset)
+        tags = json.loads(data[offset:offset + length]) if length else {}
+        offset += length
+        count, offset = read_varint(data, offset)
+        turns = []
+        for _ in range(count):
+            turn, offset = decode_turn(data, offset)
+            turns.append(turn)
+        return cls(turns, result, hands, decks, tags)
+
+    def actions(self):
+        for turn in self.turns:
+            yield from turn
+
+
+def new_state(hands, decks, tags=None, board_cls=BitBoard):
+    # Decks are stored top card last, like GameState.decks
+    state = GameState(board_cls(),
+                      hands={color: [CARDS_BY_NAME[name]() for name in names] for color, names in hands.items()},
+                      decks={color: [CARDS_BY_NAME[name]() for name in names] for color, names in decks.items()})
+    if tags and "FEN" in tags:
+        state.turn = state.board.set_fen(tags["FEN"])
+    return state
+
+
+def replay(record, upto=None, board_cls=BitBoard):
+    # Position after `upto` turns (all of them by default); actions are trusted
+    state = new_state(record.hands, record.decks, record.tags, board_cls)
+    for turn in record.turns[:upto]:
+        for action in turn:
+            state.apply(action, validate=False)
+    return state
+
+
+# --- files -------------------------------------------------------------------
+
+class RecordWriter:
+    # Appends games to a record file, creating it with a header if needed
+    def __init__(self, path):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new:
+            self.file.write(MAGIC + bytes([VERSION]))
+        self.count = 0
+
+    def write(self, record):
+        self.write_bytes(record.encode())
+
+    def write_bytes(self, payload):
+        header = bytearray()
+        write_varint(header, len(payload))
+        self.file.write(header)
+        self.file.write(payload)
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_payloads(path):
+    # Streams raw game payloads; memory use does not grow with the file size
+    with open(path, "rb") as f:
+        header = f.read(len(MAGIC) + 1)
+        if header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a game record file")
+        if header[len(MAGIC)] != VERSION:
+            raise ValueError(f"{path}: unsupported record version {header[len(MAGIC)]}")
+        while True:
+            length = 0
+            shift = 0
+            byte = f.read(1)
+            if not byte:
+                return
+            while True:
+                length |= (byte[0] & 0x7F) << shift
+                if byte[0] < 0x80:
+                    break
+                shift += 7
+                byte = f.read(1)
+            payload = f.read(length)
+            if len(payload) != length:
+                raise ValueError(f"{path}: truncated game record")
+            yield payload
+
+
+def iter_games(path):
+    for payload in iter_payloads(path):
+        yield GameRecord.decode(payload)
+
+
+# --- text export ---------------------------------------------------------------
+
+def san(state, action):
+    # Standard algebraic notation for one move action in state (before it is applied)
+    board = state.board.board
+    start, end = action.start, action.end
+    piece = board[start[0]][start[1]]
+    capture = board[end[0]][end[1]] is not None
+    dest = f"{chr(ord('a') + end[1])}{8 - end[0]}"
+    if isinstance(piece, Pawn):
+        text = f"{chr(ord('a') + start[1])}x{dest}" if capture else dest
+    else:
+        text = FEN_LETTERS[type(piece)].upper()
+        rivals = [a.start for a in state.move_actions()
+                  if a.end == end and a.start != start
+                  and type(board[a.start[0]][a.start[1]]) is type(piece)]
+        if rivals:
+            if all(r[1] != start[1] for r in rivals):
+                text += chr(ord('a') + start[1])
+            elif all(r[0] != start[0] for r in rivals):
+                text += str(8 - start[0])
+            else:
+                text += f"{chr(ord('a') + start[1])}{8 - start[0]}"
+        text += ("x" if capture else "") + dest
+    return text
+
+
+def turn_san(state, turn):
+    # Applies the turn to state and returns its text, e.g. "e4", "P/e5", "K/Nf3/Nxe5", "D@e7":
+    # a card is shown by its extended-FEN letter
+    first = turn[0]
+    if first.kind == 'draw':
+        state.apply(first, validate=False)
+        return "DRAW"
+    parts = []
+    kind = turn_kind(turn)
+    if kind == CARD_TARGET:
+        state.apply(first, validate=False)
+        text = f"{card_type(first.card).letter}@{chr(ord('a') + first.target[1])}{8 - first.target[0]}"
+    else:
+        for action in turn:
+            if action.kind == 'card':
+                state.apply(action, validate=False)
+                continue
+            parts.append(san(state, action))
+            state.apply(action, validate=False)
+        text = "/".join(parts)
+        if kind != MOVE:
+            text = f"{card_type(first.card).letter}/{text}"
+    status = state.status()
+    if status == 'checkmate':
+        text += "#"
+    elif status == 'check':
+        text += "+"
+    return text
+
+
+def to_pgn(record, board_cls=BitBoard):
+    tags = {"Event": "Chess World Champions game", **record.tags, "Result": PGN_RESULTS[record.result]}
+    lines = [f'[{name} "{value}"]' for name, value in tags.items()]
+    state = new_state(record.hands, record.decks, record.tags, board_cls)
+    words = []
+    number = 1
+    for turn in record.turns:
+        if state.turn == 'white':
+            words.append(f"{number}.")
+        elif not words:
+            words.append(f"{number}...")
+        if state.turn == 'black':
+            number += 1
+        words.append(turn_san(state, turn))
+    words.append(PGN_RESULTS[record.result])
+    body = []
+    line = ""
+    for word in words:
+        if len(line) + len(word) + 1 > 79:
+            body.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    body.append(line)
+    return "\n".join(lines) + "\n\n" + "\n".join(body) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect binary game record files.")
+    parser.add_argument("path")
+    parser.add_argument("--pgn", action="store_true", help="print every game as PGN-like text")
+    parser.add_argument("--game", type=int, help="only this game (0-based index)")
+    parser.add_argument("--replay", action="store_true", help="replay every game and report throughput")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    games = turns = size = 0
+    for index, payload in enumerate(iter_payloads(args.path)):
+        if args.game is not None and index != args.game:
+            continue
+        record = GameRecord.decode(payload)
+        games += 1
+        turns += len(record.turns)
+        size += len(payload)
+        if args.pgn:
+            print(to_pgn(record))
+        elif args.replay:
+            replay(record)
+    seconds = time.perf_counter() - start
+    print(f"{games} games, {turns} turns, {size / max(turns, 1):.2f} bytes/turn, "
+          f"{seconds:.2f}s ({turns / seconds if seconds else 0:.0f} turns/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
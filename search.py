@@ -0,0 +1,275 @@
+# search.py
+# Computer player: iterative deepening alpha-beta over GameState actions.
+# Card plays are ordinary search moves. A card that keeps the turn (Pawn
+# Boost, Bishop Ghost, Knightmare Loop and its first hop) is searched at
+# the same depth for the same side; depth only drops when the turn passes.
+# A state with a tablebase (GameState.tablebase) scores covered endings
+# exactly instead of searching them.
+import time
+from gamestate import opponent
+from pieces import King, Queen, Rook, Bishop, Knight, Pawn
+from tablebase import LOSS, WIN, describe
+
+PIECE_VALUES = {Pawn: 100, Knight: 320, Bishop: 330, Rook: 500, Queen: 900, King: 0}
+CARD_VALUE = 40
+MATE = 100000
+INF = 10 ** 9
+EXACT, LOWER, UPPER = range(3)
+
+# Small bonus for minor pieces and pawns near the centre
+CENTER_BONUS = [[(3 - abs(3.5 - row) + 3 - abs(3.5 - col)) * 4 for col in range(8)] for row in range(8)]
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def tablebase_score(probe, ply):
+    # Mate scores count plies from the root, like a mate found by searching
+    if probe.wdl == WIN:
+        return MATE - (ply + 2 * probe.moves - 1)
+    if probe.wdl == LOSS:
+        return -MATE + ply + 2 * probe.moves
+    return 0
+
+
+def evaluate(state):
+    # Score from the side to move's point of view
+    score = 0
+    for color, sign in ((state.turn, 1), (opponent(state.turn), -1)):
+        for cls, value in PIECE_VALUES.items():
+            squares = state.board.locations(color, (cls,))
+            if not squares:
+                continue
+            if cls in (Pawn, Knight, Bishop):
+                score += sign * sum(value + CENTER_BONUS[row][col] for row, col in squares)
+            else:
+                score += sign * value * len(squares)
+    score += CARD_VALUE * (len(state.hands[state.turn]) - len(state.hands[opponent(state.turn)]))
+    return int(score)
+
+
+class Searcher:
+    def __init__(self, state, time_limit=2.0, max_depth=64, tt_size=200000, book=None):
+        self.state = state
+        self.book = book  # optional OpeningBook, consulted before searching a turn
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.tt_size = tt_size
+        self.tt = {}
+        self.killers = {}
+        self.history = {}
+        self.nodes = 0
+        self.deadline = None
+
+    # --- move ordering -----------------------------------------------------------
+
+    def capture_value(self, action):
+        if action.kind != 'move':
+            return 0
+        board = self.state.board.board
+        target = board[action.end[0]][action.end[1]]
+        if target is None:
+            return 0
+        attacker = board[action.start[0]][action.start[1]]
+        return 10 * PIECE_VALUES[type(target)] - PIECE_VALUES[type(attacker)] // 10 + 1
+
+    def order(self, actions, ply, tt_action):
+        killers = self.killers.get(ply, ())
+
+        def score(action):
+            if action == tt_action:
+                return 1 << 30
+            capture = self.capture_value(action)
+            if capture:
+                return (1 << 20) + capture
+            if action in killers:
+                return 1 << 19
+            if action.kind == 'card':
+                return 1 << 18
+            return self.history.get((action.start, action.end), 0)
+
+        return sorted(actions, key=score, reverse=True)
+
+    def store_killer(self, action, ply):
+        killers = self.killers.setdefault(ply, [])
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[2:]
+
+    # --- search ------------------------------------------------------------------
+
+    def check_time(self):
+        self.nodes += 1
+        if self.nodes & 1023 == 0 and self.deadline and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def quiesce(self, alpha, beta, ply, qdepth=0):
+        self.check_time()
+        state = self.state
+        result = state.result()
+        if result is not None:
+            return 0 if result == 'draw' else -MATE + ply
+        stand_pat = evaluate(state)
+        if stand_pat >= beta or qdepth >= 8:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+        captures = [a for a in state.move_actions() if self.capture_value(a)]
+        captures.sort(key=self.capture_value, reverse=True)
+        for action in captures:
+            state.apply(action, validate=False)
+            score = -self.quiesce(-beta, -alpha, ply + 1, qdepth + 1)
+            state.undo()
+            if score >= beta:
+                return score
+            alpha = max(alpha, score)
+        return alpha
+
+    def negamax(self, depth, alpha, beta, ply):
+        self.check_time()
+        state = self.state
+        if state.turn_started():
+            result = state.result()
+            if result is not None:
+                return 0 if result == 'draw' else -MATE + ply
+            if ply > 0 and state.tablebase is not None:
+                probe = state.tablebase.probe_state(state)
+                if probe is not None:
+                    return tablebase_score(probe, ply)
+            if depth <= 0:
+                return self.quiesce(alpha, beta, ply)
+
+        key = state.key()
+        entry = self.tt.get(key)
+        tt_action = None
+        if entry:
+            entry_depth, entry_score, flag, tt_action = entry
+            if entry_depth >= depth and ply > 0:
+                if flag == EXACT:
+                    return entry_score
+                if flag == LOWER and entry_score >= beta:
+                    return entry_score
+                if flag == UPPER and entry_score <= alpha:
+                    return entry_score
+
+        actions = state.legal_actions()
+        if not actions:
+            return evaluate(state)
+        original_alpha = alpha
+        best_score = -INF
+        best_action = None
+        mover = state.turn
+        for action in self.order(actions, ply, tt_action):
+            state.apply(action, validate=False)
+            if state.turn == mover:
+                score = self.negamax(depth, alpha, beta, ply + 1)
+            else:
+                score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            state.undo()
+            if score > best_score:
+                best_score = score
+                best_action = action
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                if action.kind == 'move' and not self.capture_value(action):
+                    self.store_killer(action, ply)
+                    move = (action.start, action.end)
+                    self.history[move] = self.history.get(move, 0) + depth * depth
+                break
+
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        if len(self.tt) >= self.tt_size:
+            self.tt.clear()
+        self.tt[key] = (depth, best_score, flag, best_action)
+        return best_score
+
+    def search(self):
+        # Returns (best action, info dict); stops at time_limit or max_depth
+        start = time.perf_counter()
+        self.deadline = start + self.time_limit if self.time_limit else None
+        self.nodes = 0
+        root_history = len(self.state.history)
+        best_action = None
+        best_score = 0
+        depth_reached = 0
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score = self.negamax(depth, -INF, INF, 0)
+            except SearchTimeout:
+                while len(self.state.history) > root_history:
+                    self.state.undo()
+                break
+            entry = self.tt.get(self.state.key())
+            if entry and entry[3] is not None:
+                best_action = entry[3]
+                best_score = score
+                depth_reached = depth
+            if abs(score) > MATE - 1000:
+                break
+        if best_action is None:
+            actions = self.state.legal_actions()
+            best_action = self.order(actions, 0, None)[0] if actions else None
+        seconds = time.perf_counter() - start
+        return best_action, {"depth": depth_reached, "nodes": self.nodes, "score": best_score,
+                             "seconds": round(seconds, 3),
+                             "nps": int(self.nodes / seconds) if seconds > 0 else 0}
+
+    def book_turn(self):
+        # The most played book turn for this position, or None
+        if self.book is None:
+            return None
+        start = time.perf_counter()
+        entry = self.book.choose(self.state)
+        if entry is None:
+            return None
+        return list(entry.turn), {"depth": 0, "nodes": 0, "score": 0, "book": entry.games,
+                                  "seconds": round(time.perf_counter() - start, 3), "nps": 0}
+
+    def tablebase_turn(self):
+        # The move the tablebase rates best, or None outside its endings
+        tablebase = self.state.tablebase
+        if tablebase is None or not self.state.turn_started():
+            return None
+        start = time.perf_counter()
+        probe = tablebase.probe_state(self.state)
+        found = tablebase.best_move(self.state) if probe is not None else None
+        if found is None:
+            return None
+        return [found[0]], {"depth": 0, "nodes": 0, "score": tablebase_score(probe, 0),
+                            "tablebase": describe(probe),
+                            "seconds": round(time.perf_counter() - start, 3), "nps": 0}
+
+    def best_turn(self):
+        # Every action of the side to move's turn, e.g. a card play then its moves
+        found = self.book_turn() or self.tablebase_turn()
+        if found:
+            return found
+        mover = self.state.turn
+        actions = []
+        info = None
+        while self.state.turn == mover and self.state.result() is None:
+            action, step_info = self.search()
+            if action is None:
+                break
+            if info is None:
+                info = step_info
+            else:
+                info["nodes"] += step_info["nodes"]
+            actions.append(action)
+            self.state.apply(action, validate=False)
+            # Later steps of the turn get a short budget; the TT from the first step helps
+            self.time_limit = max(0.1, self.time_limit / 4) if self.time_limit else None
+        for _ in actions:
+            self.state.undo()
+        return actions, info
+
+
+def choose_turn(state, time_limit=2.0, max_depth=64, book=None):
+    # Searches a private copy, so the caller's state is never touched
+    return Searcher(state.copy(), time_limit, max_depth, book=book).best_turn()
@@ -0,0 +1,294 @@
+# selfplay.py
+# Plays complete card-chess games between two policies, spread over a
+# process pool, and streams one compact JSON line per game.
+#
+#   python selfplay.py --games 10000 --workers 8 --white random --black greedy \
+#       --deck-size 6 --seed 1 --out selfplay.jsonl --records selfplay.cwr
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import time
+from bitboard import BitBoard
+from book import OpeningBook
+from card import CARD_TYPES
+from gamestate import GameState, opponent, starting_hand
+from record import GameRecord, RecordWriter
+from pieces import King, Queen, Rook, Bishop, Knight, Pawn
+from search import Searcher
+from tablebase import DRAW, WIN, Tablebase
+import profiling
+
+PIECE_VALUES = {Pawn: 1, Knight: 3, Bishop: 3, Rook: 5, Queen: 9, King: 0}
+
+
+def material(board, color):
+    score = 0
+    for cls, value in PIECE_VALUES.items():
+        score += value * (len(board.locations(color, (cls,))) - len(board.locations(opponent(color), (cls,))))
+    return score
+
+
+class RandomPolicy:
+    def choose(self, state, rng):
+        return rng.choice(state.legal_actions())
+
+
+class GreedyPolicy:
+    # One turn of lookahead on material; mates first, ties broken at random
+    def choose(self, state, rng):
+        color = state.turn
+        best_score = None
+        best = []
+        for action in state.legal_actions():
+            state.apply(action, validate=False)
+            result = state.result()
+            if result == color:
+                score = 1000
+            elif result == 'draw':
+                score = -500
+            else:
+                score = material(state.board, color)
+            state.undo()
+            if best_score is None or score > best_score:
+                best_score = score
+                best = [action]
+            elif score == best_score:
+                best.append(action)
+        return rng.choice(best)
+
+
+class SearchPolicy:
+    # Alpha-beta from search.py with a small per-action budget, book and tablebase turns first
+    def __init__(self, time_limit=0.2, max_depth=3, book=None):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.book = book
+        self.pending = []
+
+    def choose(self, state, rng):
+        if self.pending:
+            return self.pending.pop(0)
+        searcher = Searcher(state, self.time_limit, self.max_depth, book=self.book)
+        if state.turn_started():
+            found = searcher.book_turn() or searcher.tablebase_turn()
+            if found:
+                self.pending = found[0][1:]
+                return found[0][0]
+        action, _ = searcher.search()
+        return action
+
+
+POLICIES = {'random': RandomPolicy, 'greedy': GreedyPolicy, 'search': SearchPolicy}
+
+
+def game_seed(base_seed, index):
+    # Each game gets its own seed, so results do not depend on the worker count
+    return (base_seed * 1000003 + index) & 0xFFFFFFFF
+
+
+def deal_decks(rng, deck_size):
+    return {color: [rng.choice(CARD_TYPES)() for _ in range(deck_size)]
+            for color in ('white', 'black')}
+
+
+_books = {}
+_tablebases = {}
+
+
+def open_book(path):
+    # One mapping per worker process; the pages themselves are shared by all workers
+    if path not in _books:
+        _books[path] = OpeningBook(path)
+    return _books[path]
+
+
+def open_tablebase(directory):
+    # Same for endgame tables
+    if directory not in _tablebases:
+        _tablebases[directory] = Tablebase(directory)
+    return _tablebases[directory]
+
+
+def adjudicate(state):
+    # The table's final result for a covered ending, else None
+    probe = state.tablebase.probe_state(state) if state.tablebase is not None else None
+    if probe is None:
+        return None
+    if probe.wdl == DRAW:
+        return 'draw'
+    return state.turn if probe.wdl == WIN else opponent(state.turn)
+
+
+def make_policy(name, book_path):
+    if name == 'search' and book_path:
+        return SearchPolicy(book=open_book(book_path))
+    return POLICIES[name]()
+
+
+def play_game(task):
+    index, seed, white, black, deck_size, max_plies, keep_record, book_path, tablebase_path = task
+    rng = random.Random(seed)
+    policies = {'white': make_policy(white, book_path), 'black': make_policy(black, book_path)}
+    state = GameState(BitBoard(), hands={'white': starting_hand(), 'black': starting_hand()},
+                      decks=deal_decks(rng, deck_size))
+    if tablebase_path:
+        state.tablebase = open_tablebase(tablebase_path)
+    start_cards = [{color: [card.name for card in cards] for color, cards in piles.items()}
+                   for piles in (state.hands, state.decks)]
+    actions = []
+    cards = {'white': {}, 'black': {}}
+    draws = {'white': 0, 'black': 0}
+    turn_card = None
+    last_turn_card = None
+    plies = 0
+    adjudicated = None
+    while plies < max_plies and state.result() is None:
+        if state.turn_started():
+            adjudicated = adjudicate(state)
+            if adjudicated:
+                break
+        mover = state.turn
+        action = policies[mover].choose(state, rng)
+        state.apply(action, validate=False)
+        actions.append(action)
+        if action.kind == 'card':
+            cards[mover][action.card] = cards[mover].get(action.card, 0) + 1
+            turn_card = action.card
+        elif action.kind == 'draw':
+            draws[mover] += 1
+        if state.turn != mover:
+            last_turn_card = turn_card
+            turn_card = None
+            plies += 1
+    result = adjudicated or state.result() or 'unfinished'
+    summary = {
+        "game": index,
+        "seed": seed,
+        "result": result,
+        "plies": plies,
+        "cards": cards,
+        "draws": draws,
+        # Card played on the turn that delivered mate on the board, if any; a
+        # tablebase adjudication stops before mate, so no card decided it
+        "deciding_card": last_turn_card if adjudicated is None and state.status() == 'checkmate' else None,
+    }
+    if tablebase_path:
+        summary["adjudicated"] = adjudicated is not None
+    if keep_record:
+        # Encoded in the worker so only a few bytes per turn cross the process boundary
+        tags = {"White": white, "Black": black, "Seed": seed}
+        final = None if result == 'unfinished' else result
+        summary["record"] = GameRecord.from_actions(actions, *start_cards, final, tags).encode()
+    return summary
+
+
+class Summary:
+    def __init__(self):
+        self.games = 0
+        self.results = {}
+        self.plies = 0
+        self.cards = {}
+
+    def card(self, name):
+        return self.cards.setdefault(name, {"played": 0, "games_played_in": 0, "played_by_winner": 0,
+                                            "played_by_loser": 0, "decided": 0})
+
+    def add(self, record):
+        self.games += 1
+        self.plies += record["plies"]
+        result = record["result"]
+        self.results[result] = self.results.get(result, 0) + 1
+        seen = set()
+        for color, counts in record["cards"].items():
+            for name, count in counts.items():
+                stats = self.card(name)
+                stats["played"] += count
+                seen.add(name)
+                if result == color:
+                    stats["played_by_winner"] += count
+                elif result in ('white', 'black'):
+                    stats["played_by_loser"] += count
+        for name in seen:
+            self.card(name)["games_played_in"] += 1
+        if record["deciding_card"]:
+            self.card(record["deciding_card"])["decided"] += 1
+
+    def as_dict(self):
+        return {"games": self.games, "results": self.results,
+                "mean_plies": round(self.plies / self.games, 1) if self.games else 0,
+                "cards": self.cards}
+
+
+def run(games, workers=None, white='random', black='random', deck_size=0, max_plies=400,
+        seed=0, out=None, records=None, book=None, chunksize=16, tablebase=None):
+    tasks = ((i, game_seed(seed, i), white, black, deck_size, max_plies, records is not None, book, tablebase)
+             for i in range(games))
+    summary = Summary()
+    start = time.perf_counter()
+    out_file = open(out, "w") if out else None
+    writer = RecordWriter(records) if records else None
+    try:
+        if workers == 1:
+            results = map(play_game, tasks)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(workers)
+            results = pool.imap_unordered(play_game, tasks, chunksize)
+        for record in results:
+            game_record = record.pop("record", None)
+            if writer:
+                writer.write_bytes(game_record)
+            summary.add(record)
+            if out_file:
+                out_file.write(json.dumps(record, separators=(',', ':')) + "\n")
+        if pool:
+            pool.close()
+            pool.join()
+    finally:
+        if out_file:
+            out_file.close()
+        if writer:
+            writer.close()
+    seconds = time.perf_counter() - start
+    report = summary.as_dict()
+    report["seconds"] = round(seconds, 3)
+    report["games_per_second"] = round(games / seconds, 2) if seconds else 0
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Self-play Chess World Champions games.")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--white", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--black", choices=sorted(POLICIES), default="random")
+    parser.add_argument("--deck-size", type=int, default=0, help="random cards each player can draw")
+    parser.add_argument("--max-plies", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", metavar="PATH", help="write one JSON line per game")
+    parser.add_argument("--records", metavar="PATH", help="append binary game records (see record.py)")
+    parser.add_argument("--book", metavar="PATH", help="opening book for the search policy (see book.py)")
+    parser.add_argument("--tablebase", metavar="DIR",
+                        help="endgame tables (see tbgen.py): stop games they decide and guide the search policy")
+    parser.add_argument("--summary", metavar="PATH", help="write the summary as JSON")
+    parser.add_argument("--profile", nargs="?", const=True, metavar="PREFIX",
+                        help="time hot paths and write PREFIX.txt/.json on exit (see profiling.py)")
+    parser.add_argument("--profile-span", metavar="NAME[:N]", help="also cProfile the Nth call of NAME")
+    args = parser.parse_args(argv)
+    profiling.setup(args.profile, args.profile_span)
+
+    report = run(args.games, args.workers, args.white, args.black, args.deck_size,
+                 args.max_plies, args.seed, args.out, args.records, args.book, tablebase=args.tablebase)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"{report['games']} games in {report['seconds']}s ({report['games_per_second']} games/s)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+# server.py
+# Asyncio game server: many concurrent card-chess games in memory, one
+# JSON object per line over TCP. Rules run on a thread pool so the event
+# loop never evaluates a move itself.
+#
+#   python server.py --port 8765
+#
+# Client -> server (an optional "id" is echoed back on the direct reply):
+#   {"op": "create"}                               you play white
+#   {"op": "join", "game": 1}                      black, or spectator if taken
+#   {"op": "join", "game": 1, "spectate": true}
+#   {"op": "state", "game": 1}                     full snapshot
+#   {"op": "actions", "game": 1}                   legal actions for the side to move
+#   {"op": "action", "game": 1, "action": {"kind": "move", "start": [6, 4], "end": [4, 4]}}
+#   {"op": "leave", "game": 1}
+# Server -> everyone in the game after each action:
+#   {"op": "update", "game": 1, "seq": 7, "changes": [[52, null], [36, "P"]], "turn": ...}
+import argparse
+import asyncio
+import itertools
+import json
+from concurrent.futures import ThreadPoolExecutor
+from bitboard import BitBoard
+from board import FEN_LETTERS
+from gamestate import Action, GameState
+import profiling
+
+
+def action_to_json(action):
+    data = {"kind": action.kind}
+    for field in ("start", "end", "card", "target"):
+        value = getattr(action, field)
+        if value is not None:
+            data[field] = list(value) if isinstance(value, tuple) else value
+    return data
+
+
+def action_from_json(data):
+    def square(value):
+        if value is None:
+            return None
+        if not isinstance(value, list) or len(value) != 2 or not all(type(v) is int for v in value):
+            raise ValueError(f"a square is [row, col]: {value!r}")
+        row, col = value
+        if not (0 <= row < 8 and 0 <= col < 8):
+            raise ValueError(f"square off the board: {value}")
+        return (row, col)
+
+    kind = data.get("kind")
+    if kind not in ("move", "card", "draw"):
+        raise ValueError(f"unknown action kind: {kind!r}")
+    card = data.get("card")
+    if card is not None and not isinstance(card, str):
+        raise ValueError(f"card must be a name: {card!r}")
+    return Action(kind, square(data.get("start")), square(data.get("end")),
+                  card, square(data.get("target")))
+
+
+def board_cells(board):
+    cells = []
+    for row in board.board:
+        for piece in row:
+            if piece is None:
+                cells.append(None)
+            else:
+                letter = FEN_LETTERS[type(piece)]
+                cells.append(letter.upper() if piece.color == 'white' else letter)
+    return cells
+
+
+def state_fields(state):
+    return {
+        "turn": state.turn,
+        "status": state.status(),
+        "result": state.result(),
+        "active_card": state.active_card.name if state.active_card else None,
+        "hands": {color: [card.name for card in hand] for color, hand in state.hands.items()},
+    }
+
+
+def apply_action(state, action):
+    # Runs on the rules thread pool; returns the delta to broadcast
+    before = board_cells(state.board)
+    state.apply(action)
+    after = board_cells(state.board)
+    changes = [[sq, after[sq]] for sq in range(64) if before[sq] != after[sq]]
+    fields = state_fields(state)
+    fields["changes"] = changes
+    return fields
+
+
+def snapshot(state):
+    fields = state_fields(state)
+    fields["board"] = board_cells(state.board)
+    return fields
+
+
+class Session:
+    def __init__(self, game_id, board_cls):
+        self.id = game_id
+        self.state = GameState(board_cls())
+        self.players = {}  # colour -> Connection
+        self.spectators = set()
+        self.lock = asyncio.Lock()
+        self.seq = 0
+
+    def members(self):
+        return list(self.players.values()) + list(self.spectators)
+
+    def color_of(self, conn):
+        for color, player in self.players.items():
+            if player is conn:
+                return color
+        return None
+
+
+class Connection:
+    # Messages go out through a bounded queue drained by one task per
+    # connection, so a client that stops reading cannot grow the server's
+    # buffers: once SEND_QUEUE messages are waiting it is disconnected.
+    SEND_QUEUE = 256
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.games = set()
+        self.queue = asyncio.Queue(self.SEND_QUEUE)
+        self.sender = asyncio.get_running_loop().create_task(self.send_loop())
+
+    def send(self, message):
+        if self.writer.is_closing():
+            return
+        try:
+            self.queue.put_nowait(json.dumps(message, separators=(',', ':')).encode() + b"\n")
+        except asyncio.QueueFull:
+            # Too far behind: drop it; handle_client's read then ends and it leaves its games
+            self.writer.transport.abort()
+
+    async def send_loop(self):
+        try:
+            while True:
+                self.writer.write(await self.queue.get())
+                await self.writer.drain()
+        except ConnectionError:
+            self.writer.transport.abort()
+
+    async def close(self):
+        self.sender.cancel()
+        self.writer.close()
+
+
+class GameServer:
+    def __init__(self, workers=None, board_cls=BitBoard):
+        self.board_cls = board_cls
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="rules")
+        self.actions_applied = 0
+
+    async def run_rules(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def handle_client(self, reader, writer):
+        conn = Connection(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = {}
+                try:
+                    message = json.loads(line)
+                    reply = await self.dispatch(conn, message)
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    reply = {"op": "error", "message": str(e)}
+                if reply is not None:
+                    if isinstance(message, dict) and "id" in message:
+                        reply["id"] = message["id"]
+                    conn.send(reply)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for game_id in list(conn.games):
+                self.leave(conn, game_id)
+            await conn.close()
+
+    def session(self, message):
+        session = self.sessions.get(message.get("game"))
+        if session is None:
+            raise KeyError(f"no such game: {message.get('game')}")
+        return session
+
+    async def dispatch(self, conn, message):
+        op = message.get("op")
+        if op == "create":
+            session = Session(next(self.ids), self.board_cls)
+            self.sessions[session.id] = session
+            session.players['white'] = conn
+            conn.games.add(session.id)
+            return {"op": "joined", "game": session.id, "color": "white"}
+        if op == "join":
+            session = self.session(message)
+            if session.color_of(conn) is not None:
+                raise ValueError(f"already playing {session.color_of(conn)} in game {session.id}")
+            conn.games.add(session.id)
+            if message.get("spectate") or 'black' in session.players:
+                session.spectators.add(conn)
+                async with session.lock:
+                    fields = await self.run_rules(snapshot, session.state)
+                return {"op": "joined", "game": session.id, "color": None, "seq": session.seq, **fields}
+            session.spectators.discard(conn)
+            session.players['black'] = conn
+            return {"op": "joined", "game": session.id, "color": "black"}
+        if op == "state":
+            session = self.session(message)
+            async with session.lock:
+                fields = await self.run_rules(snapshot, session.state)
+            return {"op": "state", "game": session.id, "seq": session.seq, **fields}
+        if op == "actions":
+            session = self.session(message)
+            async with session.lock:
+                actions = await self.run_rules(session.state.legal_actions)
+            return {"op": "actions", "game": session.id, "seq": session.seq,
+                    "actions": [action_to_json(a) for a in actions]}
+        if op == "action":
+            return await self.play(conn, self.session(message), action_from_json(message["action"]))
+        if op == "leave":
+            self.leave(conn, message.get("game"))
+            return {"op": "left", "game": message.get("game")}
+        raise ValueError(f"unknown op: {op!r}")
+
+    async def play(self, conn, session, action):
+        async with session.lock:
+            if session.color_of(conn) != session.state.turn:
+                return {"op": "error", "game": session.id, "message": "not your turn"}
+            try:
+                fields = await self.run_rules(apply_action, session.state, action)
+            except ValueError as e:
+                return {"op": "error", "game": session.id, "message": str(e)}
+            session.seq += 1
+            self.actions_applied += 1
+            update = {"op": "update", "game": session.id, "seq": session.seq,
+                      "action": action_to_json(action), **fields}
+        for member in session.members():
+            if member is not conn:
+                member.send(update)
+        return update
+
+    def leave(self, conn, game_id):
+        session = self.sessions.get(game_id)
+        conn.games.discard(game_id)
+        if session is None:
+            return
+        session.spectators.discard(conn)
+        color = session.color_of(conn)
+        if color:
+            del session.players[color]
+        if not session.players and not session.spectators:
+            del self.sessions[game_id]
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        server = await asyncio.start_server(self.handle_client, host, port, limit=1 << 20)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Chess World Champions game server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="rules threads")
+    parser.add_argument("--profile", nargs="?", const=True, metavar="PREFIX",
+                        help="time hot paths and write PREFIX.txt/.json on exit (see profiling.py)")
+    parser.add_argument("--profile-span", metavar="NAME[:N]", help="also cProfile the Nth call of NAME")
+    args = parser.parse_args(argv)
+    profiling.setup(args.profile, args.profile_span)
+    try:
+        asyncio.run(GameServer(args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# sprites.py
+# Piece sprite pipeline: colour-key white to transparent with bulk Pillow
+# channel operations, resize to the square size and keep the result in an
+# on-disk cache so later launches only open small ready-made PNGs. The
+# sprites of the last few square sizes also stay in memory, so resizing the
+# window back and forth does not reload them.
+import hashlib
+import json
+import os
+from PIL import Image, ImageChops
+from zobrist import LRUCache
+
+PIECE_DIR = os.path.join("assets", "pieces")
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+                         "chess_world_champions", "sprites")
+CACHE_VERSION = 1
+MAX_SIZES = 3
+
+
+def _is_white(value):
+    return 255 if value == 255 else 0
+
+
+def key_out_white(img):
+    # Same result as the old per-pixel loop: pure white pixels get alpha 0
+    r, g, b, a = img.convert("RGBA").split()
+    white = ImageChops.multiply(ImageChops.multiply(r.point(_is_white), g.point(_is_white)),
+                                b.point(_is_white))
+    return Image.merge("RGBA", (r, g, b, ImageChops.subtract(a, white)))
+
+
+def make_sprite(path, size):
+    with Image.open(path) as src:
+        img = key_out_white(src)
+    return img.resize((size, size), Image.LANCZOS)
+
+
+class SpriteCache:
+    def __init__(self, square_size, source_dir=PIECE_DIR, cache_dir=CACHE_DIR, max_sizes=MAX_SIZES):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self.index = self._read_index()
+        # {square size: {key: sprite}}, least recently used size dropped first
+        self.sizes = LRUCache(max_sizes)
+        self.hits = 0
+        self.misses = 0
+        self.set_size(square_size)
+
+    def set_size(self, square_size):
+        # Later get() calls return sprites of this size
+        self.square_size = square_size
+        self.sprites = self.sizes.get(square_size)
+        if self.sprites is None:
+            self.sprites = {}
+            self.sizes.put(square_size, self.sprites)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return index if index.get("version") == CACHE_VERSION else {}
+
+    def _write_index(self):
+        self.index["version"] = CACHE_VERSION
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_path)
+
+    def source_digest(self, path):
+        # The content hash is only recomputed when size or mtime change
+        stat = os.stat(path)
+        entry = self.index.get(path)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["sha1"]
+        with open(path, "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+        self.index[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha1": digest}
+        return digest
+
+    def cache_path(self, key, digest):
+        return os.path.join(self.cache_dir, f"{key}_{self.square_size}_{digest[:16]}.png")
+
+    def get(self, key):
+        # key is "<color>_<piece>", e.g. "white_knight"; loaded on first use
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            return sprite
+        source = os.path.join(self.source_dir, f"{key}.png")
+        digest = self.source_digest(source)
+        cached = self.cache_path(key, digest)
+        try:
+            with Image.open(cached) as img:
+                sprite = img.convert("RGBA")
+            self.hits += 1
+        except OSError:
+            sprite = make_sprite(source, self.square_size)
+            self.misses += 1
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                sprite.save(cached)
+                self._write_index()
+            except OSError as e:
+                print(f"Could not cache sprite {key}: {e}")
+        self.sprites[key] = sprite
+        return sprite
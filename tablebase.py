@@ -0,0 +1,247 @@
+# tablebase.py
+# Endgame tables for pawnless endings against a lone king (KQK, KRK, KBNK,
+# ...). tbgen.py builds them offline; this module probes them through mmap
+# and needs nothing beyond the standard library.
+#
+#   python tbgen.py KQK KRK KBNK --dir tables --workers 8
+#   python tablebase.py tables --fen "8/8/8/3k4/8/8/8/KQ6 w - - 0 1"
+#
+# File <material>.cwtb: a header, then one byte per position with the strong
+# side to move, then one per position with the lone king to move. A byte is
+# WDL << 6 | moves: WDL is 0 for an illegal or unused index, else DRAW, WIN
+# or LOSS for the side to move; moves counts full moves to mate (0 = already
+# mated) and, for a draw, is 1 when the side to move is stalemated.
+#
+# Cards change the rules, so a position is only probed once neither player
+# has a card in hand or deck and no card is in play. Without pawns the board
+# has 8 symmetries: each position is turned so the strong king stands in the
+# a1-d1-d4 triangle (10 squares), and
+#   index = slot(strong king) * 64 ** (n - 1) + other squares in base 64
+# with the strong pieces in QRBN order and the lone king last.
+import argparse
+import mmap
+import os
+import struct
+import sys
+from collections import namedtuple
+from gamestate import GameState, square_name
+from pieces import King, Queen, Rook, Bishop, Knight
+
+MAGIC = b"CWTB"
+VERSION = 1
+HEADER = struct.Struct("<4sB3x8sQ")  # magic, version, material, positions per side
+SUFFIX = ".cwtb"
+DRAW, WIN, LOSS = 1, 2, 3
+UNRESOLVED = DRAW << 6  # what tbgen.py starts every legal position as
+MAX_MOVES = 63
+STRONG, WEAK = 0, 1  # side to move, as table halves
+
+PIECE_ORDER = (Queen, Rook, Bishop, Knight)
+PIECE_LETTERS = {Queen: 'Q', Rook: 'R', Bishop: 'B', Knight: 'N'}
+LETTER_PIECES = {letter: cls for cls, letter in PIECE_LETTERS.items()}
+
+
+def _transform(t, sq):
+    # Bit 0 mirrors the files, bit 1 the ranks, bit 2 swaps rows and columns
+    row, col = divmod(sq, 8)
+    if t & 1:
+        col = 7 - col
+    if t & 2:
+        row = 7 - row
+    if t & 4:
+        row, col = col, row
+    return row * 8 + col
+
+
+TRANSFORMS = [[_transform(t, sq) for sq in range(64)] for t in range(8)]
+# a1-d1-d4: file <= 3 and rank <= file, with rank = 8 - row (so a1 is row 7, col 0)
+TRIANGLE = [sq for sq in range(64) if sq % 8 <= 3 and 7 - sq // 8 <= sq % 8]
+SLOT = {sq: slot for slot, sq in enumerate(TRIANGLE)}
+KING_TRANSFORM = [next(t for t in range(8) if TRANSFORMS[t][sq] in SLOT) for sq in range(64)]
+# Triangle squares on the a1-h8 diagonal, which transform 7 leaves in place
+ON_DIAGONAL = [sq in SLOT and 7 - sq // 8 == sq % 8 for sq in range(64)]
+DIAGONAL_FLIP = 7
+
+
+def parse_material(text):
+    # "KNBK" -> ("KBNK", [Bishop, Knight]); the lone king's side goes last
+    text = text.upper()
+    if len(text) < 2 or text[0] != 'K' or text[-1] != 'K' or any(ch not in LETTER_PIECES for ch in text[1:-1]):
+        raise ValueError(f"material must look like KQK or KBNK: {text!r}")
+    pieces = sorted((LETTER_PIECES[ch] for ch in text[1:-1]), key=PIECE_ORDER.index)
+    return 'K' + ''.join(PIECE_LETTERS[cls] for cls in pieces) + 'K', pieces
+
+
+def table_size(material):
+    return len(TRIANGLE) * 64 ** (len(material) - 1)
+
+
+def index_of(squares):
+    # squares = [strong king, strong pieces..., lone king], strong king already in the triangle
+    index = SLOT[squares[0]]
+    for sq in squares[1:]:
+        index = index * 64 + sq
+    return index
+
+
+def canonical_index(squares):
+    t = KING_TRANSFORM[squares[0]]
+    squares = [TRANSFORMS[t][sq] for sq in squares]
+    index = index_of(squares)
+    if ON_DIAGONAL[squares[0]]:
+        index = min(index, index_of([TRANSFORMS[DIAGONAL_FLIP][sq] for sq in squares]))
+    return index
+
+
+class Probe(namedtuple('Probe', ['wdl', 'moves'])):
+    # A table byte for the side to move
+    __slots__ = ()
+
+    @property
+    def mated(self):
+        return self.wdl == LOSS and self.moves == 0
+
+    @property
+    def stalemated(self):
+        return self.wdl == DRAW and self.moves == 1
+
+
+def describe(value):
+    # (wdl, moves) as text for the side to move
+    wdl, moves = value
+    if wdl == WIN:
+        return f"win in {moves}"
+    if wdl == LOSS:
+        return f"loss in {moves}" if moves else "checkmated"
+    return "stalemate" if moves else "draw"
+
+
+class Table:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, material, self.size = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an endgame table")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported table version {version}")
+        self.material = material.rstrip(b"\0").decode()
+        if self.size != table_size(self.material) or len(self.data) != HEADER.size + 2 * self.size:
+            raise ValueError(f"{path}: truncated or wrong size for {self.material}")
+
+    def value(self, side, index):
+        # Probe, wdl 0 for an illegal position
+        byte = self.data[HEADER.size + side * self.size + index]
+        return Probe(byte >> 6, byte & MAX_MOVES)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+class Tablebase:
+    # Every <material>.cwtb in a directory, each opened on first use
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+        self.materials = sorted(name[:-len(SUFFIX)] for name in os.listdir(directory) if name.endswith(SUFFIX))
+        self.max_pieces = max((len(material) for material in self.materials), default=0)
+        self.hits = 0
+
+    def __reduce__(self):
+        # Worker processes map the files themselves instead of receiving a copy
+        return (type(self), (self.directory,))
+
+    def table(self, material):
+        if material not in self.tables:
+            path = os.path.join(self.directory, material + SUFFIX)
+            self.tables[material] = Table(path) if material in self.materials else None
+        return self.tables[material]
+
+    def probe(self, board, turn):
+        # Probe for the side to move, or None if no table covers the position
+        white = board.locations('white')
+        black = board.locations('black')
+        if len(white) + len(black) > self.max_pieces:
+            return None
+        if len(black) == 1:
+            strong, weak = 'white', 'black'
+        elif len(white) == 1:
+            strong, weak = 'black', 'white'
+        else:
+            return None
+        kings = board.locations(strong, (King,))
+        lone_king = board.locations(weak, (King,))
+        if len(kings) != 1 or len(lone_king) != 1:
+            return None
+        squares = [kings[0][0] * 8 + kings[0][1]]
+        letters = 'K'
+        for cls in PIECE_ORDER:
+            found = sorted(board.locations(strong, (cls,)))
+            letters += PIECE_LETTERS[cls] * len(found)
+            squares.extend(row * 8 + col for row, col in found)
+        if len(squares) != len(board.locations(strong)):
+            return None  # pawns
+        table = self.table(letters + 'K')
+        if table is None:
+            return None
+        squares.append(lone_king[0][0] * 8 + lone_king[0][1])
+        value = table.value(STRONG if turn == strong else WEAK, canonical_index(squares))
+        if value[0] == 0:
+            return None
+        self.hits += 1
+        return value
+
+    def probe_state(self, state):
+        if state.active_card is not None or any(state.hands.values()) or any(state.decks.values()):
+            return None
+        return self.probe(state.board, state.turn)
+
+    def best_move(self, state):
+        # (action, value after it for the opponent) keeping the best result the
+        # table knows: the fastest win, a draw, or the slowest loss
+        if self.probe_state(state) is None:
+            return None
+        best = None
+        best_rank = None
+        for action in state.move_actions():
+            state.apply(action, validate=False)
+            after = self.probe_state(state)
+            state.undo()
+            if after is None:
+                continue
+            wdl, moves = after
+            rank = (2, -moves) if wdl == LOSS else (1, 0) if wdl == DRAW else (0, moves)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (action, after), rank
+        return best
+
+    def close(self):
+        for table in self.tables.values():
+            if table is not None:
+                table.close()
+        self.tables = {}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Probe endgame tables built by tbgen.py.")
+    parser.add_argument("directory")
+    parser.add_argument("--fen", required=True, help="position to probe")
+    args = parser.parse_args(argv)
+
+    tablebase = Tablebase(args.directory)
+    state = GameState.from_fen(args.fen)
+    state.hands = {'white': [], 'black': []}
+    value = tablebase.probe_state(state)
+    if value is None:
+        print(f"not covered by {', '.join(tablebase.materials) or 'any table'}")
+        return 1
+    found = tablebase.best_move(state)
+    move = f", best {square_name(found[0].start)}{square_name(found[0].end)}" if found else ""
+    print(f"{state.turn} to move: {describe(value)}{move}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+# tbgen.py
+# Builds the endgame tables tablebase.py probes, by retrograde analysis
+# (needs numpy):
+#
+#   python tbgen.py KQK KRK KBNK --dir tables --workers 8
+#
+# Moves and checks come from batchboard.BatchBoard, so the tables follow the
+# same rules as Board. A table is built in place in its file, which the parent
+# and every worker memory-map: workers read current values straight from it
+# and the parent writes each round's results. Tables an ending can capture
+# into (KBK and KNK for KBNK, down to KK) are built first.
+#
+# Every legal position starts unresolved. Round 0 checks every position and
+# finds the mates and stalemates (and lone-king positions whose every move
+# captures into a lost smaller ending). Round p then takes the positions
+# resolved p plies from mate:
+#   lost at p  ->  unresolved positions one move before them are won at p + 1
+#   won at p   ->  unresolved positions one move before them are checked again,
+#                  and are lost once every move leads to a win for the opponent
+# Whatever is still unresolved at the end is a draw.
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import numpy as np
+from batchboard import BITS, BatchBoard
+from bitboard import KING, TYPE_INDEX
+from tablebase import (DIAGONAL_FLIP, DRAW, HEADER, KING_TRANSFORM, LOSS, MAGIC, MAX_MOVES, ON_DIAGONAL,
+                       STRONG, SUFFIX, TRANSFORMS, TRIANGLE, UNRESOLVED, VERSION, WEAK, WIN, describe,
+                       parse_material, table_size)
+
+CHUNK = 32768  # positions per worker task
+
+TRANSFORMS_NP = np.array(TRANSFORMS, dtype=np.int64)
+TRIANGLE_NP = np.array(TRIANGLE, dtype=np.int64)
+SLOT_NP = np.full(64, -1, dtype=np.int64)
+SLOT_NP[TRIANGLE_NP] = np.arange(len(TRIANGLE))
+KING_TRANSFORM_NP = np.array(KING_TRANSFORM, dtype=np.int64)
+ON_DIAGONAL_NP = np.array(ON_DIAGONAL, dtype=bool)
+
+
+def piece_codes(material):
+    # BatchBoard codes in index order: the strong side plays white, the lone king black
+    _, pieces = parse_material(material)
+    return [KING] + [TYPE_INDEX[cls] for cls in pieces] + [6 + KING]
+
+
+def decode(material, index):
+    # Square arrays, one per piece in index order
+    squares = [None] * len(material)
+    rest = np.asarray(index, dtype=np.int64)
+    for j in range(len(material) - 1, 0, -1):
+        squares[j] = rest % 64
+        rest = rest // 64
+    squares[0] = TRIANGLE_NP[rest]
+    return squares
+
+
+def _index(squares):
+    index = SLOT_NP[squares[0]]
+    for sq in squares[1:]:
+        index = index * 64 + sq
+    return index
+
+
+def encode(squares):
+    # tablebase.canonical_index for whole arrays of positions
+    t = KING_TRANSFORM_NP[squares[0]]
+    squares = [TRANSFORMS_NP[t, sq] for sq in squares]
+    index = _index(squares)
+    diagonal = ON_DIAGONAL_NP[squares[0]]
+    if diagonal.any():
+        flipped = _index([TRANSFORMS_NP[DIAGONAL_FLIP][sq] for sq in squares])
+        index = np.where(diagonal, np.minimum(index, flipped), index)
+    return index
+
+
+def batch(material, squares):
+    count = len(squares[0])
+    plane = np.full((count, 64), -1, dtype=np.int8)
+    rows = np.arange(count)
+    for code, sq in zip(piece_codes(material), squares):
+        plane[rows, sq] = code
+    return BatchBoard(plane)
+
+
+def _expand(targets):
+    # (position rows, target squares) for every set bit of a (N,) uint64 array
+    return np.nonzero((targets[:, None] & BITS) != 0)
+
+
+def table_path(directory, material):
+    return os.path.join(directory, material + SUFFIX)
+
+
+_maps = {}
+
+
+def _table(path, material, mode="r"):
+    # (2, size) array over the file, one mapping per process
+    key = (path, mode)
+    if key not in _maps:
+        _maps[key] = np.memmap(path, dtype=np.uint8, mode=mode, offset=HEADER.size,
+                               shape=(2, table_size(material)))
+    return _maps[key]
+
+
+# --- worker tasks ----------------------------------------------------------------
+
+def _survey(task):
+    # Marks legal, canonical positions of index range [lo, hi) UNRESOLVED, everything else 0
+    path, material, lo, hi = task
+    index = np.arange(lo, hi, dtype=np.int64)
+    squares = decode(material, index)
+    ok = encode(squares) == index
+    for i in range(len(squares)):
+        for j in range(i):
+            ok &= squares[i] != squares[j]
+    values = np.zeros((2, hi - lo), dtype=np.uint8)
+    rows = np.flatnonzero(ok)
+    if len(rows):
+        board = batch(material, [sq[rows] for sq in squares])
+        # Legal with a side to move when the other side's king is not attacked
+        values[STRONG, rows] = np.where(board.in_check('black'), 0, UNRESOLVED)
+        values[WEAK, rows] = np.where(board.in_check('white'), 0, UNRESOLVED)
+    _table(path, material, "r+")[:, lo:hi] = values
+    return hi - lo
+
+
+def _verify(task):
+    # New bytes for positions with `side` to move: lost once every legal move
+    # leads to a win for the opponent, mated or stalemated without a legal
+    # move, otherwise still UNRESOLVED
+    path, directory, material, side, index = task
+    count = len(index)
+    table = _table(path, material)
+    squares = decode(material, index)
+    board = batch(material, squares)
+    color = 'white' if side == STRONG else 'black'
+    masks = board.move_masks(color)
+    positions = np.arange(count)
+    legal = np.zeros(count, dtype=np.int64)
+    escapes = np.zeros(count, dtype=np.int64)  # legal moves not leading to a win for the opponent
+    longest = np.zeros(count, dtype=np.int64)  # opponent's slowest win, in moves
+    movers = range(len(material) - 1) if side == STRONG else [len(material) - 1]
+    for j in movers:
+        rows, to = _expand(masks[positions, squares[j]])
+        after = [sq[rows] for sq in squares]
+        after[j] = to
+        values = np.zeros(len(rows), dtype=np.uint8)
+        plain = np.ones(len(rows), dtype=bool)
+        if side == WEAK:
+            # Only the lone king captures; piece k's capture leads into a smaller table
+            for k in range(1, len(material) - 1):
+                hit = squares[k][rows] == to
+                if not hit.any():
+                    continue
+                plain &= ~hit
+                sub = material[:k] + material[k + 1:]
+                sub_table = _table(table_path(directory, sub), sub)
+                values[hit] = sub_table[STRONG][encode([sq[hit] for i, sq in enumerate(after) if i != k])]
+        values[plain] = table[1 - side][encode([sq[plain] for sq in after])]
+        ok = values != 0
+        wins = ok & (values >> 6 == WIN)
+        legal += np.bincount(rows[ok], minlength=count)
+        escapes += np.bincount(rows[ok & ~wins], minlength=count)
+        np.maximum.at(longest, rows[wins], (values[wins] & MAX_MOVES).astype(np.int64))
+    in_check = board.in_check(color)
+    result = np.full(count, UNRESOLVED, dtype=np.uint8)
+    result[(legal == 0) & in_check] = LOSS << 6
+    result[(legal == 0) & ~in_check] = DRAW << 6 | 1
+    lost = (legal > 0) & (escapes == 0)
+    result[lost] = (LOSS << 6) | longest[lost]
+    return result
+
+
+def _unmove(task):
+    # Canonical indices (with repeats) of positions with the other side to move one move before these
+    _path, material, side, index = task
+    squares = decode(material, index)
+    board = batch(material, squares)
+    mover = 1 - side
+    masks = board.move_masks('white' if mover == STRONG else 'black')
+    empty = ~(board.occupancy('white') | board.occupancy('black'))
+    positions = np.arange(len(index))
+    found = []
+    for j in (range(len(material) - 1) if mover == STRONG else [len(material) - 1]):
+        # No captures to undo: the smaller tables are separate files
+        rows, origin = _expand(masks[positions, squares[j]] & empty)
+        before = [sq[rows] for sq in squares]
+        before[j] = origin
+        found.append(encode(before))
+    return np.concatenate(found)
+
+
+# --- driver ----------------------------------------------------------------------
+
+def _chunks(index):
+    return [index[lo:lo + CHUNK] for lo in range(0, len(index), CHUNK)]
+
+
+def _map(pool, fn, tasks):
+    return pool.imap(fn, tasks) if pool else map(fn, tasks)
+
+
+def _plies(values):
+    # Plies to mate of resolved bytes, -1 for anything else
+    wdl = values.astype(np.int64) >> 6
+    moves = values.astype(np.int64) & MAX_MOVES
+    return np.where(wdl == LOSS, 2 * moves, np.where(wdl == WIN, 2 * moves - 1, -1))
+
+
+def _code(plies):
+    moves = (plies + 1) // 2
+    if moves > MAX_MOVES:
+        raise ValueError(f"mate in more than {MAX_MOVES} moves does not fit a table byte")
+    return (LOSS if plies % 2 == 0 else WIN) << 6 | moves
+
+
+def build(material, directory, pool=None, log=None):
+    # Writes <directory>/<material>.cwtb and any missing smaller tables; returns a report
+    material, _ = parse_material(material)
+    for k in range(1, len(material) - 1):
+        sub = material[:k] + material[k + 1:]
+        if not os.path.exists(table_path(directory, sub)):
+            build(sub, directory, pool, log)
+    start = time.perf_counter()
+    size = table_size(material)
+    final = table_path(directory, material)
+    path = final + ".tmp"
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, material.encode(), size))
+        f.truncate(HEADER.size + 2 * size)
+    table = _table(path, material, "r+")
+    for _ in _map(pool, _survey, [(path, material, lo, min(lo + CHUNK, size)) for lo in range(0, size, CHUNK)]):
+        pass
+
+    def verify(side, index):
+        chunks = _chunks(index)
+        for chunk, result in zip(chunks, _map(pool, _verify, [(path, directory, material, side, chunk)
+                                                              for chunk in chunks])):
+            table[side][chunk] = result
+        return int(_plies(table[side][index]).max(initial=-1))
+
+    last = max(verify(side, np.flatnonzero(table[side] == UNRESOLVED)) for side in (STRONG, WEAK))
+    plies = 0
+    while plies <= last:
+        resolved = 0
+        for side in (STRONG, WEAK):
+            frontier = np.flatnonzero(table[side] == _code(plies))
+            if not len(frontier):
+                continue
+            resolved += len(frontier)
+            other = 1 - side
+            # Marking a flag per index drops duplicates faster than sorting them out
+            seen = np.zeros(size, dtype=bool)
+            for found in _map(pool, _unmove, [(path, material, side, chunk) for chunk in _chunks(frontier)]):
+                seen[found] = True
+            before = np.flatnonzero(seen & (table[other] == UNRESOLVED))
+            if not len(before):
+                continue
+            if plies % 2 == 0:
+                table[other][before] = _code(plies + 1)
+                last = max(last, plies + 1)
+            else:
+                last = max(last, verify(other, before))
+        if log and resolved:
+            log(f"{material}: {resolved} positions {plies} plies from mate")
+        plies += 1
+    table.flush()
+
+    report = {"material": material, "positions": size, "seconds": 0.0}
+    for side, name in ((STRONG, "strong"), (WEAK, "weak")):
+        values = np.asarray(table[side])
+        wdl = values >> 6
+        report[name] = {"wins": int((wdl == WIN).sum()), "draws": int((wdl == DRAW).sum()),
+                        "losses": int((wdl == LOSS).sum()), "illegal": int((wdl == 0).sum())}
+        longest = int(np.argmax(_plies(values)))
+        if wdl[longest] in (WIN, LOSS):
+            board = batch(material, decode(material, [longest])).to_boards()[0]
+            report[name]["longest"] = (f"{describe((int(wdl[longest]), int(values[longest] & MAX_MOVES)))}: "
+                                       f"{board.fen('white' if side == STRONG else 'black')}")
+    del table
+    _maps.pop((path, "r+"), None)
+    _maps.pop((path, "r"), None)
+    os.replace(path, final)
+    report["seconds"] = round(time.perf_counter() - start, 2)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build endgame tables by retrograde analysis.")
+    parser.add_argument("materials", nargs="+", help="e.g. KQK KRK KBNK")
+    parser.add_argument("--dir", default="tables", help="output directory")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--force", action="store_true", help="rebuild tables that already exist")
+    parser.add_argument("--verbose", action="store_true", help="report every round")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.dir, exist_ok=True)
+    log = (lambda text: print(text, file=sys.stderr)) if args.verbose else None
+    pool = multiprocessing.Pool(args.workers) if args.workers != 1 else None
+    try:
+        for material in args.materials:
+            material, _ = parse_material(material)
+            if os.path.exists(table_path(args.dir, material)) and not args.force:
+                print(f"{material}: already built", file=sys.stderr)
+                continue
+            report = build(material, args.dir, pool, log)
+            print(f"{material}: {report['positions']} positions per side in {report['seconds']}s", file=sys.stderr)
+            for name in ("strong", "weak"):
+                side = report[name]
+                print(f"  {name} to move: {side['wins']} wins, {side['draws']} draws, {side['losses']} losses"
+                      + (f"; longest {side['longest']}" if "longest" in side else ""), file=sys.stderr)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
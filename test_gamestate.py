@@ -0,0 +1,27 @@
+# test_gamestate.py
+# python -m pytest -q
+from gamestate import GameState, card_action
+
+# Only Bxc3 saves white's turn: under Bishop Ghost the bishop may not capture
+GHOST_NO_MOVE_FEN = '7k/8/8/8/8/2b5/1B1n4/K1n5 w - - 0 1'
+
+
+def test_modifier_card_needs_a_legal_move():
+    state = GameState.from_fen(GHOST_NO_MOVE_FEN)
+    hand = list(state.hands['white'])
+    assert card_action('Bishop Ghost') not in state.legal_actions()
+    ghost = next(card for card in hand if card.name == 'Bishop Ghost')
+    assert not state.can_play(ghost)
+    # The probe leaves the state as it found it
+    assert state.hands['white'] == hand
+    assert len(state.history) == 0 and state.active_card is None
+    assert not state.bishop_ghost_active['white']
+
+
+def test_every_offered_card_leaves_a_move():
+    state = GameState.from_fen(GHOST_NO_MOVE_FEN)
+    for action in state.legal_actions():
+        if action.kind == 'card' and action.target is None:
+            state.apply(action)
+            assert state.legal_actions()
+            state.undo()
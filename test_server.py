@@ -0,0 +1,62 @@
+# test_server.py
+# python -m pytest -q
+import asyncio
+import json
+from server import GameServer
+
+
+async def _with_server(body):
+    game_server = GameServer(workers=1)
+    tcp = await asyncio.start_server(game_server.handle_client, "127.0.0.1", 0)
+    port = tcp.sockets[0].getsockname()[1]
+    writers = []
+
+    async def connect():
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writers.append(writer)
+
+        async def ask(message):
+            writer.write(json.dumps(message).encode() + b"\n")
+            await writer.drain()
+            return json.loads(await reader.readline())
+        return ask, reader
+
+    try:
+        await body(game_server, connect)
+    finally:
+        for writer in writers:
+            writer.close()
+        tcp.close()
+        await tcp.wait_closed()
+        game_server.executor.shutdown()
+
+
+def test_creator_cannot_join_own_game():
+    async def body(game_server, connect):
+        white, _ = await connect()
+        assert (await white({"op": "create"}))["color"] == "white"
+        reply = await white({"op": "join", "game": 1})
+        assert reply["op"] == "error"
+        assert list(game_server.sessions[1].players) == ['white']
+
+    asyncio.run(_with_server(body))
+
+
+def test_spectator_taking_black_gets_each_update_once():
+    async def body(game_server, connect):
+        white, _ = await connect()
+        await white({"op": "create"})
+        black, black_reader = await connect()
+        assert (await black({"op": "join", "game": 1, "spectate": True}))["color"] is None
+        assert (await black({"op": "join", "game": 1}))["color"] == "black"
+        session = game_server.sessions[1]
+        assert not session.spectators
+        assert session.members().count(session.players['black']) == 1
+
+        move = {"kind": "move", "start": [6, 4], "end": [4, 4]}
+        assert (await white({"op": "action", "game": 1, "action": move}))["op"] == "update"
+        assert json.loads(await black_reader.readline())["seq"] == 1
+        # Nothing else queued for black: its next line answers its own request
+        assert (await black({"op": "state", "game": 1, "id": 7}))["id"] == 7
+
+    asyncio.run(_with_server(body))
@@ -0,0 +1,11 @@
+# test_sprites.py
+# python -m pytest -q (needs Pillow)
+import pytest
+
+pytest.importorskip("PIL")
+from bench_sprites import check_identical  # noqa: E402
+
+
+@pytest.mark.parametrize("square_size", [64, 80])
+def test_sprites_match_legacy_loop(square_size):
+    assert check_identical(square_size) == []
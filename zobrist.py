@@ -0,0 +1,113 @@
+# zobrist.py
+# Zobrist keys for incremental position hashing, and the LRU cache Board
+# uses to share one analysis per position between all its queries.
+import hashlib
+import random
+from collections import OrderedDict
+from pieces import King, Queen, Rook, Bishop, Knight, Pawn
+
+PIECE_CODES = {Pawn: 0, Knight: 1, Bishop: 2, Rook: 3, Queen: 4, King: 5}
+COLOR_OFFSET = {'white': 0, 'black': 6}
+
+_rng = random.Random(20250713)
+# SQUARE_KEYS[piece code][row * 8 + col], piece code = colour offset + type code
+SQUARE_KEYS = [[_rng.getrandbits(64) for _ in range(64)] for _ in range(12)]
+SIDE_KEYS = {'white': _rng.getrandbits(64), 'black': _rng.getrandbits(64)}
+GHOST_KEY = _rng.getrandbits(64)
+BOOST_KEY = _rng.getrandbits(64)
+KNIGHTMARE_KEY = _rng.getrandbits(64)
+KNIGHTMARE_CAPTURE_KEY = _rng.getrandbits(64)
+KNIGHTMARE_PENDING_KEY = _rng.getrandbits(64)
+KNIGHT_POS_KEYS = [_rng.getrandbits(64) for _ in range(64)]
+CARD_ACTIVE_KEY = _rng.getrandbits(64)
+_label_keys = {}
+
+
+def piece_code(piece):
+    return COLOR_OFFSET[piece.color] + PIECE_CODES[type(piece)]
+
+
+def piece_key(piece, row, col):
+    return SQUARE_KEYS[piece_code(piece)][row * 8 + col]
+
+
+def hash_grid(grid):
+    key = 0
+    for row in range(8):
+        for col in range(8):
+            piece = grid[row][col]
+            if piece:
+                key ^= piece_key(piece, row, col)
+    return key
+
+
+def card_key(state, color):
+    # Only the card flags that change colour's move generation go into the key
+    if state is None:
+        return 0
+    key = 0
+    if state.bishop_ghost_active.get(color, False):
+        key ^= GHOST_KEY
+    if state.pawn_boost_active.get(color, False):
+        key ^= BOOST_KEY
+    if getattr(state, "knightmare_doing_second_move", False):
+        key ^= KNIGHTMARE_KEY
+        if state.knightmare_state and state.knightmare_state.get("capture_done", False):
+            key ^= KNIGHTMARE_CAPTURE_KEY
+    return key
+
+
+def label_key(label):
+    # Stable key for open-ended labels such as card names
+    key = _label_keys.get(label)
+    if key is None:
+        digest = hashlib.blake2b(label.encode(), digest_size=8, key=b"cwc-zobrist").digest()
+        key = _label_keys[label] = int.from_bytes(digest, "little")
+    return key
+
+
+def hand_key(hands, decks=None):
+    key = 0
+    for color, hand in hands.items():
+        counts = {}
+        for card in hand:
+            counts[card.name] = counts.get(card.name, 0) + 1
+        for name, count in counts.items():
+            key ^= label_key(f"{color}:hand:{name}:{count}")
+    if decks:
+        for color, deck in decks.items():
+            for i, card in enumerate(deck):
+                key ^= label_key(f"{color}:deck:{i}:{card.name}")
+    return key
+
+
+class LRUCache:
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {"size": len(self.entries), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses}